@@ -65,6 +65,16 @@ def score_bundle(bundle: dict) -> dict:
             score += 15
             rationale.append(f"IP targeted many users (targeted_users={targeted}) (+15)")
 
+        # Offline IP intel tags (data/ip-intel/), present when the provider had an index
+        tags = set(((ip.get("intel") or {}).get("tags")) or [])
+        if "known-bad" in tags:
+            score += 20
+            rationale.append(f"IP {ip.get('ip')} is in a known-bad range ({(ip.get('intel') or {}).get('asn')}) (+20)")
+        anon = sorted(tags & {"hosting", "vpn", "proxy", "tor"})
+        if anon:
+            score += 10
+            rationale.append(f"IP {ip.get('ip')} is hosting/anonymizer infrastructure (tags={anon}) (+10)")
+
     # Clamp score
     score = max(0, min(score, 100))
 
@@ -133,6 +143,9 @@ def summarize(bundle: dict) -> str:
     if ip_summaries:
         for ip in ip_summaries:
             lines.append(f"- **{ip.get('ip','N/A')}**: failures={ip.get('failures',0)}, successes={ip.get('successes',0)}, targeted_users={ip.get('targeted_users_count',0)}, countries={fmt_list(ip.get('countries',[]))}")
+            intel = ip.get("intel")
+            if intel:
+                lines.append(f"  - intel: asn={intel.get('asn') or 'N/A'} ({intel.get('as_org') or 'N/A'}), country={intel.get('country') or 'N/A'}, tags={fmt_list(intel.get('tags', []))}")
     else:
         lines.append("- N/A")
 
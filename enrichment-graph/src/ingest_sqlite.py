@@ -0,0 +1,44 @@
+# enrichment-graph/src/ingest_sqlite.py
+"""
+Load SigninLogs/AuditLogs JSONL into the SQLite store used by SqliteProvider.
+
+Re-running is incremental: files already ingested continue from where the
+last run stopped, so appending a day's export only inserts the new rows.
+
+    python enrichment-graph/src/ingest_sqlite.py                       # data/sample-logs/*.jsonl
+    python enrichment-graph/src/ingest_sqlite.py exports/SigninLogs-2026-02.jsonl --db data/events.sqlite
+"""
+import argparse
+import time
+from pathlib import Path
+
+from investigation_bundle.log_schema import known_tables
+from investigation_bundle.offline_provider import AUDIT_PATH, SIGNIN_PATH
+from investigation_bundle.sqlite_provider import DEFAULT_DB_PATH, ingest_file, open_store
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Append JSONL sign-in / audit logs to the local SQLite event store.")
+    ap.add_argument("inputs", nargs="*", default=[str(SIGNIN_PATH), str(AUDIT_PATH)], help="JSONL files (table taken from the file name)")
+    ap.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite database path")
+    ap.add_argument("--table", default=None, help="Table for all inputs (SigninLogs or AuditLogs)")
+    args = ap.parse_args()
+
+    tables = known_tables()
+    conn = open_store(Path(args.db))
+    try:
+        for p in args.inputs:
+            path = Path(p)
+            table = args.table or next((t for t in tables if path.name.startswith(t)), None)
+            if table is None:
+                raise SystemExit(f"Can't tell the table of {path}; name it <Table>*.jsonl or pass --table")
+            t0 = time.perf_counter()
+            stats = ingest_file(conn, path, table)
+            print(f"{path} -> {table}: {stats['inserted']} inserted, {stats['skipped']} skipped, "
+                  f"{stats['replaced']} replaced (from byte {stats['from_offset']}) in {time.perf_counter() - t0:.3f}s")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    print(f"Wrote: {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_CACHE_DIR = REPO_ROOT / ".cache" / "artifacts"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def digest(obj: Any) -> str:
+    """sha256 of the canonical JSON form of obj (key order and whitespace don't matter)."""
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def code_version(paths: Iterable[Path]) -> str:
+    """Hash of the source files a stage depends on; editing them invalidates its artifacts."""
+    h = hashlib.sha256()
+    for p in sorted(Path(p) for p in paths):
+        h.update(p.name.encode("utf-8"))
+        h.update(p.read_bytes())
+    return h.hexdigest()[:16]
+
+@lru_cache(maxsize=1)
+def package_code_version() -> str:
+    return code_version(Path(__file__).resolve().parent.glob("*.py"))
+
+class ArtifactCache:
+    """
+    Local content-addressed store for pipeline stage outputs.
+
+    An artifact's key is the digest of everything that determines it (stage
+    name, inputs, data fingerprints, parameters, code version), so an
+    unchanged input is a cache hit and a changed one can never be served
+    stale. Artifacts are JSON files under root/<2 hex>/<digest>.json; reads
+    refresh the mtime, and writes evict least recently used files once the
+    store exceeds max_bytes. Safe to share between threads (serve.py) and
+    processes (each write goes through its own temp file).
+    """
+
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def key(self, stage: str, **inputs: Any) -> str:
+        return digest({"stage": stage, **inputs})
+
+    def get(self, key: str) -> Optional[Any]:
+        p = self._path(key)
+        try:
+            value = json.loads(p.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        fd, tmp = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=p.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            with self._lock:
+                try:
+                    old = p.stat().st_size
+                except FileNotFoundError:
+                    old = 0
+                os.replace(tmp, p)
+                if self._size is not None:
+                    self._size += len(data) - old
+                self._evict()
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def memoize(self, stage: str, inputs: Dict[str, Any], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (value, was_cached); fn() runs only on a miss."""
+        key = self.key(stage, **inputs)
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = fn()
+        self.put(key, value)
+        return value, False
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        out = []
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, p))
+        return out
+
+    def _evict(self) -> None:
+        # caller holds self._lock
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        if self._size <= self.max_bytes:
+            return
+        for _, size, p in sorted(self._entries()):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+class IncidentRegistry:
+    """
+    Persistent alert-identity -> INC-xxxx mapping, so re-running detections
+    keeps incident IDs stable instead of renumbering by list position.
+    New identities get the next free number.
+
+    An identity is the detection_id plus the entity fields the rule groups
+    by (group_by: detection_id -> entity keys, default accounts + ips).
+    Times and evidence are left out: an ongoing incident whose window
+    slides, or whose evidence grows, keeps its number.
+    """
+
+    def __init__(self, path: Path, group_by: Optional[Dict[str, Sequence[str]]] = None) -> None:
+        self.path = Path(path)
+        self.group_by = group_by or {}
+        self.ids: Dict[str, str] = {}
+        if self.path.exists():
+            self.ids = json.loads(self.path.read_text(encoding="utf-8"))
+        self._next = 1 + max((int(v.split("-")[1]) for v in self.ids.values()), default=0)
+
+    def identity(self, alert: Dict[str, Any]) -> str:
+        ents = alert.get("entities") or {}
+        det_id = alert.get("detection_id")
+        key: Dict[str, Any] = {"detection_id": det_id}
+        for name in self.group_by.get(det_id, ("accounts", "ips")):
+            v = ents.get(name)
+            key[name] = sorted(x for x in v if x) if isinstance(v, list) else v
+        return digest(key)[:24]
+
+    def incident_id(self, alert: Dict[str, Any]) -> str:
+        key = self.identity(alert)
+        if key not in self.ids:
+            self.ids[key] = f"INC-{self._next:04d}"
+            self._next += 1
+        return self.ids[key]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.ids, indent=2, sort_keys=True), encoding="utf-8")
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """Write text unless the file already holds exactly it; returns True if written."""
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return False
+    except FileNotFoundError:
+        pass
+    path.write_text(text, encoding="utf-8")
+    return True
+
+def remove_stale(directory: Path, keep: Iterable[str], pattern: str = "INC-*.json") -> List[Path]:
+    """Delete files matching pattern in directory whose name is not in keep (outputs of incidents no longer emitted)."""
+    keep = set(keep)
+    removed = []
+    for p in sorted(Path(directory).glob(pattern)):
+        if p.name not in keep:
+            p.unlink()
+            removed.append(p)
+    return removed
@@ -0,0 +1,132 @@
+import heapq
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+def by_time(e: Any) -> Any:
+    return e["TimeGenerated"]
+
+class _Desc:
+    # Inverts ordering so heapq's min-heap can hold the K smallest keys.
+    __slots__ = ("v",)
+
+    def __init__(self, v: Any) -> None:
+        self.v = v
+
+    def __lt__(self, other: "_Desc") -> bool:
+        return other.v < self.v
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Desc) and self.v == other.v
+
+class TopK(Generic[T]):
+    """
+    Keeps the K items with the largest key (or smallest with largest=False)
+    in O(K) memory. Ties keep the earliest-added item, so `items()` matches
+    `sorted(all_items, key=key, reverse=largest)[:k]` on the same input.
+    `seen` counts every item offered, kept or not.
+    """
+
+    def __init__(self, k: int, key: Callable[[T], Any] = by_time, largest: bool = True) -> None:
+        self.k = k
+        self.key = key
+        self.largest = largest
+        self._heap: List[Tuple[Any, int, T]] = []
+        self._seq = 0
+        self.seen = 0
+
+    def add(self, item: T) -> None:
+        self.seen += 1
+        if self.k <= 0:
+            return
+        k = self.key(item)
+        entry = (k if self.largest else _Desc(k), -self._seq, item)
+        self._seq += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif self._heap[0] < entry:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, items: Iterable[T]) -> "TopK[T]":
+        for item in items:
+            self.add(item)
+        return self
+
+    def merge(self, other: "TopK[T]") -> "TopK[T]":
+        """
+        Fold in a TopK of items added after this one's: same result as adding
+        both streams in order, since an item other dropped is beaten by K of
+        its own that are kept.
+        """
+        seen = self.seen + other.seen
+        self.extend(other.items())
+        self.seen = seen
+        return self
+
+    def items(self) -> List[T]:
+        if self.largest:
+            ordered = sorted(self._heap, key=lambda e: (_Desc(e[0]), -e[1]))
+        else:
+            ordered = sorted(self._heap, key=lambda e: (e[0].v, -e[1]))
+        return [e[2] for e in ordered]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"seen": self.seen, "items": self.items()}
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any], k: int, key: Callable[[T], Any] = by_time, largest: bool = True) -> "TopK[T]":
+        # re-adding items() in order keeps their tie order
+        top: TopK[T] = cls(k, key, largest).extend(raw["items"])
+        top.seen = raw["seen"]
+        return top
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+class RunningStats(Generic[T]):
+    """
+    Streaming count plus min/max of key(item), remembering the first item
+    that reached each extreme. With key=None items are their own keys.
+    """
+
+    def __init__(self, key: Optional[Callable[[T], Any]] = by_time) -> None:
+        self.key = key
+        self.count = 0
+        self.min: Any = None
+        self.max: Any = None
+        self.min_item: Optional[T] = None
+        self.max_item: Optional[T] = None
+
+    def add(self, item: T) -> None:
+        k = item if self.key is None else self.key(item)
+        self.count += 1
+        if self.min is None or k < self.min:
+            self.min, self.min_item = k, item
+        if self.max is None or k > self.max:
+            self.max, self.max_item = k, item
+
+    def merge(self, other: "RunningStats[T]") -> "RunningStats[T]":
+        """Fold in stats of items added after this one's (ties keep this side)."""
+        if not other.count:
+            return self
+        if self.min is None or other.min < self.min:
+            self.min, self.min_item = other.min, other.min_item
+        if self.max is None or other.max > self.max:
+            self.max, self.max_item = other.max, other.max_item
+        self.count += other.count
+        return self
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"count": self.count, "min": self.min, "max": self.max, "min_item": self.min_item, "max_item": self.max_item}
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any], key: Optional[Callable[[T], Any]] = by_time) -> "RunningStats[T]":
+        rs: RunningStats[T] = cls(key)
+        rs.count, rs.min, rs.max, rs.min_item, rs.max_item = raw["count"], raw["min"], raw["max"], raw["min_item"], raw["max_item"]
+        return rs
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __len__(self) -> int:
+        return self.count
@@ -1,8 +1,10 @@
-from dataclasses import dataclass
+import json
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from dateutil.parser import isoparse
 
+from .artifact_cache import ArtifactCache, package_code_version
 from .offline_provider import OfflineProvider
 
 def _dt(s: str) -> datetime:
@@ -23,8 +25,33 @@ class IncidentContext:
     accounts: List[str]
     ips: List[str]
 
-def build_investigation_bundle_offline(ctx: IncidentContext) -> Dict[str, Any]:
-    provider = OfflineProvider()
+def incident_context_from_json(ctx_raw: Dict[str, Any]) -> IncidentContext:
+    # Shape emitted by tools/local-kql/run_detections.py (incident_contexts/*.json)
+    return IncidentContext(
+        incident_id=ctx_raw["incident_id"],
+        title=ctx_raw["title"],
+        severity=ctx_raw["severity"],
+        time_start=ctx_raw["time_start"],
+        time_end=ctx_raw["time_end"],
+        detections=ctx_raw.get("detections", []),
+        accounts=ctx_raw.get("entities", {}).get("accounts", []),
+        ips=ctx_raw.get("entities", {}).get("ips", []),
+    )
+
+def build_investigation_bundle_offline(
+    ctx: IncidentContext,
+    slim: bool = False,
+    provider: Optional[OfflineProvider] = None,
+) -> Dict[str, Any]:
+    """
+    slim=False -> schema 1.0, raw sign-in/audit events embedded in the bundle.
+    slim=True  -> schema 2.0, events projected to the fields consumers read plus
+                  a {"partition", "offset"} ref (see event_refs.EventResolver).
+
+    Pass a long-lived `provider` to skip reloading the logs per incident.
+    """
+    if provider is None:
+        provider = OfflineProvider()
     start = _dt(ctx.time_start)
     end = _dt(ctx.time_end)
 
@@ -33,9 +60,15 @@ def build_investigation_bundle_offline(ctx: IncidentContext) -> Dict[str, Any]:
 
     recent_signins = {}
     for u in ctx.accounts:
-        recent_signins[u] = provider.recent_signins_for_user(u, start, end, limit=50)
+        if slim:
+            recent_signins[u] = provider.recent_signin_refs_for_user(u, start, end, limit=50)
+        else:
+            recent_signins[u] = provider.recent_signins_for_user(u, start, end, limit=50)
 
-    audit = provider.audit_events(start, end, limit=50)
+    if slim:
+        audit = provider.audit_event_refs(start, end, limit=50)
+    else:
+        audit = provider.audit_events(start, end, limit=50)
 
     recommendations: List[str] = [
         "Review Identity Investigations workbook: User timeline + Audit timeline for primary account.",
@@ -45,7 +78,7 @@ def build_investigation_bundle_offline(ctx: IncidentContext) -> Dict[str, Any]:
     ]
 
     return {
-        "schema_version": "1.0",
+        "schema_version": "2.0" if slim else "1.0",
         "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
         "mode": "offline",
         "incident": {
@@ -75,3 +108,32 @@ def build_investigation_bundle_offline(ctx: IncidentContext) -> Dict[str, Any]:
             "soar_pb02": "/playbooks-soar/PB-02-manual-containment/"
         }
     }
+
+def build_investigation_bundle_cached(
+    ctx: IncidentContext,
+    cache: ArtifactCache,
+    slim: bool = False,
+    provider: Optional[OfflineProvider] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Memoized build_investigation_bundle_offline. The key covers the incident
+    context, the digests of only the day partitions the incident window
+    touches, the bundle format and the package code version, so changing data
+    outside an incident's window does not rebuild its bundle.
+    Returns (bundle, was_cached).
+    """
+    if provider is None:
+        provider = OfflineProvider()
+    inputs = {
+        "incident": asdict(ctx),
+        "slim": slim,
+        "data": provider.fingerprint(_dt(ctx.time_start), _dt(ctx.time_end), with_offsets=slim),
+        "code": package_code_version(),
+    }
+    return cache.memoize("bundle", inputs, lambda: build_investigation_bundle_offline(ctx, slim=slim, provider=provider))
+
+def dump_bundle(bundle: Dict[str, Any]) -> str:
+    # v2 bundles are machine-consumed: write them without whitespace.
+    if bundle.get("schema_version") == "2.0":
+        return json.dumps(bundle, separators=(",", ":"))
+    return json.dumps(bundle, indent=2)
@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, List, Optional, Tuple
+
+# Fields the downstream consumers (summarize.py, make_github_dispatch_payload.py)
+# actually read. Everything else stays in the source partition behind a ref.
+SIGNIN_PROJECTION: Tuple[str, ...] = (
+    "TimeGenerated",
+    "UserPrincipalName",
+    "IPAddress",
+    "AppDisplayName",
+    "ClientAppUsed",
+    "Status.errorCode",
+    "Location.countryOrRegion",
+)
+
+AUDIT_PROJECTION: Tuple[str, ...] = (
+    "TimeGenerated",
+    "OperationName",
+    "Result",
+    "InitiatedBy.user.userPrincipalName",
+)
+
+def project(event: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Copy only the dotted `fields` of an event, keeping the original nesting so
+    consumers can read a projected event exactly like a full one.
+    """
+    out: Dict[str, Any] = {}
+    for path in fields:
+        keys = path.split(".")
+        cur: Any = event
+        for k in keys:
+            if not isinstance(cur, dict) or k not in cur:
+                break
+            cur = cur[k]
+        else:
+            dst = out
+            for k in keys[:-1]:
+                dst = dst.setdefault(k, {})
+            dst[keys[-1]] = cur
+    return out
+
+def make_ref(partition: str, offset: int) -> Dict[str, Any]:
+    return {"partition": partition, "offset": offset}
+
+class EventResolver:
+    """
+    Lazily resolves {"partition", "offset"} refs from slim (v2) bundles back to
+    the full raw event by seeking into the partition's JSONL file.
+
+    Files are opened on first use and resolved events are cached, so consumers
+    that never ask for a full event never touch the logs.
+    """
+
+    def __init__(self, partitions: Dict[str, Path]) -> None:
+        self.partitions = {name: Path(p) for name, p in partitions.items()}
+        self._handles: Dict[str, IO[bytes]] = {}
+        self._cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def _handle(self, partition: str) -> IO[bytes]:
+        f = self._handles.get(partition)
+        if f is None:
+            if partition not in self.partitions:
+                raise KeyError(f"Unknown partition in event ref: {partition}")
+            f = self.partitions[partition].open("rb")
+            self._handles[partition] = f
+        return f
+
+    def resolve(self, ref: Dict[str, Any]) -> Dict[str, Any]:
+        key = (ref["partition"], int(ref["offset"]))
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        f = self._handle(key[0])
+        f.seek(key[1])
+        event = json.loads(f.readline())
+        self._cache[key] = event
+        return event
+
+    def resolve_many(self, refs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.resolve(r) for r in refs]
+
+    def close(self) -> None:
+        for f in self._handles.values():
+            f.close()
+        self._handles.clear()
+
+    def __enter__(self) -> "EventResolver":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+def expand_bundle(bundle: Dict[str, Any], resolver: Optional[EventResolver] = None) -> Dict[str, Any]:
+    """
+    Return a v1-shaped copy of a slim bundle with every projected event replaced
+    by its full raw event. v1 bundles are returned unchanged.
+    """
+    if bundle.get("schema_version") != "2.0":
+        return bundle
+    if resolver is None:
+        from .offline_provider import default_partitions
+        resolver = EventResolver(default_partitions())
+
+    evidence = dict(bundle.get("evidence", {}))
+    evidence["recent_signins"] = {
+        u: [resolver.resolve(e["ref"]) for e in rows]
+        for u, rows in (evidence.get("recent_signins") or {}).items()
+    }
+    evidence["audit_events"] = [resolver.resolve(e["ref"]) for e in evidence.get("audit_events") or []]
+
+    out = dict(bundle)
+    out["schema_version"] = "1.0"
+    out["evidence"] = evidence
+    return out
@@ -0,0 +1,232 @@
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import socket
+import struct
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+IP_INTEL_DIR = REPO_ROOT / "data" / "ip-intel"
+IP_INTEL_INDEX = IP_INTEL_DIR / "ip-intel.idx"
+
+# Default for providers' ip_intel argument: open the default index. Passing
+# None instead turns IP intel off.
+DEFAULT_IP_INTEL: Any = object()
+
+# Index file layout (all integers big-endian):
+#   header  : MAGIC (8) | count (u64) | meta_offset (u64)
+#   starts  : count x 16-byte range start (IPv4 stored as ::ffff:a.b.c.d)
+#   ends    : count x 16-byte range end (inclusive)
+#   meta_ids: count x u32 index into the metadata table
+#   meta    : UTF-8 JSON list of {"asn", "as_org", "country", "tags"}
+# Ranges are disjoint and sorted, so a lookup is one binary search over `starts`.
+MAGIC = b"IPIX0001"
+_HEADER = struct.Struct(">8sQQ")
+_KEY = 16
+_V4_PREFIX = b"\x00" * 10 + b"\xff\xff"
+
+def ip_key(ip: str) -> Optional[bytes]:
+    """16-byte sortable key for an IPv4/IPv6 address string, or None if it isn't one."""
+    try:
+        if ":" in ip:
+            return socket.inet_pton(socket.AF_INET6, ip)
+        return _V4_PREFIX + socket.inet_pton(socket.AF_INET, ip)
+    except (OSError, TypeError):
+        return None
+
+def _network_bounds(cidr: str) -> Tuple[bytes, bytes]:
+    net = ipaddress.ip_network(cidr.strip(), strict=False)
+    lo, hi = net.network_address.packed, net.broadcast_address.packed
+    if net.version == 4:
+        return _V4_PREFIX + lo, _V4_PREFIX + hi
+    return lo, hi
+
+def _int(b: bytes) -> int:
+    return int.from_bytes(b, "big")
+
+def _bytes(i: int) -> bytes:
+    return i.to_bytes(_KEY, "big")
+
+def load_csv_ranges(paths: Iterable[Path]) -> List[Tuple[bytes, bytes, Dict[str, Any]]]:
+    """
+    Read `cidr,asn,as_org,country,tags` rows (tags separated by ';').
+    Later files win over earlier ones for identical CIDRs.
+    """
+    ranges: List[Tuple[bytes, bytes, Dict[str, Any]]] = []
+    for path in paths:
+        with Path(path).open("r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                cidr = (row.get("cidr") or "").strip()
+                if not cidr or cidr.startswith("#"):
+                    continue
+                lo, hi = _network_bounds(cidr)
+                meta = {
+                    "asn": (row.get("asn") or "").strip() or None,
+                    "as_org": (row.get("as_org") or "").strip() or None,
+                    "country": (row.get("country") or "").strip() or None,
+                    "tags": sorted({t.strip() for t in (row.get("tags") or "").split(";") if t.strip()}),
+                }
+                ranges.append((lo, hi, meta))
+    return ranges
+
+def flatten_ranges(ranges: List[Tuple[bytes, bytes, Dict[str, Any]]]) -> List[Tuple[int, int, Dict[str, Any]]]:
+    """
+    CIDR blocks are either disjoint or nested. Split them into disjoint
+    intervals where the most specific block wins, merging neighbours with
+    identical metadata.
+    """
+    items = sorted(
+        ((_int(lo), _int(hi), i, meta) for i, (lo, hi, meta) in enumerate(ranges)),
+        key=lambda r: (r[0], -r[1], r[2]),
+    )
+    out: List[Tuple[int, int, Dict[str, Any]]] = []
+
+    def emit(lo: int, hi: int, meta: Dict[str, Any]) -> None:
+        if lo > hi:
+            return
+        if out and out[-1][1] + 1 == lo and out[-1][2] == meta:
+            out[-1] = (out[-1][0], hi, meta)
+        else:
+            out.append((lo, hi, meta))
+
+    stack: List[Tuple[int, int, Dict[str, Any]]] = []
+    pos = 0
+    for lo, hi, _, meta in items:
+        while stack and stack[-1][1] < lo:
+            top = stack.pop()
+            emit(pos, top[1], top[2])
+            pos = top[1] + 1
+        if stack:
+            emit(pos, lo - 1, stack[-1][2])
+        pos = lo
+        stack.append((lo, hi, meta))
+    while stack:
+        top = stack.pop()
+        emit(pos, top[1], top[2])
+        pos = top[1] + 1
+    return out
+
+def compile_index(csv_paths: Iterable[Path], out_path: Path = IP_INTEL_INDEX) -> int:
+    """Compile CIDR CSVs into the mmap-able interval index. Returns the interval count."""
+    intervals = flatten_ranges(load_csv_ranges(csv_paths))
+
+    metas: List[Dict[str, Any]] = []
+    meta_ids: Dict[str, int] = {}
+    ids: List[int] = []
+    for _, _, meta in intervals:
+        k = json.dumps(meta, sort_keys=True)
+        if k not in meta_ids:
+            meta_ids[k] = len(metas)
+            metas.append(meta)
+        ids.append(meta_ids[k])
+
+    n = len(intervals)
+    meta_offset = _HEADER.size + n * (_KEY * 2 + 4)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # unique tmp name: concurrent processes may compile the same index at once
+    fd, tmp = tempfile.mkstemp(prefix=out_path.name + ".", suffix=".tmp", dir=out_path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, n, meta_offset))
+            f.write(b"".join(_bytes(lo) for lo, _, _ in intervals))
+            f.write(b"".join(_bytes(hi) for _, hi, _ in intervals))
+            f.write(b"".join(struct.pack(">I", i) for i in ids))
+            f.write(json.dumps(metas, separators=(",", ":")).encode("utf-8"))
+        os.replace(tmp, out_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return n
+
+class IntelRecord(dict):
+    """
+    One metadata row, frozen at load: every lookup of an address in its range
+    returns this same object, so it must not change under other callers. Still
+    a dict (tags a tuple), so it serializes and pickles like the plain row.
+    """
+
+    def _read_only(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("IP intel records are read-only; copy with dict(record) to modify")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return IntelRecord, (dict(self),)
+
+def _freeze(meta: Dict[str, Any]) -> IntelRecord:
+    return IntelRecord({k: tuple(v) if isinstance(v, list) else v for k, v in meta.items()})
+
+class IpIntel:
+    """
+    Read-only lookups against a compiled index. The interval arrays stay in the
+    memory-mapped file; only the (small) metadata table is parsed, into frozen
+    IntelRecords that lookups return without copying. Recent addresses are
+    served from an LRU.
+    """
+
+    def __init__(self, path: Path = IP_INTEL_INDEX, cache_size: int = 65536) -> None:
+        self.path = Path(path)
+        self._f = self.path.open("rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, meta_offset = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not an IP intel index: {self.path}")
+        self._starts = _HEADER.size
+        self._ends = self._starts + self.count * _KEY
+        self._ids = self._ends + self.count * _KEY
+        self._meta: List[IntelRecord] = [_freeze(m) for m in json.loads(self._mm[meta_offset:].decode("utf-8"))]
+        st = self.path.stat()
+        self.fingerprint = f"{st.st_size}:{st.st_mtime_ns}"
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, ip: str) -> Optional[IntelRecord]:
+        key = ip_key(ip)
+        if key is None or not self.count:
+            return None
+        mm, starts = self._mm, self._starts
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off = starts + mid * _KEY
+            if mm[off:off + _KEY] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        i = lo - 1
+        if i < 0:
+            return None
+        end_off = self._ends + i * _KEY
+        if mm[end_off:end_off + _KEY] < key:
+            return None
+        meta_id = int.from_bytes(mm[self._ids + i * 4:self._ids + i * 4 + 4], "big")
+        return self._meta[meta_id]
+
+    def lookup_many(self, ips: Iterable[str]) -> Dict[str, Optional[IntelRecord]]:
+        return {ip: self.lookup(ip) for ip in set(ips)}
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+def resolve_ip_intel(ip_intel: Any) -> Optional[IpIntel]:
+    """A provider's ip_intel argument: DEFAULT_IP_INTEL -> the default index, None -> no intel."""
+    return load_default_ip_intel() if ip_intel is DEFAULT_IP_INTEL else ip_intel
+
+def load_default_ip_intel() -> Optional[IpIntel]:
+    """
+    Open data/ip-intel/ip-intel.idx, (re)compiling it from data/ip-intel/*.csv
+    when it is missing or older than the CSVs. None when no CSVs exist.
+    """
+    csvs = sorted(IP_INTEL_DIR.glob("*.csv")) if IP_INTEL_DIR.exists() else []
+    if not csvs:
+        return IpIntel(IP_INTEL_INDEX) if IP_INTEL_INDEX.exists() else None
+    newest = max(p.stat().st_mtime for p in csvs)
+    if not IP_INTEL_INDEX.exists() or IP_INTEL_INDEX.stat().st_mtime < newest:
+        compile_index(csvs, IP_INTEL_INDEX)
+    return IpIntel(IP_INTEL_INDEX)
@@ -0,0 +1,172 @@
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+SCHEMA_DIR = REPO_ROOT / "data" / "schemas"
+
+# Fields every consumer (detections, workbook, bundles) filters on.
+REQUIRED_FIELDS = ("TimeGenerated",)
+
+# Nested values the schema docs only describe loosely but code relies on:
+# table -> [(field, key, normalizer)]. The field must be an object when present
+# (not just any dynamic value); normalizers raise ValueError/TypeError on bad input.
+NESTED_NORMALIZERS: Dict[str, List[Tuple[str, str, Callable[[Any], Any]]]] = {
+    "SigninLogs": [("Status", "errorCode", lambda v: int(v))],
+}
+
+class SchemaError(ValueError):
+    """A record that cannot be normalized; `reason` is a stable, countable category."""
+
+    def __init__(self, reason: str, detail: str = "") -> None:
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+        self.detail = detail
+
+_FIELD_LINE = re.compile(r"^-\s+(\w+)\s+\(([^)]+)\)")
+_CANONICAL_TIME = re.compile(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ$")
+_ISO_TIME = re.compile(r"^(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?$")
+
+def parse_schema_md(path: Path) -> Dict[str, str]:
+    """`- Field (type...)` lines of a data/schemas/*.schema.md file -> {field: type}."""
+    fields: Dict[str, str] = {}
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        m = _FIELD_LINE.match(line.strip())
+        if m:
+            fields[m.group(1)] = m.group(2).strip().lower()
+    return fields
+
+def normalize_time(v: Any) -> str:
+    """TimeGenerated in the sample-log form 2026-01-23T13:55:30Z (UTC, whole seconds)."""
+    if not isinstance(v, str):
+        raise TypeError("not a string")
+    if _CANONICAL_TIME.match(v):
+        return v
+    m = _ISO_TIME.match(v.strip())
+    if not m:
+        raise ValueError("not an ISO-8601 datetime")
+    dt = datetime.strptime(f"{m.group(1)}T{m.group(2)}", "%Y-%m-%dT%H:%M:%S")
+    tz = m.group(3)
+    if tz and tz != "Z":
+        sign = 1 if tz[0] == "+" else -1
+        hh, mm = int(tz[1:3]), int(tz[-2:])
+        dt -= sign * timedelta(hours=hh, minutes=mm)
+    return dt.replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _string(v: Any) -> Any:
+    if v is None or isinstance(v, str):
+        return v
+    if isinstance(v, (int, float, bool)):
+        return str(v)
+    raise TypeError(f"expected string, got {type(v).__name__}")
+
+def _decode_dynamic(v: Any) -> Any:
+    # Exports often carry dynamic columns as JSON-encoded strings.
+    if isinstance(v, str) and v[:1] in ("{", "["):
+        return json.loads(v)
+    return v
+
+def _dynamic(v: Any) -> Any:
+    v = _decode_dynamic(v)
+    if v is None or isinstance(v, (dict, list)):
+        return v
+    raise TypeError(f"expected object, got {type(v).__name__}")
+
+def _dynamic_or_string(v: Any) -> Any:
+    v = _decode_dynamic(v)
+    if v is None or isinstance(v, (dict, list, str)):
+        return v
+    raise TypeError(f"expected object or string, got {type(v).__name__}")
+
+def _dynamic_array(v: Any) -> Any:
+    v = _decode_dynamic(v)
+    if v is None:
+        return []
+    if isinstance(v, list):
+        return v
+    raise TypeError(f"expected array, got {type(v).__name__}")
+
+def _type_normalizer(type_desc: str) -> Optional[Callable[[Any], Any]]:
+    if type_desc.startswith("datetime"):
+        return normalize_time
+    if type_desc.startswith("dynamic array"):
+        return _dynamic_array
+    if type_desc.startswith("dynamic/string"):
+        return _dynamic_or_string
+    if type_desc.startswith("dynamic"):
+        return _dynamic
+    if type_desc.startswith("string"):
+        return _string
+    return None
+
+class RecordValidator:
+    """
+    Checks compiled once from a schema doc: a flat list of (field, normalizer)
+    pairs plus required fields and nested normalizers. validate() returns the
+    normalized record (same key order) or raises SchemaError.
+    """
+
+    def __init__(self, table: str, fields: Dict[str, str]) -> None:
+        self.table = table
+        self.fields = fields
+        self.required = [f for f in REQUIRED_FIELDS if f in fields] or list(REQUIRED_FIELDS)
+        self._checks = [(name, fn) for name, t in fields.items() if (fn := _type_normalizer(t)) is not None]
+        self._nested = NESTED_NORMALIZERS.get(table, [])
+
+    def validate(self, record: Any) -> Dict[str, Any]:
+        if not isinstance(record, dict):
+            raise SchemaError("not a JSON object", type(record).__name__)
+        for name in self.required:
+            if record.get(name) in (None, ""):
+                raise SchemaError(f"missing {name}")
+        out = dict(record)
+        for name, fn in self._checks:
+            if name in out:
+                try:
+                    out[name] = fn(out[name])
+                except (TypeError, ValueError) as e:
+                    raise SchemaError(f"bad {name}", str(e))
+        for name, key, fn in self._nested:
+            parent = out.get(name)
+            if parent is None:
+                continue
+            if not isinstance(parent, dict):
+                raise SchemaError(f"bad {name}", f"expected object, got {type(parent).__name__}")
+            if key in parent:
+                try:
+                    out[name] = {**parent, key: fn(parent[key])}
+                except (TypeError, ValueError) as e:
+                    raise SchemaError(f"bad {name}.{key}", str(e))
+        return out
+
+@lru_cache(maxsize=None)
+def load_validator(table: str, schema_dir: Path = SCHEMA_DIR) -> RecordValidator:
+    path = Path(schema_dir) / f"{table}.schema.md"
+    if not path.exists():
+        raise FileNotFoundError(f"No schema for table {table}: {path}")
+    return RecordValidator(table, parse_schema_md(path))
+
+def known_tables(schema_dir: Path = SCHEMA_DIR) -> List[str]:
+    return sorted(p.name[: -len(".schema.md")] for p in Path(schema_dir).glob("*.schema.md"))
+
+def row_checker(path: Path, table: Optional[str] = None) -> Callable[[Any], Optional[Dict[str, Any]]]:
+    """
+    For in-process loaders: normalized record, or None for a row that should be
+    skipped. Uses the schema of `table`, else the one named after the file
+    (SigninLogs.jsonl -> SigninLogs) when there is one, else only requires a
+    TimeGenerated string.
+    """
+    table = table or Path(path).name.split(".")[0]
+    if table in known_tables():
+        validator = load_validator(table)
+
+        def check(row: Any) -> Optional[Dict[str, Any]]:
+            try:
+                return validator.validate(row)
+            except SchemaError:
+                return None
+        return check
+    return lambda row: row if isinstance(row, dict) and isinstance(row.get("TimeGenerated"), str) else None
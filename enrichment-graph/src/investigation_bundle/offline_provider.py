@@ -1,7 +1,17 @@
+import bisect
+import hashlib
 import json
+import sys
+import threading
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .bounded_evidence import TopK
+from .event_refs import AUDIT_PROJECTION, SIGNIN_PROJECTION, make_ref, project
+from .ip_intel import DEFAULT_IP_INTEL, IpIntel, resolve_ip_intel
+from .log_schema import row_checker
+from . import timeline as tl
 
 REPO_ROOT = Path(__file__).resolve().parents[3]
 SIGNIN_PATH = REPO_ROOT / "data" / "sample-logs" / "SigninLogs.jsonl"
@@ -11,48 +21,148 @@ def _parse_time(s: str) -> datetime:
     # Format used in our sample logs: 2026-01-23T13:55:30Z
     return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
 
-def _load_jsonl(path: Path) -> List[Dict[str, Any]]:
+SIGNIN_PARTITION = "SigninLogs"
+AUDIT_PARTITION = "AuditLogs"
+
+def default_partitions() -> Dict[str, Path]:
+    return {SIGNIN_PARTITION: SIGNIN_PATH, AUDIT_PARTITION: AUDIT_PATH}
+
+def _error_code(r: Dict[str, Any]) -> int:
+    status = r.get("Status")
+    return int(status.get("errorCode", 0)) if isinstance(status, dict) else 0
+
+def _country(r: Dict[str, Any]) -> Optional[str]:
+    # Location may also be a plain string (schema: dynamic/string), which has no country
+    loc = r.get("Location")
+    return loc.get("countryOrRegion") if isinstance(loc, dict) else None
+
+def _load_jsonl(path: Path) -> Tuple[List[Dict[str, Any]], List[int], Dict[str, Tuple[str, str]]]:
+    # Returns rows plus the byte offset of each row, so slim bundles can
+    # reference events instead of copying them, and per-UTC-day digests
+    # (content, content+offsets) used as partition fingerprints for caching.
     if not path.exists():
         raise FileNotFoundError(f"Missing {path}. Run tools/local-kql/generate_sample_logs.py first.")
     rows: List[Dict[str, Any]] = []
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
+    offsets: List[int] = []
+    hashes: Dict[str, Tuple[Any, Any]] = {}
+    pos = 0
+    check = row_checker(path)
+    skipped = 0
+    with path.open("rb") as f:
+        for raw in f:
+            line = raw.strip()
             if line:
-                rows.append(json.loads(line))
-    return rows
+                try:
+                    row = check(json.loads(line))
+                except ValueError:
+                    row = None
+                if row is None:
+                    skipped += 1
+                    pos += len(raw)
+                    continue
+                rows.append(row)
+                offsets.append(pos)
+                day = str(row.get("TimeGenerated", ""))[:10]
+                h = hashes.get(day)
+                if h is None:
+                    h = hashes[day] = (hashlib.blake2b(digest_size=16), hashlib.blake2b(digest_size=16))
+                h[0].update(line + b"\n")
+                h[1].update(b"%d:" % pos + line + b"\n")
+            pos += len(raw)
+    if skipped:
+        print(f"WARNING: skipped {skipped} malformed line(s) in {path}", file=sys.stderr)
+    return rows, offsets, {day: (h[0].hexdigest(), h[1].hexdigest()) for day, h in hashes.items()}
 
 class OfflineProvider:
     """
     Offline evidence provider that reads Entra-shaped sample data from:
     - data/sample-logs/SigninLogs.jsonl
     - data/sample-logs/AuditLogs.jsonl
+    (or the signin_path / audit_path given, e.g. one tenant's export)
+
+    IP summaries carry ASN/country/tags from the offline IP intel index
+    (data/ip-intel/) when one is available.
     """
 
-    def __init__(self) -> None:
-        self.signins = _load_jsonl(SIGNIN_PATH)
-        self.audit = _load_jsonl(AUDIT_PATH)
+    def __init__(self, ip_intel: Optional[IpIntel] = DEFAULT_IP_INTEL, signin_path: Path = SIGNIN_PATH, audit_path: Path = AUDIT_PATH) -> None:
+        self.ip_intel = resolve_ip_intel(ip_intel)
+        self.signin_path, self.audit_path = Path(signin_path), Path(audit_path)
+        self.signins, self.signin_offsets, self.signin_days = _load_jsonl(self.signin_path)
+        self.audit, self.audit_offsets, self.audit_days = _load_jsonl(self.audit_path)
+        self._loaded_stats = self._source_stats()
+        self._timeline_index: Optional[Dict[Tuple[str, str], List[tl.TimelineKey]]] = None
+        self._timeline_lock = threading.Lock()
+
+    def partitions(self) -> Dict[str, Path]:
+        """Partition name -> file, for resolving event refs in this provider's bundles."""
+        return {SIGNIN_PARTITION: self.signin_path, AUDIT_PARTITION: self.audit_path}
+
+    def _source_stats(self) -> Tuple[Tuple[int, int], ...]:
+        return tuple((st.st_mtime_ns, st.st_size) for st in (self.signin_path.stat(), self.audit_path.stat()))
+
+    def is_stale(self) -> bool:
+        """True once either source log has been rewritten since it was loaded."""
+        return self._source_stats() != self._loaded_stats
+
+    def fingerprint(self, start: datetime, end: datetime, with_offsets: bool = False) -> Dict[str, Any]:
+        """
+        Digests of the day partitions overlapping [start, end]: everything a
+        bundle for that window can depend on. with_offsets=True also covers
+        byte positions (slim bundles embed them in event refs).
+        """
+        which = 1 if with_offsets else 0
+        days = []
+        d = start.date()
+        while d <= end.date():
+            days.append(d.isoformat())
+            d += timedelta(days=1)
+        fp: Dict[str, Any] = {
+            SIGNIN_PARTITION: {day: self.signin_days[day][which] for day in days if day in self.signin_days},
+            AUDIT_PARTITION: {day: self.audit_days[day][which] for day in days if day in self.audit_days},
+        }
+        if self.ip_intel is not None:
+            fp["ip_intel"] = self.ip_intel.fingerprint
+        return fp
 
     def _in_range(self, t: str, start: datetime, end: datetime) -> bool:
         dt = _parse_time(t)
         return start <= dt <= end
 
+    def _recent_user_signin_idx(self, upn: str, start: datetime, end: datetime, limit: int) -> List[int]:
+        # newest `limit` matches via a bounded heap instead of sorting every match
+        signins = self.signins
+        top: TopK[int] = TopK(limit, key=lambda i: signins[i]["TimeGenerated"])
+        for i, r in enumerate(signins):
+            if r.get("UserPrincipalName") == upn and self._in_range(r["TimeGenerated"], start, end):
+                top.add(i)
+        return top.items()
+
+    def _audit_idx(self, start: datetime, end: datetime, limit: int) -> List[int]:
+        audit = self.audit
+        top: TopK[int] = TopK(limit, key=lambda i: audit[i]["TimeGenerated"])
+        for i, r in enumerate(audit):
+            if self._in_range(r["TimeGenerated"], start, end):
+                top.add(i)
+        return top.items()
+
     def recent_signins_for_user(self, upn: str, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
-        rows = [
-            r for r in self.signins
-            if r.get("UserPrincipalName") == upn and self._in_range(r["TimeGenerated"], start, end)
+        return [self.signins[i] for i in self._recent_user_signin_idx(upn, start, end, limit)]
+
+    def recent_signin_refs_for_user(self, upn: str, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        """Projected sign-ins (newest first), each carrying a ref to the full event."""
+        return [
+            {"ref": make_ref(SIGNIN_PARTITION, self.signin_offsets[i]), **project(self.signins[i], SIGNIN_PROJECTION)}
+            for i in self._recent_user_signin_idx(upn, start, end, limit)
         ]
-        rows.sort(key=lambda x: x["TimeGenerated"], reverse=True)
-        return rows[:limit]
 
     def signin_summary_for_user(self, upn: str, start: datetime, end: datetime) -> Dict[str, Any]:
         rows = [
             r for r in self.signins
             if r.get("UserPrincipalName") == upn and self._in_range(r["TimeGenerated"], start, end)
         ]
-        success = sum(1 for r in rows if int(r.get("Status", {}).get("errorCode", 0)) == 0)
-        failure = sum(1 for r in rows if int(r.get("Status", {}).get("errorCode", 0)) != 0)
-        countries = sorted({(r.get("Location") or {}).get("countryOrRegion") for r in rows if r.get("Location")})
+        success = sum(1 for r in rows if _error_code(r) == 0)
+        failure = sum(1 for r in rows if _error_code(r) != 0)
+        countries = sorted({c for r in rows if (c := _country(r))})
         ips = sorted({r.get("IPAddress") for r in rows if r.get("IPAddress")})
         apps = sorted({r.get("AppDisplayName") for r in rows if r.get("AppDisplayName")})
         legacy = sum(1 for r in rows if (r.get("ClientAppUsed") or "").lower().find("legacy") >= 0)
@@ -70,13 +180,13 @@ class OfflineProvider:
 
     def ip_summary(self, ip: str, start: datetime, end: datetime) -> Dict[str, Any]:
         rows = [r for r in self.signins if r.get("IPAddress") == ip and self._in_range(r["TimeGenerated"], start, end)]
-        failures = sum(1 for r in rows if int(r.get("Status", {}).get("errorCode", 0)) != 0)
-        successes = sum(1 for r in rows if int(r.get("Status", {}).get("errorCode", 0)) == 0)
+        failures = sum(1 for r in rows if _error_code(r) != 0)
+        successes = sum(1 for r in rows if _error_code(r) == 0)
         users = sorted({r.get("UserPrincipalName") for r in rows if r.get("UserPrincipalName")})
-        countries = sorted({(r.get("Location") or {}).get("countryOrRegion") for r in rows if r.get("Location")})
+        countries = sorted({c for r in rows if (c := _country(r))})
         apps = sorted({r.get("AppDisplayName") for r in rows if r.get("AppDisplayName")})
 
-        return {
+        summary = {
             "ip": ip,
             "total": len(rows),
             "failures": failures,
@@ -86,8 +196,77 @@ class OfflineProvider:
             "countries": countries,
             "apps": apps[:20],
         }
+        if self.ip_intel is not None:
+            summary["intel"] = self.ip_intel.lookup(ip)
+        return summary
 
     def audit_events(self, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
-        rows = [r for r in self.audit if self._in_range(r["TimeGenerated"], start, end)]
-        rows.sort(key=lambda x: x["TimeGenerated"], reverse=True)
-        return rows[:limit]
+        return [self.audit[i] for i in self._audit_idx(start, end, limit)]
+
+    def audit_event_refs(self, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        """Projected audit events (newest first), each carrying a ref to the full event."""
+        return [
+            {"ref": make_ref(AUDIT_PARTITION, self.audit_offsets[i]), **project(self.audit[i], AUDIT_PROJECTION)}
+            for i in self._audit_idx(start, end, limit)
+        ]
+
+    def _timelines(self) -> Dict[Tuple[str, str], List[tl.TimelineKey]]:
+        # (kind, value) -> ascending (TimeGenerated, rank, row index) keys, built once on first use
+        with self._timeline_lock:
+            if self._timeline_index is None:
+                index: Dict[Tuple[str, str], List[tl.TimelineKey]] = {}
+                rank = tl.TABLE_RANK[SIGNIN_PARTITION]
+                for i, r in enumerate(self.signins):
+                    for kind, value in (("user", r.get("UserPrincipalName")), ("ip", r.get("IPAddress"))):
+                        if value:
+                            index.setdefault((kind, value), []).append((r["TimeGenerated"], rank, i))
+                rank = tl.TABLE_RANK[AUDIT_PARTITION]
+                for i, r in enumerate(self.audit):
+                    upn, ip = tl.audit_actor(r)
+                    for kind, value in (("user", upn), ("ip", ip)):
+                        if value:
+                            index.setdefault((kind, value), []).append((r["TimeGenerated"], rank, i))
+                for keys in index.values():
+                    keys.sort()
+                self._timeline_index = index
+            return self._timeline_index
+
+    def timeline(
+        self,
+        kind: str,
+        value: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page of the merged sign-in + audit timeline of a user or IP,
+        newest first: {"events": [...], "next_cursor": str or None}. Pass
+        next_cursor back to get the following page. Each event carries its
+        table, a ref to the full event and the projected `fields` (default:
+        the workbook timeline columns).
+        """
+        tl.check_kind(kind)
+        limit = tl.page_size(limit)
+        bounds = tl.time_bounds(start, end)
+        # the loaded files' mtime and size are part of the scope: a cursor
+        # from before a reload does not resume against different data
+        scope = json.dumps([str(self.signin_path), str(self.audit_path), self._loaded_stats])
+        qd = tl.query_digest(scope, kind, value, bounds)
+        after = tl.decode_cursor(cursor, qd, bounds[1])
+        keys = self._timelines().get((kind, value), [])
+        # two binary searches, then a slice of at most limit+1 keys
+        lo = bisect.bisect_left(keys, (bounds[0],))
+        hi = bisect.bisect_left(keys, after)
+        fields_by_table = tl.resolve_fields(fields)
+        entries = []
+        for key in reversed(keys[max(lo, hi - limit - 1):hi]):
+            i = key[2]
+            if key[1] == tl.TABLE_RANK[SIGNIN_PARTITION]:
+                entry = tl.timeline_entry(SIGNIN_PARTITION, make_ref(SIGNIN_PARTITION, self.signin_offsets[i]), self.signins[i], fields_by_table)
+            else:
+                entry = tl.timeline_entry(AUDIT_PARTITION, make_ref(AUDIT_PARTITION, self.audit_offsets[i]), self.audit[i], fields_by_table)
+            entries.append((key, entry))
+        return tl.build_page(entries, limit, qd)
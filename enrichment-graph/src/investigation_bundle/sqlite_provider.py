@@ -0,0 +1,428 @@
+import hashlib
+import json
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .event_refs import AUDIT_PROJECTION, SIGNIN_PROJECTION, project
+from .ip_intel import DEFAULT_IP_INTEL, IpIntel, resolve_ip_intel
+from .log_schema import SchemaError, load_validator
+from .offline_provider import AUDIT_PARTITION, SIGNIN_PARTITION
+from . import timeline as tl
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_DB_PATH = REPO_ROOT / "data" / "events.sqlite"
+STATEMENT_CACHE = 64  # per connection; every query below is a fixed SQL string
+
+_TIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Hot columns are extracted for indexing and SQL aggregates; the full event
+# stays in `raw`. TimeGenerated is stored in the normalized sample-log form,
+# so string comparison is time comparison.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, tbl TEXT NOT NULL,
+    offset INTEGER NOT NULL, head TEXT NOT NULL, head_len INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signins (
+    id INTEGER PRIMARY KEY,
+    TimeGenerated TEXT NOT NULL,
+    UserPrincipalName TEXT,
+    IPAddress TEXT,
+    AppDisplayName TEXT,
+    ClientAppUsed TEXT,
+    errorCode INTEGER NOT NULL,
+    country TEXT,
+    src INTEGER NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_signins_upn_time ON signins (UserPrincipalName, TimeGenerated);
+CREATE INDEX IF NOT EXISTS ix_signins_ip_time ON signins (IPAddress, TimeGenerated);
+CREATE INDEX IF NOT EXISTS ix_signins_time ON signins (TimeGenerated);
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY,
+    TimeGenerated TEXT NOT NULL,
+    OperationName TEXT,
+    InitiatedByUpn TEXT,
+    InitiatedByIp TEXT,
+    src INTEGER NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_audit_time ON audit (TimeGenerated);
+"""
+
+# Created after _migrate(), since stores from before the timeline API lack these columns.
+ACTOR_INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_audit_upn_time ON audit (InitiatedByUpn, TimeGenerated);
+CREATE INDEX IF NOT EXISTS ix_audit_ip_time ON audit (InitiatedByIp, TimeGenerated);
+"""
+
+_SQL_TABLES = {SIGNIN_PARTITION: "signins", AUDIT_PARTITION: "audit"}
+
+_INSERT_SIGNIN = (
+    "INSERT INTO signins (TimeGenerated, UserPrincipalName, IPAddress, AppDisplayName, ClientAppUsed, errorCode, country, src, raw) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_AUDIT = "INSERT INTO audit (TimeGenerated, OperationName, InitiatedByUpn, InitiatedByIp, src, raw) VALUES (?, ?, ?, ?, ?, ?)"
+
+_Q_USER_SUMMARY = """
+SELECT count(*), coalesce(sum(errorCode = 0), 0), coalesce(sum(errorCode != 0), 0),
+       coalesce(sum(instr(lower(coalesce(ClientAppUsed, '')), 'legacy') > 0), 0)
+FROM signins WHERE UserPrincipalName = ? AND TimeGenerated BETWEEN ? AND ?
+"""
+_Q_USER_COUNTRIES = "SELECT DISTINCT country FROM signins WHERE UserPrincipalName = ? AND TimeGenerated BETWEEN ? AND ? AND country IS NOT NULL ORDER BY country"
+_Q_USER_IPS = "SELECT DISTINCT IPAddress FROM signins WHERE UserPrincipalName = ? AND TimeGenerated BETWEEN ? AND ? AND IPAddress IS NOT NULL AND IPAddress != '' ORDER BY IPAddress"
+_Q_USER_APPS = "SELECT DISTINCT AppDisplayName FROM signins WHERE UserPrincipalName = ? AND TimeGenerated BETWEEN ? AND ? AND AppDisplayName IS NOT NULL AND AppDisplayName != '' ORDER BY AppDisplayName"
+_Q_USER_RECENT = "SELECT id, raw FROM signins WHERE UserPrincipalName = ? AND TimeGenerated BETWEEN ? AND ? ORDER BY TimeGenerated DESC, id ASC LIMIT ?"
+
+_Q_IP_SUMMARY = """
+SELECT count(*), coalesce(sum(errorCode != 0), 0), coalesce(sum(errorCode = 0), 0),
+       count(DISTINCT nullif(UserPrincipalName, ''))
+FROM signins WHERE IPAddress = ? AND TimeGenerated BETWEEN ? AND ?
+"""
+_Q_IP_USERS = "SELECT DISTINCT UserPrincipalName FROM signins WHERE IPAddress = ? AND TimeGenerated BETWEEN ? AND ? AND UserPrincipalName IS NOT NULL AND UserPrincipalName != '' ORDER BY UserPrincipalName LIMIT 20"
+_Q_IP_COUNTRIES = "SELECT DISTINCT country FROM signins WHERE IPAddress = ? AND TimeGenerated BETWEEN ? AND ? AND country IS NOT NULL ORDER BY country"
+_Q_IP_APPS = "SELECT DISTINCT AppDisplayName FROM signins WHERE IPAddress = ? AND TimeGenerated BETWEEN ? AND ? AND AppDisplayName IS NOT NULL AND AppDisplayName != '' ORDER BY AppDisplayName LIMIT 20"
+
+_Q_AUDIT_RECENT = "SELECT id, raw FROM audit WHERE TimeGenerated BETWEEN ? AND ? ORDER BY TimeGenerated DESC, id ASC LIMIT ?"
+_Q_SIGNIN_BY_ID = "SELECT raw FROM signins WHERE id = ?"
+_Q_AUDIT_BY_ID = "SELECT raw FROM audit WHERE id = ?"
+
+# Timeline pages: keyset seeks on the per-entity (column, TimeGenerated) indexes
+# (rowid is the implicit last index column), newest first.
+_TIMELINE_SQL = {
+    (SIGNIN_PARTITION, kind): f"SELECT id, TimeGenerated, raw FROM signins WHERE {col} = ? AND TimeGenerated >= ? "
+                              "AND (TimeGenerated, id) < (?, ?) ORDER BY TimeGenerated DESC, id DESC LIMIT ?"
+    for kind, col in (("user", "UserPrincipalName"), ("ip", "IPAddress"))
+}
+_TIMELINE_SQL.update({
+    (AUDIT_PARTITION, kind): f"SELECT id, TimeGenerated, raw FROM audit WHERE {col} = ? AND TimeGenerated >= ? "
+                             "AND (TimeGenerated, id) < (?, ?) ORDER BY TimeGenerated DESC, id DESC LIMIT ?"
+    for kind, col in (("user", "InitiatedByUpn"), ("ip", "InitiatedByIp"))
+})
+
+# per-day fingerprints: the store is append-only, so (row count, max rowid) changes whenever a day does
+_Q_SIGNIN_DAYS = "SELECT substr(TimeGenerated, 1, 10), count(*), max(id) FROM signins WHERE TimeGenerated BETWEEN ? AND ? GROUP BY 1"
+_Q_AUDIT_DAYS = "SELECT substr(TimeGenerated, 1, 10), count(*), max(id) FROM audit WHERE TimeGenerated BETWEEN ? AND ? GROUP BY 1"
+
+def _connect(path: Path, readonly: bool) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = sqlite3.connect(str(path), check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+def open_store(path: Path = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Writer connection; creates the schema (WAL mode) on first use."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = _connect(path, readonly=False)
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.executescript(ACTOR_INDEXES)
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+    conn.commit()
+    return conn
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    # audit actor columns (timeline API): add and backfill from the stored events
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(audit)")}
+    if "InitiatedByUpn" not in cols:
+        with conn:
+            conn.execute("ALTER TABLE audit ADD COLUMN InitiatedByUpn TEXT")
+            conn.execute("ALTER TABLE audit ADD COLUMN InitiatedByIp TEXT")
+            conn.executemany(
+                "UPDATE audit SET InitiatedByUpn = ?, InitiatedByIp = ? WHERE id = ?",
+                ((*tl.audit_actor(json.loads(raw)), rid) for rid, raw in conn.execute("SELECT id, raw FROM audit").fetchall()),
+            )
+
+class ConnectionPool:
+    """Fixed set of read-only connections handed out to concurrent bundle builders."""
+
+    def __init__(self, path: Path, size: int = 4) -> None:
+        self._q: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._conns = [_connect(Path(path), readonly=True) for _ in range(max(1, size))]
+        for c in self._conns:
+            self._q.put(c)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._q.get()
+        try:
+            yield conn
+        finally:
+            self._q.put(conn)
+
+    def close(self) -> None:
+        for c in self._conns:
+            c.close()
+
+# ---------------- ingest ----------------
+HEAD_BYTES = 4096
+
+def _head_digest(path: Path, n: int) -> str:
+    # identifies a file by its first n bytes, which appends never change
+    with path.open("rb") as f:
+        return hashlib.blake2b(f.read(n), digest_size=16).hexdigest()
+
+def _signin_row(e: Dict[str, Any], src: int, raw: str) -> Tuple[Any, ...]:
+    loc = e.get("Location")
+    status = e.get("Status")
+    return (
+        e["TimeGenerated"],
+        e.get("UserPrincipalName"),
+        e.get("IPAddress"),
+        e.get("AppDisplayName"),
+        e.get("ClientAppUsed"),
+        int((status.get("errorCode") if isinstance(status, dict) else None) or 0),
+        loc.get("countryOrRegion") if isinstance(loc, dict) else None,
+        src,
+        raw,
+    )
+
+def _audit_row(e: Dict[str, Any], src: int, raw: str) -> Tuple[Any, ...]:
+    return (e["TimeGenerated"], e.get("OperationName"), *tl.audit_actor(e), src, raw)
+
+def ingest_file(conn: sqlite3.Connection, path: Path, table: str, batch: int = 5000) -> Dict[str, int]:
+    """
+    Append the records of one JSONL file. A file seen before is read from the
+    byte offset where the last ingest stopped (appended exports only add
+    rows); if it was rewritten instead (its first bytes changed or it
+    shrank), its earlier rows are replaced. Rows failing the table schema
+    are skipped and counted.
+    """
+    path = Path(path).resolve()
+    if table == SIGNIN_PARTITION:
+        insert, to_row = _INSERT_SIGNIN, _signin_row
+    elif table == AUDIT_PARTITION:
+        insert, to_row = _INSERT_AUDIT, _audit_row
+    else:
+        raise ValueError(f"Unsupported table: {table}")
+    validator = load_validator(table)
+
+    stats = {"inserted": 0, "skipped": 0, "replaced": 0, "from_offset": 0}
+    rows: List[Tuple[Any, ...]] = []
+    with path.open("rb") as f, conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO sources (path, tbl, offset, head, head_len) VALUES (?, ?, 0, '', 0)",
+            (str(path), table),
+        )
+        src, prev_tbl, offset, head, head_len = conn.execute(
+            "SELECT id, tbl, offset, head, head_len FROM sources WHERE path = ?", (str(path),)
+        ).fetchone()
+        if offset and (offset > path.stat().st_size or _head_digest(path, head_len) != head):
+            stats["replaced"] = conn.execute(f"DELETE FROM {_SQL_TABLES[prev_tbl]} WHERE src = ?", (src,)).rowcount
+            offset = 0
+        stats["from_offset"] = pos = offset
+        f.seek(offset)
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                pos += len(raw)
+                continue
+            try:
+                e = validator.validate(json.loads(line))
+            except (SchemaError, ValueError):
+                if not raw.endswith(b"\n"):
+                    break  # partial last line of a file still being written; picked up next time
+                pos += len(raw)
+                stats["skipped"] += 1
+                continue
+            pos += len(raw)
+            rows.append(to_row(e, src, json.dumps(e)))
+            if len(rows) >= batch:
+                conn.executemany(insert, rows)
+                stats["inserted"] += len(rows)
+                rows.clear()
+        if rows:
+            conn.executemany(insert, rows)
+            stats["inserted"] += len(rows)
+        head_len = min(HEAD_BYTES, pos)
+        conn.execute(
+            "UPDATE sources SET tbl = ?, offset = ?, head = ?, head_len = ? WHERE id = ?",
+            (table, pos, _head_digest(path, head_len), head_len, src),
+        )
+    return stats
+
+# ---------------- provider ----------------
+def _bounds(start: datetime, end: datetime) -> Tuple[str, str]:
+    # stored times have whole seconds: round the lower bound up so BETWEEN matches start <= t <= end
+    if start.microsecond:
+        start = start.replace(microsecond=0) + timedelta(seconds=1)
+    return start.strftime(_TIME_FMT), end.strftime(_TIME_FMT)
+
+def sqlite_ref(partition: str, rowid: int) -> Dict[str, Any]:
+    return {"partition": partition, "rowid": rowid}
+
+class SqliteEventResolver:
+    """EventResolver counterpart for slim bundles built by SqliteProvider ({"partition", "rowid"} refs)."""
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self._pool = pool
+        self._cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def resolve(self, ref: Dict[str, Any]) -> Dict[str, Any]:
+        key = (ref["partition"], int(ref["rowid"]))
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        sql = {SIGNIN_PARTITION: _Q_SIGNIN_BY_ID, AUDIT_PARTITION: _Q_AUDIT_BY_ID}.get(key[0])
+        if sql is None:
+            raise KeyError(f"Unknown partition in event ref: {key[0]}")
+        with self._pool.connection() as conn:
+            row = conn.execute(sql, (key[1],)).fetchone()
+        if row is None:
+            raise KeyError(f"No event {key[1]} in {key[0]}")
+        event = json.loads(row[0])
+        self._cache[key] = event
+        return event
+
+    def resolve_many(self, refs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.resolve(r) for r in refs]
+
+    def close(self) -> None:
+        self._cache.clear()
+
+    def __enter__(self) -> "SqliteEventResolver":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+class SqliteProvider:
+    """
+    Same interface as OfflineProvider, answered from a SQLite store built by
+    enrichment-graph/src/ingest_sqlite.py. Nothing is loaded into memory:
+    each method is one or a few indexed queries with aggregates done in SQL,
+    run on a pooled read-only connection (safe to share across threads).
+    """
+
+    def __init__(self, path: Path = DEFAULT_DB_PATH, ip_intel: Optional[IpIntel] = DEFAULT_IP_INTEL, pool_size: int = 4) -> None:
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"Missing {self.path}. Run enrichment-graph/src/ingest_sqlite.py first.")
+        self.ip_intel = resolve_ip_intel(ip_intel)
+        self.pool = ConnectionPool(self.path, pool_size)
+        with self.pool.connection() as conn:
+            self.store_id = conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+    def is_stale(self) -> bool:
+        # queries always see the latest committed data
+        return False
+
+    def resolver(self) -> SqliteEventResolver:
+        return SqliteEventResolver(self.pool)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _all(self, sql: str, args: Tuple[Any, ...]) -> List[Tuple[Any, ...]]:
+        with self.pool.connection() as conn:
+            return conn.execute(sql, args).fetchall()
+
+    def _col(self, sql: str, args: Tuple[Any, ...]) -> List[Any]:
+        return [r[0] for r in self._all(sql, args)]
+
+    def fingerprint(self, start: datetime, end: datetime, with_offsets: bool = False) -> Dict[str, Any]:
+        """Per-day (count, max rowid) of the window; rowids are also what slim refs embed."""
+        lo = start.strftime("%Y-%m-%dT00:00:00Z")
+        hi = end.strftime("%Y-%m-%dT23:59:59Z")
+        fp: Dict[str, Any] = {
+            "store": self.store_id,
+            SIGNIN_PARTITION: {d: f"{n}:{m}" for d, n, m in self._all(_Q_SIGNIN_DAYS, (lo, hi))},
+            AUDIT_PARTITION: {d: f"{n}:{m}" for d, n, m in self._all(_Q_AUDIT_DAYS, (lo, hi))},
+        }
+        if self.ip_intel is not None:
+            fp["ip_intel"] = self.ip_intel.fingerprint
+        return fp
+
+    def recent_signins_for_user(self, upn: str, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        return [json.loads(raw) for _, raw in self._all(_Q_USER_RECENT, (upn, *_bounds(start, end), limit))]
+
+    def recent_signin_refs_for_user(self, upn: str, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        return [
+            {"ref": sqlite_ref(SIGNIN_PARTITION, rid), **project(json.loads(raw), SIGNIN_PROJECTION)}
+            for rid, raw in self._all(_Q_USER_RECENT, (upn, *_bounds(start, end), limit))
+        ]
+
+    def signin_summary_for_user(self, upn: str, start: datetime, end: datetime) -> Dict[str, Any]:
+        args = (upn, *_bounds(start, end))
+        total, success, failure, legacy = self._all(_Q_USER_SUMMARY, args)[0]
+        return {
+            "user": upn,
+            "total": total,
+            "success": success,
+            "failure": failure,
+            "legacy_auth_count": legacy,
+            "countries": self._col(_Q_USER_COUNTRIES, args),
+            "ips": self._col(_Q_USER_IPS, args),
+            "apps": self._col(_Q_USER_APPS, args),
+        }
+
+    def ip_summary(self, ip: str, start: datetime, end: datetime) -> Dict[str, Any]:
+        args = (ip, *_bounds(start, end))
+        total, failures, successes, n_users = self._all(_Q_IP_SUMMARY, args)[0]
+        summary = {
+            "ip": ip,
+            "total": total,
+            "failures": failures,
+            "successes": successes,
+            "targeted_users_count": n_users,
+            "users": self._col(_Q_IP_USERS, args),
+            "countries": self._col(_Q_IP_COUNTRIES, args),
+            "apps": self._col(_Q_IP_APPS, args),
+        }
+        if self.ip_intel is not None:
+            summary["intel"] = self.ip_intel.lookup(ip)
+        return summary
+
+    def audit_events(self, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        return [json.loads(raw) for _, raw in self._all(_Q_AUDIT_RECENT, (*_bounds(start, end), limit))]
+
+    def audit_event_refs(self, start: datetime, end: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        return [
+            {"ref": sqlite_ref(AUDIT_PARTITION, rid), **project(json.loads(raw), AUDIT_PROJECTION)}
+            for rid, raw in self._all(_Q_AUDIT_RECENT, (*_bounds(start, end), limit))
+        ]
+
+    def timeline(
+        self,
+        kind: str,
+        value: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Same contract as OfflineProvider.timeline. Each page is one index seek
+        per table reading at most limit+1 rows, merged in Python, so paging
+        deep into a busy account costs the same as the first page.
+        """
+        tl.check_kind(kind)
+        limit = tl.page_size(limit)
+        bounds = tl.time_bounds(start, end)
+        qd = tl.query_digest(self.store_id, kind, value, bounds)
+        after = tl.decode_cursor(cursor, qd, bounds[1])
+        keyed = []
+        with self.pool.connection() as conn:
+            for table in (SIGNIN_PARTITION, AUDIT_PARTITION):
+                rank = tl.TABLE_RANK[table]
+                args = (value, bounds[0], after[0], tl.seq_bound(table, after), limit + 1)
+                keyed += [((t, rank, rid), table, rid, raw) for rid, t, raw in conn.execute(_TIMELINE_SQL[(table, kind)], args)]
+        keyed.sort(key=lambda k: k[0], reverse=True)
+        fields_by_table = tl.resolve_fields(fields)
+        entries = [
+            (key, tl.timeline_entry(table, sqlite_ref(table, rid), json.loads(raw), fields_by_table))
+            for key, table, rid, raw in keyed[: limit + 1]
+        ]
+        return tl.build_page(entries, limit, qd)
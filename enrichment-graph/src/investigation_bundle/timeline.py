@@ -0,0 +1,123 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .event_refs import project
+
+# Partition names as in offline_provider (which imports this module).
+SIGNIN_PARTITION = "SigninLogs"
+AUDIT_PARTITION = "AuditLogs"
+
+# One timeline merges sign-ins and audit events for a user or an IP, newest
+# first. Events are ordered by the key (TimeGenerated, rank, seq) descending:
+# rank breaks ties between tables at the same second and seq (row index or
+# rowid) between events of one table, so the order is total and a cursor is
+# just the key of the last event returned.
+ENTITY_KINDS = ("user", "ip")
+TABLE_RANK = {SIGNIN_PARTITION: 0, AUDIT_PARTITION: 1}
+RANK_TABLE = {r: t for t, r in TABLE_RANK.items()}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+MAX_SEQ = (1 << 63) - 1
+
+# Columns projected by workbook panels 13 (user timeline) and 14 (user audit).
+TIMELINE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    SIGNIN_PARTITION: ("TimeGenerated", "UserPrincipalName", "AppDisplayName", "IPAddress", "Location", "ClientAppUsed", "Status"),
+    AUDIT_PARTITION: ("TimeGenerated", "OperationName", "Result", "InitiatedBy", "TargetResources", "CorrelationId"),
+}
+
+_TIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+_MIN_TIME = ""
+_MAX_TIME = "\uffff"
+
+TimelineKey = Tuple[str, int, int]
+
+class InvalidCursor(ValueError):
+    """A cursor that is malformed or was issued for a different timeline query."""
+
+def audit_actor(event: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """(userPrincipalName, ipAddress) of the user who initiated an audit event."""
+    user = ((event.get("InitiatedBy") or {}).get("user")) or {}
+    if not isinstance(user, dict):
+        return None, None
+    return user.get("userPrincipalName") or None, user.get("ipAddress") or None
+
+def time_bounds(start: Optional[datetime], end: Optional[datetime]) -> Tuple[str, str]:
+    """Inclusive TimeGenerated string bounds; either side may be open."""
+    lo, hi = _MIN_TIME, _MAX_TIME
+    if start is not None:
+        # stored times have whole seconds: round the lower bound up
+        if start.microsecond:
+            start = start.replace(microsecond=0) + timedelta(seconds=1)
+        lo = start.strftime(_TIME_FMT)
+    if end is not None:
+        hi = end.strftime(_TIME_FMT)
+    return lo, hi
+
+def check_kind(kind: str) -> None:
+    if kind not in ENTITY_KINDS:
+        raise ValueError(f"Unknown timeline entity kind {kind!r} (expected one of {', '.join(ENTITY_KINDS)})")
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return int(limit)
+
+def query_digest(scope: str, kind: str, value: str, bounds: Tuple[str, str]) -> str:
+    # binds a cursor to the store and query it was issued for
+    h = hashlib.blake2b(json.dumps([scope, kind, value, *bounds]).encode("utf-8"), digest_size=6)
+    return h.hexdigest()
+
+def encode_cursor(qd: str, key: TimelineKey) -> str:
+    raw = json.dumps([qd, *key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], qd: str, hi: str) -> TimelineKey:
+    """Key every event on the page must sort below; the first page starts just above `hi`."""
+    if not cursor:
+        return hi, len(TABLE_RANK), MAX_SEQ
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        d, t, rank, seq = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor("malformed cursor")
+    if d != qd or not isinstance(t, str) or rank not in RANK_TABLE or not isinstance(seq, int):
+        raise InvalidCursor("cursor does not belong to this timeline query")
+    return t, rank, seq
+
+def seq_bound(table: str, after: TimelineKey) -> int:
+    """
+    For one table, the rows below `after` are exactly those with
+    (TimeGenerated, seq) < (after time, bound): a table ranked below the
+    cursor's still has all of that second left, one ranked above has none.
+    """
+    rank = TABLE_RANK[table]
+    if rank < after[1]:
+        return MAX_SEQ
+    if rank > after[1]:
+        return -1
+    return after[2]
+
+def resolve_fields(fields: Optional[Iterable[str]]) -> Dict[str, Sequence[str]]:
+    if fields is None:
+        return TIMELINE_FIELDS
+    wanted = tuple(f for f in fields if f)
+    return {table: wanted for table in TIMELINE_FIELDS}
+
+def timeline_entry(table: str, ref: Dict[str, Any], event: Dict[str, Any], fields: Dict[str, Sequence[str]]) -> Dict[str, Any]:
+    return {"table": table, "ref": ref, **project(event, fields[table])}
+
+def build_page(entries: List[Tuple[TimelineKey, Dict[str, Any]]], limit: int, qd: str) -> Dict[str, Any]:
+    """entries: up to limit+1 (key, entry) pairs in timeline order; the extra one only signals a next page."""
+    page = entries[:limit]
+    more = len(entries) > limit
+    return {
+        "events": [e for _, e in page],
+        "next_cursor": encode_cursor(qd, page[-1][0]) if more else None,
+    }
@@ -1,41 +1,51 @@
 # enrichment-graph/src/main.py
+import argparse
 import json
 from pathlib import Path
 
-from investigation_bundle.bundle_builder import IncidentContext, build_investigation_bundle_offline
+from investigation_bundle.artifact_cache import ArtifactCache
+from investigation_bundle.sqlite_provider import SqliteProvider
+from investigation_bundle.bundle_builder import (
+    build_investigation_bundle_cached,
+    build_investigation_bundle_offline,
+    dump_bundle,
+    incident_context_from_json,
+)
 
 def main() -> None:
     # This file is: enrichment-graph/src/main.py
     # Project root for this module is: enrichment-graph/
     tool_root = Path(__file__).resolve().parents[1]  # enrichment-graph/
-    sample_ctx_path = tool_root / "examples" / "incident_context.sample.json"
 
-    out_dir = tool_root / "sample-output"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / "investigation-bundle.sample.json"
+    ap = argparse.ArgumentParser(description="Build an investigation bundle from an incident context (offline mode).")
+    ap.add_argument("--in", dest="in_path", default=str(tool_root / "examples" / "incident_context.sample.json"), help="Path to incident context JSON")
+    ap.add_argument("--out", dest="out_path", default=str(tool_root / "sample-output" / "investigation-bundle.sample.json"), help="Output path for the bundle JSON")
+    ap.add_argument("--slim", action="store_true", help="Write a compact v2 bundle (projected events + event refs)")
+    ap.add_argument("--no-cache", action="store_true", help="Rebuild even if an identical bundle is in the artifact cache")
+    ap.add_argument("--db", default=None, help="Query this SQLite event store (ingest_sqlite.py) instead of loading the JSONL logs")
+    args = ap.parse_args()
+
+    sample_ctx_path = Path(args.in_path)
+    out_path = Path(args.out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
 
     if not sample_ctx_path.exists():
         raise FileNotFoundError(
-            f"Missing sample context file:\n  {sample_ctx_path}\n"
-            f"Expected it at: enrichment-graph/examples/incident_context.sample.json"
+            f"Missing incident context file:\n  {sample_ctx_path}\n"
+            f"Default location: enrichment-graph/examples/incident_context.sample.json"
         )
 
     ctx_raw = json.loads(sample_ctx_path.read_text(encoding="utf-8"))
 
-    ctx = IncidentContext(
-        incident_id=ctx_raw["incident_id"],
-        title=ctx_raw["title"],
-        severity=ctx_raw["severity"],
-        time_start=ctx_raw["time_start"],
-        time_end=ctx_raw["time_end"],
-        detections=ctx_raw.get("detections", []),
-        accounts=ctx_raw.get("entities", {}).get("accounts", []),
-        ips=ctx_raw.get("entities", {}).get("ips", []),
-    )
-
-    bundle = build_investigation_bundle_offline(ctx)
-    out_path.write_text(json.dumps(bundle, indent=2), encoding="utf-8")
-    print(f"Wrote: {out_path}")
+    ctx = incident_context_from_json(ctx_raw)
+
+    provider = SqliteProvider(Path(args.db)) if args.db else None
+    if args.no_cache:
+        bundle, cached = build_investigation_bundle_offline(ctx, slim=args.slim, provider=provider), False
+    else:
+        bundle, cached = build_investigation_bundle_cached(ctx, ArtifactCache(), slim=args.slim, provider=provider)
+    out_path.write_text(dump_bundle(bundle), encoding="utf-8")
+    print(f"Wrote: {out_path}" + (" (from artifact cache)" if cached else ""))
 
 if __name__ == "__main__":
     main()
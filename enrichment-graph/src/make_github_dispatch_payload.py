@@ -24,12 +24,16 @@ def _fmt_account_summary(s: dict) -> str:
     )
 
 def _fmt_ip_summary(s: dict) -> str:
-    return (
+    line = (
         f"- **{s.get('ip','N/A')}**: total={s.get('total',0)} "
         f"(failures={s.get('failures',0)}, successes={s.get('successes',0)}), "
         f"targeted_users={s.get('targeted_users_count',0)}, "
         f"countries={', '.join(s.get('countries',[]) or []) or 'N/A'}"
     )
+    intel = s.get("intel")
+    if intel:
+        line += f", asn={intel.get('asn') or 'N/A'}, tags={', '.join(intel.get('tags') or []) or 'N/A'}"
+    return line
 
 def _fmt_audit_events(events: list) -> str:
     if not events:
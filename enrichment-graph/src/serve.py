@@ -0,0 +1,192 @@
+# enrichment-graph/src/serve.py
+"""
+Warm-process enrichment server (localhost HTTP stand-in for the PB-01 chain).
+
+Running main.py -> make_github_dispatch_payload.py -> summarize.py per incident
+pays interpreter start-up, imports and a full log reload three times. This
+server loads the OfflineProvider once and answers each incident in-process:
+
+    POST /incident            body: incident context JSON (incident_contexts/*.json shape)
+    POST /incident?slim=1     same, but returns a schema 2.0 bundle
+    GET  /timeline?user=<upn>|ip=<ip>[&limit=50&cursor=...&fields=a,b.c&from=...&to=...]
+    GET  /health
+
+Response: {"bundle": {...}, "summary": "<markdown>", "dispatch_payload": {...}}
+/timeline returns {"events": [...], "next_cursor": ...}; pass next_cursor back for the next page.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / "ai-triage-summarizer" / "src"))
+
+from investigation_bundle.artifact_cache import ArtifactCache, code_version, digest
+from investigation_bundle.bundle_builder import (
+    build_investigation_bundle_cached,
+    build_investigation_bundle_offline,
+    incident_context_from_json,
+)
+from investigation_bundle.offline_provider import OfflineProvider
+from investigation_bundle.sqlite_provider import SqliteProvider
+from make_github_dispatch_payload import build_dispatch_payload
+from summarize import summarize
+
+SUMMARIZE_CODE = code_version([REPO_ROOT / "ai-triage-summarizer" / "src" / "summarize.py"])
+DISPATCH_CODE = code_version([Path(__file__).resolve().parent / "make_github_dispatch_payload.py"])
+
+Provider = Union[OfflineProvider, SqliteProvider]
+
+class WarmPipeline:
+    """
+    Holds one OfflineProvider for the life of the process; reloads it if the
+    sample logs change. With db_path, queries a SqliteProvider instead (its
+    connection pool serves the handler threads; nothing to reload).
+    A stale provider is rebuilt by the same factory, so it keeps its type.
+    With a cache, every stage is memoized on its inputs.
+    """
+
+    def __init__(self, cache: Optional[ArtifactCache] = None, db_path: Optional[Path] = None) -> None:
+        self._lock = threading.Lock()
+        self._factory: Callable[[], Provider] = partial(SqliteProvider, db_path) if db_path else OfflineProvider
+        self._provider = self._factory()
+        self.cache = cache
+
+    def provider(self) -> Provider:
+        with self._lock:
+            if self._provider.is_stale():
+                self._provider = self._factory()
+            return self._provider
+
+    def process(self, ctx_raw: Dict[str, Any], slim: bool = False) -> Dict[str, Any]:
+        ctx = incident_context_from_json(ctx_raw)
+        if self.cache is None:
+            bundle = build_investigation_bundle_offline(ctx, slim=slim, provider=self.provider())
+            return {
+                "bundle": bundle,
+                "summary": summarize(bundle),
+                "dispatch_payload": build_dispatch_payload(bundle),
+            }
+
+        bundle, b_hit = build_investigation_bundle_cached(ctx, self.cache, slim=slim, provider=self.provider())
+        # generated_at is the only field that differs between otherwise identical bundles
+        bundle_key = digest({k: v for k, v in bundle.items() if k != "generated_at"})
+        summary, s_hit = self.cache.memoize("summarize", {"bundle": bundle_key, "code": SUMMARIZE_CODE}, lambda: summarize(bundle))
+        payload, d_hit = self.cache.memoize("dispatch", {"bundle": bundle_key, "code": DISPATCH_CODE}, lambda: build_dispatch_payload(bundle))
+        return {
+            "bundle": bundle,
+            "summary": summary,
+            "dispatch_payload": payload,
+            "cached": {"bundle": b_hit, "summary": s_hit, "dispatch_payload": d_hit},
+        }
+
+def _query_time(q: Dict[str, Any], name: str) -> Optional[datetime]:
+    v = q.get(name, [""])[0]
+    if not v:
+        return None
+    dt = datetime.fromisoformat(v)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def timeline_page(provider: Provider, query: str) -> Dict[str, Any]:
+    """GET /timeline query string -> provider.timeline(...); ValueError for a bad request."""
+    q = parse_qs(query)
+    kinds = [k for k in ("user", "ip") if q.get(k, [""])[0]]
+    if len(kinds) != 1:
+        raise ValueError("pass exactly one of user= or ip=")
+    fields = q.get("fields", [""])[0]
+    limit = q.get("limit", [""])[0]
+    return provider.timeline(
+        kinds[0],
+        q[kinds[0]][0],
+        cursor=q.get("cursor", [""])[0] or None,
+        limit=int(limit) if limit else None,
+        fields=fields.split(",") if fields else None,
+        start=_query_time(q, "from"),
+        end=_query_time(q, "to"),
+    )
+
+def _make_handler(pipeline: WarmPipeline):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif url.path == "/timeline":
+                try:
+                    self._send_json(200, timeline_page(pipeline.provider(), url.query))
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            url = urlparse(self.path)
+            if url.path != "/incident":
+                self._send_json(404, {"error": "not found"})
+                return
+            slim = parse_qs(url.query).get("slim", ["0"])[0] in ("1", "true")
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                ctx_raw = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self._send_json(400, {"error": f"invalid JSON body: {e}"})
+                return
+            if not isinstance(ctx_raw, dict):
+                self._send_json(400, {"error": "incident context must be a JSON object"})
+                return
+            t0 = time.perf_counter()
+            try:
+                result = pipeline.process(ctx_raw, slim=slim)
+            except KeyError as e:
+                self._send_json(400, {"error": f"incident context missing field: {e}"})
+                return
+            except (ValueError, TypeError, AttributeError) as e:
+                self._send_json(400, {"error": f"invalid incident context: {e}"})
+                return
+            result["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+            self._send_json(200, result)
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            sys.stderr.write(f"[serve] {self.address_string()} {fmt % args}\n")
+
+    return Handler
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, pipeline: Optional[WarmPipeline] = None) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), _make_handler(pipeline or WarmPipeline()))
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve bundle + summary + dispatch payload from a warm process.")
+    ap.add_argument("--host", default="127.0.0.1", help="Bind address (keep it on localhost)")
+    ap.add_argument("--port", type=int, default=8765, help="Bind port")
+    ap.add_argument("--no-cache", action="store_true", help="Disable the on-disk artifact cache")
+    ap.add_argument("--db", default=None, help="Serve from this SQLite event store (ingest_sqlite.py) instead of the JSONL logs")
+    args = ap.parse_args()
+
+    pipeline = WarmPipeline(None if args.no_cache else ArtifactCache(), Path(args.db) if args.db else None)
+    server = make_server(args.host, args.port, pipeline)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} (POST /incident)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
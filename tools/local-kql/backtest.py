@@ -0,0 +1,340 @@
+# tools/local-kql/backtest.py
+"""
+Single-scan threshold sweep / backtest for DET-01 and DET-03.
+
+Instead of re-running run_detections.py once per parameter value, the sign-in
+data is scanned once into grouped state:
+- DET-01: per (day, IP) failure count + successful users -> a per-day
+  failure-count histogram, so every fail_threshold is a suffix sum
+- DET-03: per (user, country) hourly counts of successful sign-ins, so each
+  (baseline_days, recent_hours, min_hits) check is a couple of bisects
+
+Every combination of the grid is then evaluated as a scheduled rule over the
+requested date range. DET-01 runs daily (window ending at 00:00 UTC after each
+day, lookback = 1d). DET-03 runs ceil(24 / recent_hours) times a day, so
+consecutive recent windows cover the whole day. After the scan, no step reads
+events again: each DET-01 day is a pass over that day's IPs, and each DET-03
+run is a pass over every (user, country) key seen, with a bisect per
+recent_hours value and a comparison per combination for keys that had recent
+hits. So the cost is scan + days x (IPs per day + runs per day x keys), and
+grows with the number of distinct users and countries, not with events.
+
+Rows that fail the SigninLogs schema (bad JSON, a non-numeric errorCode, ...)
+are skipped and counted, like run_detections.py does.
+
+Labels score alerts: one matching a "true_positive" label is a TP; anything
+else (including a match to a "false_positive" label) is an FP, and recall is
+over the true-positive labels.
+
+    python tools/local-kql/backtest.py --fail-threshold 5,10,15 --baseline-days 7,14 \\
+        --recent-hours 12,24 --min-hits 1,2,3 --labels data/labels/incidents.sample.json
+"""
+import argparse
+import bisect
+import itertools
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / "enrichment-graph" / "src"))
+
+from external_sort import expand_inputs, open_text
+from investigation_bundle.log_schema import row_checker
+
+DATA_SIGNIN = REPO_ROOT / "data" / "sample-logs" / "SigninLogs.jsonl"
+OUT_PATH = REPO_ROOT / "data" / "demo-output" / "backtest.json"
+
+GRID_KEYS = ("fail_threshold", "baseline_days", "recent_hours", "min_hits")
+DEFAULT_GRID = {"fail_threshold": [10], "baseline_days": [14], "recent_hours": [24], "min_hits": [2]}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _parse(ts: str) -> datetime:
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+def _hour(dt: datetime) -> int:
+    return int((dt - EPOCH).total_seconds()) // 3600
+
+def _hour_dt(h: int) -> str:
+    return (EPOCH + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+@dataclass
+class ScanState:
+    # DET-01: day -> ip -> [failures, success_users]
+    by_day_ip: Dict[date, Dict[str, List[Any]]] = field(default_factory=dict)
+    # DET-03: (user, country) -> {hour: successful sign-ins}
+    user_country_hours: Dict[Tuple[str, str], Dict[int, int]] = field(default_factory=dict)
+    # (user, country) -> IPs seen on successful sign-ins (evidence / label matching)
+    user_country_ips: Dict[Tuple[str, str], Set[str]] = field(default_factory=dict)
+    events: int = 0
+    skipped: int = 0
+    first: Optional[datetime] = None
+    last: Optional[datetime] = None
+
+def scan(paths: Iterable[Path]) -> ScanState:
+    """The single pass over the data; input order does not matter."""
+    st = ScanState()
+    for path in expand_inputs(paths):
+        # every input is sign-ins, whatever its file name
+        check = row_checker(path, "SigninLogs")
+        with open_text(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    e = check(json.loads(line))
+                except ValueError:
+                    e = None
+                if e is None:
+                    st.skipped += 1
+                    continue
+                t = _parse(e["TimeGenerated"])
+                st.events += 1
+                st.first = t if st.first is None or t < st.first else st.first
+                st.last = t if st.last is None or t > st.last else st.last
+
+                status = e.get("Status")
+                ok = (status.get("errorCode", 0) if isinstance(status, dict) else 0) == 0
+                ip = e.get("IPAddress")
+                user = e.get("UserPrincipalName")
+                if ip:
+                    slot = st.by_day_ip.setdefault(t.date(), {}).setdefault(ip, [0, set()])
+                    if ok:
+                        slot[1].add(user)
+                    else:
+                        slot[0] += 1
+                loc = e.get("Location")
+                country = (loc.get("countryOrRegion") if isinstance(loc, dict) else None) or None
+                if ok and user and country:
+                    hours = st.user_country_hours.setdefault((user, country), {})
+                    h = _hour(t)
+                    hours[h] = hours.get(h, 0) + 1
+                    if ip:
+                        st.user_country_ips.setdefault((user, country), set()).add(ip)
+    return st
+
+def _expand_grid(grid: Dict[str, List[int]]) -> List[Dict[str, int]]:
+    values = [sorted(set(grid.get(k) or DEFAULT_GRID[k])) for k in GRID_KEYS]
+    return [dict(zip(GRID_KEYS, combo)) for combo in itertools.product(*values)]
+
+def _det01_day_candidates(day_ips: Dict[str, List[Any]], min_threshold: int) -> List[Tuple[int, str, List[str]]]:
+    # IPs with at least one success and enough failures for the lowest threshold, by failures desc
+    out = [(fails, ip, sorted(u for u in users if u)) for ip, (fails, users) in day_ips.items() if users and fails >= min_threshold]
+    out.sort(key=lambda x: -x[0])
+    return out
+
+def _det03_day_alerts(
+    st: ScanState,
+    sorted_hours: Dict[Tuple[str, str], List[int]],
+    prefix: Dict[Tuple[str, str], List[int]],
+    now_h: int,
+    combos: List[Tuple[int, int, int]],
+    max_recent: int,
+) -> Dict[Tuple[int, int, int], List[Dict[str, Any]]]:
+    alerts: Dict[Tuple[int, int, int], List[Dict[str, Any]]] = {c: [] for c in combos}
+    by_recent: List[Tuple[int, List[Tuple[int, int]]]] = []
+    for r_hours, group in itertools.groupby(sorted(combos, key=lambda c: c[1]), key=lambda c: c[1]):
+        by_recent.append((r_hours, [(b, m) for b, _, m in group]))
+    for key, hours in sorted_hours.items():
+        hi = bisect.bisect_left(hours, now_h)
+        if hi == 0 or hours[hi - 1] < now_h - max_recent:
+            continue  # nothing in the widest recent window
+        pre = prefix[key]
+        for r_hours, rest in by_recent:
+            recent_start = now_h - r_hours
+            lo = bisect.bisect_left(hours, recent_start)
+            hits = pre[hi] - pre[lo]
+            if hits == 0:
+                continue
+            last_before = hours[lo - 1] if lo > 0 else None
+            alert = None
+            for b_days, m in rest:
+                if hits < m:
+                    continue
+                # baseline: any success in [recent_start - b_days, recent_start)
+                if last_before is not None and last_before >= recent_start - b_days * 24:
+                    continue
+                if alert is None:
+                    alert = {
+                        "user": key[0],
+                        "country": key[1],
+                        "hits": hits,
+                        "first": _hour_dt(hours[lo]),
+                        "last": _hour_dt(hours[hi - 1]),
+                        "ips": sorted(st.user_country_ips.get(key, ())),
+                    }
+                alerts[(b_days, r_hours, m)].append(alert)
+    return alerts
+
+def _load_labels(path: Optional[Path]) -> List[Dict[str, Any]]:
+    if path is None:
+        return []
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    labels = raw if isinstance(raw, list) else raw.get("incidents", [])
+    for lb in labels:
+        lb["_start"] = _parse(lb["time_start"])
+        lb["_end"] = _parse(lb["time_end"])
+    return labels
+
+def _runs_per_day(recent_hours: int) -> int:
+    # enough DET-03 runs that recent windows leave no gap in the day
+    return max(1, -(-24 // recent_hours))
+
+def _matches(label: Dict[str, Any], det: str, accounts: Iterable[str], ips: Iterable[str], start: datetime, end: datetime) -> bool:
+    if label.get("detections") and det not in label["detections"]:
+        return False
+    if end < label["_start"] or start > label["_end"]:
+        return False
+    ents = set(label.get("accounts") or []) | set(label.get("ips") or [])
+    return bool(ents & (set(accounts) | set(ips)))
+
+def backtest(
+    st: ScanState,
+    grid: Dict[str, List[int]],
+    date_from: date,
+    date_to: date,
+    labels: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    combos = _expand_grid(grid)
+    thresholds = sorted({c["fail_threshold"] for c in combos})
+    det03_combos = sorted({(c["baseline_days"], c["recent_hours"], c["min_hits"]) for c in combos})
+    by_cadence: Dict[int, List[Tuple[int, int, int]]] = {}
+    for c3 in det03_combos:
+        by_cadence.setdefault(_runs_per_day(c3[1]), []).append(c3)
+    tp_labels = [lb for lb in labels if lb.get("label") == "true_positive"]
+    fp_labels = [lb for lb in labels if lb.get("label") == "false_positive"]
+
+    sorted_hours: Dict[Tuple[str, str], List[int]] = {}
+    prefix: Dict[Tuple[str, str], List[int]] = {}
+    for key, hours in st.user_country_hours.items():
+        hs = sorted(hours)
+        sorted_hours[key] = hs
+        acc = [0]
+        for h in hs:
+            acc.append(acc[-1] + hours[h])
+        prefix[key] = acc
+
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    det01: Dict[int, Dict[str, List[Dict[str, Any]]]] = {t: {} for t in thresholds}
+    det03: Dict[Tuple[int, int, int], Dict[str, List[Dict[str, Any]]]] = {c: {} for c in det03_combos}
+    for d in days:
+        cands = _det01_day_candidates(st.by_day_ip.get(d, {}), thresholds[0])
+        for t in thresholds:
+            det01[t][d.isoformat()] = [{"ip": ip, "failures": f, "accounts": users} for f, ip, users in cands if f >= t]
+        day_end_h = _hour(datetime(d.year, d.month, d.day, tzinfo=timezone.utc) + timedelta(days=1))
+        for runs, group in by_cadence.items():
+            max_recent = max(r for _, r, _ in group)
+            day_alerts: Dict[Tuple[int, int, int], Dict[Tuple[str, str], Dict[str, Any]]] = {c: {} for c in group}
+            for k in range(runs):
+                now_h = day_end_h - (k * 24) // runs
+                for c, alerts in _det03_day_alerts(st, sorted_hours, prefix, now_h, group, max_recent).items():
+                    for a in alerts:
+                        # one alert per (user, country) per day, from its latest run
+                        day_alerts[c].setdefault((a["user"], a["country"]), a)
+            for c in group:
+                det03[c][d.isoformat()] = list(day_alerts[c].values())
+
+    results = []
+    for c in combos:
+        c3 = (c["baseline_days"], c["recent_hours"], c["min_hits"])
+        per_day = []
+        matched_labels: Set[str] = set()
+        tp = 0
+        fp_labelled = 0
+        total = 0
+        for d in days:
+            key = d.isoformat()
+            d_start = datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+            d_end = d_start + timedelta(days=1)
+            a01 = det01[c["fail_threshold"]][key]
+            a03 = det03[c3][key]
+            per_day.append({"day": key, "DET-01": len(a01), "DET-03": len(a03)})
+            scored = [("DET-01", a["accounts"], [a["ip"]], d_start, d_end) for a in a01]
+            scored += [("DET-03", [a["user"]], a["ips"], _parse(a["first"]), _parse(a["last"]) + timedelta(hours=1)) for a in a03]
+            for args in scored:
+                total += 1
+                hit = [lb for lb in tp_labels if _matches(lb, *args)]
+                if hit:
+                    tp += 1
+                    matched_labels.update(lb["incident_id"] for lb in hit)
+                elif any(_matches(lb, *args) for lb in fp_labels):
+                    fp_labelled += 1
+        row: Dict[str, Any] = {"params": c, "alerts_total": total, "alerts_per_day": per_day}
+        if labels:
+            row["labels"] = {
+                "true_positive_alerts": tp,
+                "false_positive_alerts": total - tp,
+                "false_positive_label_alerts": fp_labelled,
+                "incidents_detected": sorted(matched_labels),
+                "recall": round(len(matched_labels) / len(tp_labels), 3) if tp_labels else None,
+                "precision": round(tp / total, 3) if total else None,
+            }
+        results.append(row)
+
+    return {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "events_scanned": st.events,
+        "rows_skipped": st.skipped,
+        "combinations": len(combos),
+        "labels": len(labels),
+        "results": results,
+    }
+
+def _int_list(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Backtest a grid of DET-01/DET-03 parameters in one pass over the data.")
+    ap.add_argument("inputs", nargs="*", default=[str(DATA_SIGNIN)], help="SigninLogs JSONL(.gz) files or directories")
+    ap.add_argument("--grid", default=None, help="JSON file: {\"fail_threshold\": [...], \"baseline_days\": [...], ...}")
+    ap.add_argument("--fail-threshold", type=_int_list, default=None)
+    ap.add_argument("--baseline-days", type=_int_list, default=None)
+    ap.add_argument("--recent-hours", type=_int_list, default=None)
+    ap.add_argument("--min-hits", type=_int_list, default=None)
+    ap.add_argument("--from", dest="date_from", default=None, help="First evaluated day (YYYY-MM-DD, default: first day in data)")
+    ap.add_argument("--to", dest="date_to", default=None, help="Last evaluated day (YYYY-MM-DD, default: last day in data)")
+    ap.add_argument("--labels", default=None, help="Labeled incidents JSON (list of {incident_id, detections, accounts, ips, time_start, time_end})")
+    ap.add_argument("--out", default=str(OUT_PATH), help="Report JSON path")
+    args = ap.parse_args()
+
+    grid: Dict[str, List[int]] = dict(DEFAULT_GRID)
+    if args.grid:
+        grid.update(json.loads(Path(args.grid).read_text(encoding="utf-8")))
+    for k in GRID_KEYS:
+        if getattr(args, k) is not None:
+            grid[k] = getattr(args, k)
+
+    st = scan([Path(p) for p in args.inputs])
+    if st.skipped:
+        print(f"WARNING: skipped {st.skipped} malformed line(s); run tools/local-kql/ingest.py to quarantine them", file=sys.stderr)
+    if st.events == 0:
+        raise SystemExit("No sign-in events found in the inputs.")
+    date_from = date.fromisoformat(args.date_from) if args.date_from else st.first.date()
+    date_to = date.fromisoformat(args.date_to) if args.date_to else st.last.date()
+    report = backtest(st, grid, date_from, date_to, _load_labels(Path(args.labels) if args.labels else None))
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"Scanned {report['events_scanned']} events once; evaluated {report['combinations']} combinations "
+          f"over {date_from} .. {date_to}")
+    print(f"{'fail_thr':>8} {'base_d':>6} {'rec_h':>5} {'min_h':>5} {'alerts':>6} {'recall':>6} {'prec':>5}")
+    for r in report["results"]:
+        p = r["params"]
+        lb = r.get("labels") or {}
+        print(f"{p['fail_threshold']:>8} {p['baseline_days']:>6} {p['recent_hours']:>5} {p['min_hits']:>5} "
+              f"{r['alerts_total']:>6} {str(lb.get('recall', '-')):>6} {str(lb.get('precision', '-')):>5}")
+    print(f"Wrote: {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# tools/local-kql/external_sort.py
+"""
+Out-of-core time ordering for SigninLogs/AuditLogs exports.
+
+Real exports arrive as many unsorted (optionally gzip'd) JSONL files. Two modes:
+
+- external sort (default): read inputs in bounded runs of --run-events lines,
+  sort each run by TimeGenerated and spill it to a temp file, then k-way merge
+  the runs (multi-pass when there are more runs than --fan-in). Memory is
+  O(run_events + fan_in) no matter how large the inputs are.
+
+- bounded reorder (--lateness-seconds): for input that is already nearly in
+  order (e.g. a live feed), hold events in a heap until the watermark
+  (max TimeGenerated seen - lateness) passes them. Events older than the
+  watermark are "late" and go to --late-out instead of breaking the order.
+
+Both produce a globally time-ordered stream that streaming detections can
+consume without holding the dataset in memory:
+
+    python tools/local-kql/external_sort.py exports/ --out data/sorted/SigninLogs.jsonl
+"""
+import argparse
+import gzip
+import heapq
+import json
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+@dataclass
+class SortStats:
+    events: int = 0
+    runs: int = 0
+    merge_passes: int = 0
+    skipped_malformed: int = 0
+    skipped_missing_time: int = 0
+    late: int = 0
+
+def time_key(ts: str) -> str:
+    """
+    Fixed-width, lexically sortable UTC key for a TimeGenerated value.
+    Sample logs use 2026-01-23T13:55:30Z; exports may carry fractions or offsets.
+    """
+    if len(ts) == 20 and ts[19] == "Z":
+        return ts[:19] + ".000000"
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+def _key_dt(key: str) -> datetime:
+    return datetime.strptime(key, "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
+
+def open_text(path: Path, mode: str = "r") -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return path.open(mode, encoding="utf-8")
+
+def expand_inputs(inputs: Iterable[Path]) -> List[Path]:
+    """Files as given; directories expand to their *.jsonl / *.jsonl.gz files in name order."""
+    files: List[Path] = []
+    for p in inputs:
+        p = Path(p)
+        if p.is_dir():
+            files.extend(sorted(f for f in p.rglob("*") if f.name.endswith((".jsonl", ".jsonl.gz"))))
+        else:
+            files.append(p)
+    return files
+
+def iter_keyed_lines(paths: Iterable[Path], stats: SortStats) -> Iterator[Tuple[str, str]]:
+    # Yields (time_key, raw_json_line). The raw line is kept as-is so the merge
+    # never re-serializes events.
+    for path in expand_inputs(paths):
+        with open_text(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    stats.skipped_malformed += 1
+                    continue
+                if not isinstance(obj, dict):
+                    stats.skipped_malformed += 1
+                    continue
+                ts = obj.get("TimeGenerated")
+                if not ts:
+                    stats.skipped_missing_time += 1
+                    continue
+                if not isinstance(ts, str):
+                    stats.skipped_malformed += 1
+                    continue
+                try:
+                    yield time_key(ts), line
+                except ValueError:
+                    stats.skipped_missing_time += 1
+
+# ---------------- run files ----------------
+# One "<key>\t<json>" line per event; the key prefix lets merges compare lines directly.
+def write_run(items: List[Tuple[str, str]], path: Path) -> None:
+    items.sort(key=lambda x: x[0])
+    with path.open("w", encoding="utf-8") as f:
+        for key, line in items:
+            f.write(key + "\t" + line + "\n")
+
+def read_run(path: Path) -> Iterator[str]:
+    with path.open("r", encoding="utf-8") as f:
+        yield from f
+
+def merge_runs(runs: List[Path]) -> Iterator[str]:
+    # Compare on the key prefix only: heapq.merge is stable for equal keys, so
+    # events with the same time keep input order instead of sorting by content.
+    return heapq.merge(*(read_run(p) for p in runs), key=lambda l: l.partition("\t")[0])
+
+def _spill_runs(keyed: Iterable[Tuple[str, str]], tmp: Path, run_events: int, stats: SortStats) -> List[Path]:
+    runs: List[Path] = []
+    buf: List[Tuple[str, str]] = []
+    for item in keyed:
+        buf.append(item)
+        stats.events += 1
+        if len(buf) >= run_events:
+            runs.append(tmp / f"run-{len(runs):06d}")
+            write_run(buf, runs[-1])
+            buf = []
+    if buf:
+        runs.append(tmp / f"run-{len(runs):06d}")
+        write_run(buf, runs[-1])
+    stats.runs = len(runs)
+    return runs
+
+def _reduce_runs(runs: List[Path], tmp: Path, fan_in: int, stats: SortStats) -> List[Path]:
+    # Merge groups of fan_in runs until a single final merge fits in fan_in open files.
+    level = 0
+    while len(runs) > fan_in:
+        level += 1
+        merged: List[Path] = []
+        for i in range(0, len(runs), fan_in):
+            group = runs[i:i + fan_in]
+            out = tmp / f"merge-{level:02d}-{len(merged):06d}"
+            with out.open("w", encoding="utf-8") as f:
+                f.writelines(merge_runs(group))
+            for p in group:
+                p.unlink()
+            merged.append(out)
+        runs = merged
+        stats.merge_passes += 1
+    stats.merge_passes += 1
+    return runs
+
+def iter_sorted(
+    paths: Iterable[Path],
+    run_events: int = 200_000,
+    fan_in: int = 64,
+    tmp_dir: Optional[Path] = None,
+    stats: Optional[SortStats] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Globally time-ordered events from unsorted inputs, via spill-to-disk external sort."""
+    # checked here, not on first next(): a merge of one run at a time never shrinks the run list
+    if run_events < 1:
+        raise ValueError("run_events must be at least 1")
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+    return _sorted_events(paths, run_events, fan_in, tmp_dir, stats if stats is not None else SortStats())
+
+def _sorted_events(paths: Iterable[Path], run_events: int, fan_in: int, tmp_dir: Optional[Path], stats: SortStats) -> Iterator[Dict[str, Any]]:
+    tmp = Path(tempfile.mkdtemp(prefix="extsort-", dir=tmp_dir))
+    try:
+        runs = _spill_runs(iter_keyed_lines(paths, stats), tmp, run_events, stats)
+        runs = _reduce_runs(runs, tmp, fan_in, stats)
+        for line in merge_runs(runs):
+            yield json.loads(line.partition("\t")[2])
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def reorder(
+    events: Iterable[Dict[str, Any]],
+    lateness: timedelta,
+    on_late: Optional[Callable[[Dict[str, Any]], None]] = None,
+    stats: Optional[SortStats] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Re-emit a nearly ordered stream in strict time order using a watermark.
+
+    Memory is bounded by the number of events inside the lateness window.
+    Events older than the last emitted time are passed to on_late (or dropped)
+    so the output stays ordered.
+    """
+    stats = stats if stats is not None else SortStats()
+    heap: List[Tuple[str, int, Dict[str, Any]]] = []
+    seq = 0
+    max_seen: Optional[datetime] = None
+    emitted_key = ""
+    for e in events:
+        ts = e.get("TimeGenerated")
+        if not ts:
+            stats.skipped_missing_time += 1
+            continue
+        key = time_key(ts)
+        if key < emitted_key:
+            stats.late += 1
+            if on_late is not None:
+                on_late(e)
+            continue
+        stats.events += 1
+        heapq.heappush(heap, (key, seq, e))
+        seq += 1
+        dt = _key_dt(key)
+        if max_seen is None or dt > max_seen:
+            max_seen = dt
+            watermark = (max_seen - lateness).strftime("%Y-%m-%dT%H:%M:%S.%f")
+            while heap and heap[0][0] <= watermark:
+                emitted_key, _, out = heapq.heappop(heap)
+                yield out
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+def iter_reordered(paths: Iterable[Path], lateness: timedelta, on_late=None, stats: Optional[SortStats] = None) -> Iterator[Dict[str, Any]]:
+    """Bounded-memory ordering for nearly sorted inputs (files are read in the given order)."""
+    stats = stats if stats is not None else SortStats()
+    return reorder((json.loads(line) for _, line in iter_keyed_lines(paths, stats)), lateness, on_late, stats)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Produce a time-ordered JSONL stream from unsorted log exports.")
+    ap.add_argument("inputs", nargs="+", help="Input JSONL(.gz) files or directories")
+    ap.add_argument("--out", required=True, help="Output JSONL path (.gz to compress)")
+    ap.add_argument("--run-events", type=int, default=200_000, help="Events per in-memory sorted run")
+    ap.add_argument("--fan-in", type=int, default=64, help="Max runs merged at once")
+    ap.add_argument("--tmp-dir", default=None, help="Where to spill runs (default: system temp)")
+    ap.add_argument("--lateness-seconds", type=float, default=None,
+                    help="Use bounded reordering for nearly sorted input instead of a full external sort")
+    ap.add_argument("--late-out", default=None, help="With --lateness-seconds: write late events here")
+    args = ap.parse_args()
+    if args.run_events < 1:
+        ap.error("--run-events must be at least 1")
+    if args.fan_in < 2:
+        ap.error("--fan-in must be at least 2 (merging one run at a time never finishes)")
+
+    stats = SortStats()
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    inputs = [Path(p) for p in args.inputs]
+
+    late_f = open_text(Path(args.late_out), "w") if args.late_out else None
+    try:
+        if args.lateness_seconds is not None:
+            on_late = (lambda e: late_f.write(json.dumps(e) + "\n")) if late_f else None
+            events = iter_reordered(inputs, timedelta(seconds=args.lateness_seconds), on_late, stats)
+        else:
+            events = iter_sorted(inputs, args.run_events, args.fan_in, Path(args.tmp_dir) if args.tmp_dir else None, stats)
+        with open_text(out_path, "w") as f:
+            for e in events:
+                f.write(json.dumps(e) + "\n")
+    finally:
+        if late_f:
+            late_f.close()
+
+    print(f"Wrote: {out_path}")
+    print(f"events={stats.events} runs={stats.runs} merge_passes={stats.merge_passes} late={stats.late} "
+          f"skipped_malformed={stats.skipped_malformed} skipped_missing_time={stats.skipped_missing_time}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,38 @@
 # tools/local-kql/generate_sample_logs.py
+"""
+Synthetic Entra SigninLogs/AuditLogs generator.
+
+Baseline activity is generated in shards of (UTC day, block of users). Every
+shard draws from its own RNG seeded from (seed, day, block), so the output is
+identical for any --workers value. Each shard is sorted and spilled to a temp
+run file; runs of one day are heap-merged into the output and deleted before
+the next day is written, so memory stays flat regardless of dataset size.
+
+Default run writes a small demo-sized dataset to data/sample-logs/ (same
+scenarios as the checked-in files, but not byte-identical to them):
+    python tools/local-kql/generate_sample_logs.py
+
+Load-test example (1M users x 90 days, gzip, one file per day):
+    python tools/local-kql/generate_sample_logs.py --extra-users 1000000 --days 90 \\
+        --workers 8 --partition-by day --compress --out-dir /tmp/load
+"""
+import argparse
+import gzip
+import hashlib
+import heapq
 import json
+import os
 import random
+import shutil
+import tempfile
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-random.seed(7)
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_OUT_DIR = REPO_ROOT / "data" / "sample-logs"
 
 def iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -14,7 +42,6 @@ NOW = datetime(2026, 1, 23, 14, 10, 0, tzinfo=timezone.utc)
 
 # Generate enough history for baseline detections (DET-03)
 HISTORY_DAYS = 21
-start = NOW - timedelta(days=HISTORY_DAYS)
 
 users = [
     {"upn": "standard.user1@lab.local", "id": "u-001", "home_country": "CA"},
@@ -23,6 +50,9 @@ users = [
     {"upn": "it.admin@lab.local",       "id": "u-004", "home_country": "CA"},
 ]
 
+# Users with day-to-day baseline sign-ins (the admin only shows up in audit scenarios)
+BASELINE_USERS = users[:3]
+
 apps = ["Microsoft Teams", "Microsoft 365 Portal", "Azure Portal", "SharePoint Online"]
 user_agents = [
     "Mozilla/5.0",
@@ -30,7 +60,49 @@ user_agents = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
 ]
 
+# Benign directory operations used for background audit volume (match no DET-04..07 keyword)
+background_audit_ops = ["Update user", "Change user password", "Update group"]
+
+@dataclass
+class GeneratorConfig:
+    seed: int = 7
+    now: datetime = NOW
+    days: int = HISTORY_DAYS
+    extra_users: int = 0              # synthetic users added to the baseline population
+    users_per_shard: int = 1000       # shard size; part of the data definition, not of parallelism
+    signins_per_user_day: Tuple[int, int] = (2, 5)
+    failure_rate: float = 0.08
+    audit_rate: float = 0.0           # background audit events per user-day (0 = demo data only)
+    scenarios: bool = True
+    workers: int = 1
+    out_dir: Path = DEFAULT_OUT_DIR
+    partition_by: str = "none"        # "none" -> SigninLogs.jsonl, "day" -> SigninLogs/YYYY-MM-DD.jsonl
+    compress: bool = False
+    tmp_dir: Optional[Path] = None
+
+    # derived
+    start_day: datetime = field(init=False)
+
+    def __post_init__(self) -> None:
+        first = self.now - timedelta(days=self.days)
+        self.start_day = first.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def derive_seed(seed: int, *parts: Any) -> int:
+    # Stable across processes and Python versions (unlike hash()).
+    h = hashlib.sha256(":".join(str(p) for p in (seed, *parts)).encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big")
+
+def population_size(cfg: GeneratorConfig) -> int:
+    return len(BASELINE_USERS) + cfg.extra_users
+
+def user_at(i: int) -> dict:
+    if i < len(BASELINE_USERS):
+        return BASELINE_USERS[i]
+    n = i - len(BASELINE_USERS) + 1
+    return {"upn": f"user{n:07d}@lab.local", "id": f"u-x{n:07d}", "home_country": "CA"}
+
 def sign_in_event(
+    rng: random.Random,
     dt: datetime,
     user: dict,
     ok: bool = True,
@@ -41,36 +113,37 @@ def sign_in_event(
     reason: str | None = None,
 ) -> dict:
     if ip is None:
-        ip = f"192.0.2.{random.randint(10,200)}" if country == "CA" else f"198.51.100.{random.randint(10,200)}"
+        ip = f"192.0.2.{rng.randint(10,200)}" if country == "CA" else f"198.51.100.{rng.randint(10,200)}"
 
     status = {"errorCode": 0, "failureReason": None, "additionalDetails": None}
     if not ok:
         status = {
             "errorCode": error_code if error_code is not None else 50126,
             "failureReason": reason if reason else "Invalid username or password",
-            "additionalDetails": "MFA required" if random.random() < 0.2 else None,
+            "additionalDetails": "MFA required" if rng.random() < 0.2 else None,
         }
 
     return {
         "TimeGenerated": iso(dt),
         "UserPrincipalName": user["upn"],
         "UserId": user["id"],
-        "AppDisplayName": random.choice(apps),
+        "AppDisplayName": rng.choice(apps),
         "IPAddress": ip,
         "Location": {"countryOrRegion": country, "city": "Vancouver" if country == "CA" else "Unknown"},
         "DeviceDetail": {
             "operatingSystem": "Windows",
             "browser": "Chrome",
-            "deviceId": f"dev-{random.randint(100,999)}",
+            "deviceId": f"dev-{rng.randint(100,999)}",
         },
         "Status": status,
         "ConditionalAccessStatus": "success" if ok else "failure",
-        "AuthenticationRequirement": "multiFactorAuthentication" if random.random() < 0.5 else "singleFactorAuthentication",
+        "AuthenticationRequirement": "multiFactorAuthentication" if rng.random() < 0.5 else "singleFactorAuthentication",
         "ClientAppUsed": "Legacy Authentication" if legacy else "Browser",
-        "UserAgent": random.choice(user_agents),
+        "UserAgent": rng.choice(user_agents),
     }
 
 def audit_event(
+    rng: random.Random,
     dt: datetime,
     op: str,
     initiated_upn: str,
@@ -92,127 +165,246 @@ def audit_event(
             }
         ],
         "AdditionalDetails": [],
-        "CorrelationId": f"corr-{random.randint(100000,999999)}",
+        "CorrelationId": f"corr-{rng.randint(100000,999999)}",
     }
 
-signin: list[dict] = []
-audit: list[dict] = []
-
-# --- Baseline: normal sign-ins across HISTORY_DAYS (CA)
-# Each day each non-admin user signs in a few times (mostly success)
-for day in range(HISTORY_DAYS):
-    day_base = start + timedelta(days=day)
-    for user in users[:3]:
-        n = random.randint(2, 5)
-        for i in range(n):
-            dt = day_base + timedelta(hours=random.randint(8, 20), minutes=random.randint(0, 59))
-            ok = True if random.random() > 0.08 else False  # small background failure rate
-            signin.append(sign_in_event(dt, user, ok=ok, country=user["home_country"]))
-
-# --- DET-01 scenario: many failures then success (same IP), from RU
-victim = users[0]
-spray_time = NOW - timedelta(hours=6)
-attacker_country = "RU"
-spray_ip = "203.0.113.77"
-for i in range(15):
-    signin.append(
-        sign_in_event(
-            spray_time + timedelta(minutes=i),
-            victim,
-            ok=False,
-            country=attacker_country,
-            ip=spray_ip,
-        )
-    )
-signin.append(
-    sign_in_event(
-        spray_time + timedelta(minutes=20),
-        victim,
-        ok=True,
-        country=attacker_country,
-        ip=spray_ip,
-    )
-)
-
-# --- DET-02 scenario: legacy auth usage (successful)
-legacy_user = users[1]
-legacy_time = NOW - timedelta(hours=12)
-signin.append(sign_in_event(legacy_time, legacy_user, ok=True, country="CA", legacy=True))
-
-# --- DET-03 scenario: new country sign-ins that repeat (2 hits) for same user (baseline is CA)
-traveler = users[2]
-new_country_time = NOW - timedelta(hours=10)
-new_country_ip = "198.51.100.44"
-signin.append(sign_in_event(new_country_time, traveler, ok=True, country="RU", ip=new_country_ip))
-signin.append(sign_in_event(new_country_time + timedelta(minutes=20), traveler, ok=True, country="RU", ip=new_country_ip))
-
-# --- DET-04 privileged role assignment (AuditLogs)
-admin = users[3]
-audit_time = NOW - timedelta(hours=5)
-audit.append(
-    audit_event(
-        audit_time,
-        "Add member to role",
-        admin["upn"],
-        "Role",
-        "Global Administrator",
+# ---------------- shards ----------------
+def _shards(cfg: GeneratorConfig) -> List[Tuple[int, int]]:
+    blocks = (population_size(cfg) + cfg.users_per_shard - 1) // cfg.users_per_shard
+    return [(day, block) for day in range(cfg.days) for block in range(blocks)]
+
+def _baseline_shard(cfg: GeneratorConfig, day: int, block: int) -> Tuple[List[dict], List[dict]]:
+    # Normal sign-ins (mostly success) for one day and one block of users.
+    rng = random.Random(derive_seed(cfg.seed, "baseline", day, block))
+    day_base = cfg.start_day + timedelta(days=day)
+    lo = block * cfg.users_per_shard
+    hi = min(lo + cfg.users_per_shard, population_size(cfg))
+
+    signin: List[dict] = []
+    audit: List[dict] = []
+    for i in range(lo, hi):
+        user = user_at(i)
+        n = rng.randint(*cfg.signins_per_user_day)
+        for _ in range(n):
+            dt = day_base + timedelta(hours=rng.randint(8, 20), minutes=rng.randint(0, 59))
+            ok = rng.random() > cfg.failure_rate  # small background failure rate
+            signin.append(sign_in_event(rng, dt, user, ok=ok, country=user["home_country"]))
+        if cfg.audit_rate and rng.random() < cfg.audit_rate:
+            dt = day_base + timedelta(hours=rng.randint(8, 20), minutes=rng.randint(0, 59))
+            audit.append(audit_event(rng, dt, rng.choice(background_audit_ops), user["upn"], "User", user["upn"]))
+    return signin, audit
+
+def scenario_events(cfg: GeneratorConfig) -> Tuple[List[dict], List[dict]]:
+    """The attack storylines behind DET-01..DET-07, anchored on cfg.now."""
+    rng = random.Random(derive_seed(cfg.seed, "scenarios"))
+    now = cfg.now
+    signin: List[dict] = []
+    audit: List[dict] = []
+
+    # --- DET-01 scenario: many failures then success (same IP), from RU
+    victim = users[0]
+    spray_time = now - timedelta(hours=6)
+    attacker_country = "RU"
+    spray_ip = "203.0.113.77"
+    for i in range(15):
+        signin.append(sign_in_event(rng, spray_time + timedelta(minutes=i), victim, ok=False, country=attacker_country, ip=spray_ip))
+    signin.append(sign_in_event(rng, spray_time + timedelta(minutes=20), victim, ok=True, country=attacker_country, ip=spray_ip))
+
+    # --- DET-02 scenario: legacy auth usage (successful)
+    legacy_user = users[1]
+    signin.append(sign_in_event(rng, now - timedelta(hours=12), legacy_user, ok=True, country="CA", legacy=True))
+
+    # --- DET-03 scenario: new country sign-ins that repeat (2 hits) for same user (baseline is CA)
+    traveler = users[2]
+    new_country_time = now - timedelta(hours=10)
+    new_country_ip = "198.51.100.44"
+    signin.append(sign_in_event(rng, new_country_time, traveler, ok=True, country="RU", ip=new_country_ip))
+    signin.append(sign_in_event(rng, new_country_time + timedelta(minutes=20), traveler, ok=True, country="RU", ip=new_country_ip))
+
+    # --- DET-04 privileged role assignment (AuditLogs)
+    admin = users[3]
+    audit.append(audit_event(
+        rng, now - timedelta(hours=5), "Add member to role", admin["upn"], "Role", "Global Administrator",
         extra=[{"displayName": "RoleAssignment", "newValue": victim["upn"], "oldValue": ""}],
-    )
-)
-
-# --- DET-05 app credential added (persistence)
-audit.append(
-    audit_event(
-        NOW - timedelta(hours=4),
-        "Add service principal credentials",
-        admin["upn"],
-        "ServicePrincipal",
-        "Contoso-App",
+    ))
+
+    # --- DET-05 app credential added (persistence)
+    audit.append(audit_event(
+        rng, now - timedelta(hours=4), "Add service principal credentials", admin["upn"], "ServicePrincipal", "Contoso-App",
         extra=[{"displayName": "KeyDescription", "newValue": "New client secret", "oldValue": ""}],
-    )
-)
-
-# --- DET-06 consent granted (OAuth)
-audit.append(
-    audit_event(
-        NOW - timedelta(hours=3),
-        "Consent to application",
-        victim["upn"],
-        "Application",
-        "Suspicious-OAuth-App",
+    ))
+
+    # --- DET-06 consent granted (OAuth)
+    audit.append(audit_event(
+        rng, now - timedelta(hours=3), "Consent to application", victim["upn"], "Application", "Suspicious-OAuth-App",
         extra=[{"displayName": "Scopes", "newValue": "Mail.Read Files.Read.All", "oldValue": ""}],
-    )
-)
-
-# --- DET-07 MFA/security info changed
-audit.append(
-    audit_event(
-        NOW - timedelta(hours=2),
-        "User updated security info",
-        victim["upn"],
-        "User",
-        victim["upn"],
+    ))
+
+    # --- DET-07 MFA/security info changed
+    audit.append(audit_event(
+        rng, now - timedelta(hours=2), "User updated security info", victim["upn"], "User", victim["upn"],
         extra=[{"displayName": "AuthenticationMethod", "newValue": "Microsoft Authenticator added", "oldValue": ""}],
-    )
-)
+    ))
+
+    return signin, audit
+
+# ---------------- sorted runs + merge ----------------
+# Run files hold one "<TimeGenerated>\t<json>" line per event so the merge can
+# order lines without re-parsing JSON.
+def _write_run(events: List[dict], path: Path) -> None:
+    events.sort(key=lambda x: x["TimeGenerated"])
+    with path.open("w", encoding="utf-8") as f:
+        for e in events:
+            f.write(e["TimeGenerated"] + "\t" + json.dumps(e) + "\n")
+
+def _read_run(path: Path) -> Iterator[str]:
+    with path.open("r", encoding="utf-8") as f:
+        yield from f
+
+def _shard_worker(args: Tuple[GeneratorConfig, int, int, str]) -> Tuple[int, str, str]:
+    cfg, day, block, tmp = args
+    signin, audit = _baseline_shard(cfg, day, block)
+    s_path = Path(tmp) / f"signin-{day:05d}-{block:06d}.run"
+    a_path = Path(tmp) / f"audit-{day:05d}-{block:06d}.run"
+    _write_run(signin, s_path)
+    _write_run(audit, a_path)
+    return day, str(s_path), str(a_path)
+
+class _Sink:
+    """Writes time-ordered JSONL for one table, either one file or one file per UTC day."""
+
+    def __init__(self, cfg: GeneratorConfig, table: str) -> None:
+        self.cfg = cfg
+        self.table = table
+        self.ext = ".jsonl.gz" if cfg.compress else ".jsonl"
+        self.paths: List[Path] = []
+        self._f = None
+        self._key: Optional[str] = None
+        if cfg.partition_by == "none":
+            self._open(cfg.out_dir / f"{table}{self.ext}")
 
-# --- Output paths (always write into repo/data/sample-logs regardless of current working directory)
-repo_root = Path(__file__).resolve().parents[2]
-out_dir = repo_root / "data" / "sample-logs"
-out_dir.mkdir(parents=True, exist_ok=True)
+    def _open(self, path: Path) -> None:
+        if self._f is not None:
+            self._f.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = gzip.open(path, "wt", encoding="utf-8") if self.cfg.compress else path.open("w", encoding="utf-8")
+        self.paths.append(path)
 
-signin_path = out_dir / "SigninLogs.jsonl"
-audit_path = out_dir / "AuditLogs.jsonl"
+    def write(self, run_line: str) -> None:
+        ts, _, body = run_line.partition("\t")
+        if self.cfg.partition_by == "day" and ts[:10] != self._key:
+            self._key = ts[:10]
+            self._open(self.cfg.out_dir / self.table / f"{self._key}{self.ext}")
+        self._f.write(body)
 
-with open(signin_path, "w", encoding="utf-8") as f:
-    for e in sorted(signin, key=lambda x: x["TimeGenerated"]):
-        f.write(json.dumps(e) + "\n")
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+def _merge_into(sink: _Sink, runs: List[Path]) -> None:
+    for line in heapq.merge(*(_read_run(p) for p in runs), key=lambda l: l[:20]):
+        sink.write(line)
+    for p in runs:
+        p.unlink()
+
+def generate(cfg: GeneratorConfig) -> Dict[str, List[Path]]:
+    """Generate the dataset described by cfg; returns the written paths per table."""
+    if cfg.partition_by not in ("none", "day"):
+        raise ValueError(f"partition_by must be 'none' or 'day', got {cfg.partition_by!r}")
+    cfg.out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix="gen-runs-", dir=cfg.tmp_dir))
+
+    # Scenario events are few; bucket them by shard day so they join that day's merge.
+    scen_signin, scen_audit = scenario_events(cfg) if cfg.scenarios else ([], [])
+    scen_by_day: Dict[int, Tuple[List[dict], List[dict]]] = {}
+    for table, events in ((0, scen_signin), (1, scen_audit)):
+        for e in events:
+            t = datetime.strptime(e["TimeGenerated"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+            day = min(max((t - cfg.start_day).days, 0), cfg.days - 1)
+            scen_by_day.setdefault(day, ([], []))[table].append(e)
+
+    signin_sink = _Sink(cfg, "SigninLogs")
+    audit_sink = _Sink(cfg, "AuditLogs")
+    jobs = [(cfg, day, block, str(tmp)) for day, block in _shards(cfg)]
+    pool = Pool(cfg.workers) if cfg.workers > 1 else None
+    try:
+        results = pool.imap(_shard_worker, jobs) if pool else map(_shard_worker, jobs)
+        pending_day: Optional[int] = None
+        s_runs: List[Path] = []
+        a_runs: List[Path] = []
+
+        def flush(day: int) -> None:
+            extra_s, extra_a = scen_by_day.pop(day, ([], []))
+            if extra_s:
+                s_runs.append(tmp / f"signin-{day:05d}-scenario.run")
+                _write_run(extra_s, s_runs[-1])
+            if extra_a:
+                a_runs.append(tmp / f"audit-{day:05d}-scenario.run")
+                _write_run(extra_a, a_runs[-1])
+            _merge_into(signin_sink, s_runs)
+            _merge_into(audit_sink, a_runs)
+            s_runs.clear()
+            a_runs.clear()
+
+        # imap yields in job order (day-major), so a day is complete once the next one starts.
+        for day, s_path, a_path in results:
+            if pending_day is not None and day != pending_day:
+                flush(pending_day)
+            pending_day = day
+            s_runs.append(Path(s_path))
+            a_runs.append(Path(a_path))
+        if pending_day is not None:
+            flush(pending_day)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        signin_sink.close()
+        audit_sink.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {"SigninLogs": signin_sink.paths, "AuditLogs": audit_sink.paths}
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Generate Entra-shaped SigninLogs/AuditLogs sample data.")
+    ap.add_argument("--seed", type=int, default=7, help="Master seed (shard seeds are derived from it)")
+    ap.add_argument("--days", type=int, default=HISTORY_DAYS, help="Days of baseline history before NOW")
+    ap.add_argument("--now", default=iso(NOW), help="Anchor time for scenarios, e.g. 2026-01-23T14:10:00Z")
+    ap.add_argument("--extra-users", type=int, default=0, help="Synthetic users added to the baseline population")
+    ap.add_argument("--users-per-shard", type=int, default=1000, help="Users per (day, block) shard")
+    ap.add_argument("--audit-rate", type=float, default=0.0, help="Background audit events per user-day")
+    ap.add_argument("--no-scenarios", action="store_true", help="Omit the DET-01..DET-07 attack storylines")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    ap.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="Output directory")
+    ap.add_argument("--partition-by", choices=["none", "day"], default="none", help="Single file or one file per UTC day")
+    ap.add_argument("--compress", action="store_true", help="gzip the output files")
+    args = ap.parse_args()
+    if args.days < 1:
+        ap.error("--days must be at least 1 (scenario events are written into the day shards)")
+
+    cfg = GeneratorConfig(
+        seed=args.seed,
+        now=datetime.strptime(args.now, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc),
+        days=args.days,
+        extra_users=args.extra_users,
+        users_per_shard=args.users_per_shard,
+        audit_rate=args.audit_rate,
+        scenarios=not args.no_scenarios,
+        workers=args.workers,
+        out_dir=Path(args.out_dir),
+        partition_by=args.partition_by,
+        compress=args.compress,
+    )
+    written = generate(cfg)
 
-with open(audit_path, "w", encoding="utf-8") as f:
-    for e in sorted(audit, key=lambda x: x["TimeGenerated"]):
-        f.write(json.dumps(e) + "\n")
+    print("Generated sample logs:")
+    for table, paths in written.items():
+        if len(paths) == 1:
+            print(f"- {paths[0]}")
+        else:
+            print(f"- {table}: {len(paths)} partitions under {cfg.out_dir / table}")
+    print(f"History days: {cfg.days} (NOW fixed at {iso(cfg.now)})")
 
-print("Generated sample logs:")
-print(f"- {signin_path}")
-print(f"- {audit_path}")
-print(f"History days: {HISTORY_DAYS} (NOW fixed at {iso(NOW)})")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# tools/local-kql/ingest.py
+"""
+Parallel, fault-tolerant ingestion of SigninLogs/AuditLogs exports.
+
+Each input file is split into byte-range chunks (aligned to line starts, so
+no line is split or read twice); worker processes parse and validate their
+chunks against the table schema in data/schemas/<Table>.schema.md, compiled
+once per worker. Valid records are normalized (TimeGenerated to
+2026-01-23T13:55:30Z UTC form, JSON-encoded dynamic columns decoded,
+Status.errorCode to int) and written in input order. Bad lines never abort
+the run: they go to a quarantine file with the source, byte offset, reason
+and raw text, and are counted per reason. Neither does a corrupt or truncated
+file: the rows before the damage are kept and the rest of the file is
+quarantined as one "unreadable file" record.
+
+    python tools/local-kql/ingest.py exports/SigninLogs*.jsonl.gz exports/AuditLogs.jsonl --workers 8
+
+Outputs (data/ingested/ by default):
+    <Table>.jsonl, quarantine/<Table>.quarantine.jsonl, ingest-report.json
+The table is taken from --table or from the file name (SigninLogs-2026-01.jsonl).
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / "enrichment-graph" / "src"))
+
+from external_sort import expand_inputs
+from investigation_bundle.log_schema import SchemaError, known_tables, load_validator
+
+DEFAULT_OUT_DIR = REPO_ROOT / "data" / "ingested"
+DEFAULT_CHUNK_MB = 16
+MAX_QUARANTINE_RAW = 16384  # chars of the offending line kept in quarantine
+
+def table_for(path: Path, tables: List[str]) -> Optional[str]:
+    for table in sorted(tables, key=len, reverse=True):
+        if path.name.startswith(table) or path.parent.name == table:
+            return table
+    return None
+
+def plan_chunks(path: Path, chunk_bytes: int) -> List[Tuple[int, int]]:
+    # gzip streams can't be entered mid-way: one chunk per file
+    if path.suffix == ".gz":
+        return [(0, -1)]
+    size = path.stat().st_size
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)] or [(0, 0)]
+
+def iter_chunk_lines(path: Path, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+    """(byte offset, raw line) for every line that *starts* in [start, end)."""
+    if end < 0:
+        with gzip.open(path, "rb") as f:
+            pos = 0
+            for raw in f:
+                yield pos, raw
+                pos += len(raw)
+        return
+    with path.open("rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # tail of a line owned by the previous chunk
+        pos = f.tell()
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            yield pos, raw
+            pos += len(raw)
+
+def process_chunk(job: Dict[str, Any]) -> Dict[str, Any]:
+    validator = load_validator(job["table"])
+    path = Path(job["path"])
+    part = Path(job["part_dir"]) / f"{job['index']:06d}"
+    ok = bad = 0
+    reasons: Counter = Counter()
+    unreadable = None
+    with part.with_suffix(".ok").open("w", encoding="utf-8") as out, part.with_suffix(".bad").open("w", encoding="utf-8") as qf:
+        def quarantine(offset: int, reason: str, detail: str, text: str) -> None:
+            nonlocal bad
+            bad += 1
+            reasons[reason] += 1
+            qf.write(json.dumps({
+                "source": str(path),
+                "offset": offset,
+                "reason": reason,
+                "detail": detail,
+                "raw": text[:MAX_QUARANTINE_RAW],
+            }) + "\n")
+
+        pos = max(job["start"], 0)
+        try:
+            for offset, raw in iter_chunk_lines(path, job["start"], job["end"]):
+                pos = offset + len(raw)
+                try:
+                    text = raw.decode("utf-8").strip()
+                except UnicodeDecodeError:
+                    text, reason, detail = raw.decode("utf-8", errors="replace").strip(), "invalid UTF-8", ""
+                else:
+                    if not text:
+                        continue
+                    try:
+                        out.write(json.dumps(validator.validate(json.loads(text))) + "\n")
+                        ok += 1
+                        continue
+                    except SchemaError as e:
+                        reason, detail = e.reason, e.detail
+                    except ValueError as e:
+                        reason, detail = "invalid JSON", str(e)
+                    except Exception as e:  # never let one line take down the chunk
+                        reason, detail = "unexpected error", f"{type(e).__name__}: {e}"
+                quarantine(offset, reason, detail, text)
+        except (OSError, EOFError, zlib.error) as e:
+            # corrupt or truncated gzip stream, or a read error: keep the rows
+            # read so far and quarantine the rest of the chunk as one record
+            unreadable = f"{type(e).__name__}: {e}"
+            quarantine(pos, "unreadable file", unreadable, "")
+    return {"index": job["index"], "table": job["table"], "ok": ok, "bad": bad, "reasons": dict(reasons), "unreadable": unreadable}
+
+def _concat(parts: List[Path], dest: Path) -> None:
+    # written next to dest and swapped in, so a failed run leaves the previous output intact
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(dest.suffix + ".tmp")
+    with tmp.open("wb") as out:
+        for p in parts:
+            with p.open("rb") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+    tmp.replace(dest)
+
+def ingest(
+    files: List[Path],
+    out_dir: Path,
+    table: Optional[str] = None,
+    workers: int = 1,
+    chunk_bytes: int = DEFAULT_CHUNK_MB * 1024 * 1024,
+    tmp_dir: Optional[Path] = None,
+) -> Dict[str, Any]:
+    tables = known_tables()
+    jobs: List[Dict[str, Any]] = []
+    input_bytes: Counter = Counter()
+    with tempfile.TemporaryDirectory(prefix="ingest-", dir=tmp_dir) as part_dir:
+        for path in files:
+            t = table or table_for(path, tables)
+            if t is None:
+                raise ValueError(f"Can't tell the table of {path}; name it <Table>*.jsonl or pass --table ({', '.join(tables)})")
+            input_bytes[t] += path.stat().st_size
+            for start, end in plan_chunks(path, chunk_bytes):
+                jobs.append({"index": len(jobs), "table": t, "path": str(path), "start": start, "end": end, "part_dir": part_dir})
+
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process_chunk, jobs))
+        elapsed = time.perf_counter() - t0
+
+        report: Dict[str, Dict[str, Any]] = {}
+        for t in sorted({j["table"] for j in jobs}):
+            idx = [j["index"] for j in jobs if j["table"] == t]
+            parts = [Path(part_dir) / f"{i:06d}" for i in idx]
+            out_path = out_dir / f"{t}.jsonl"
+            q_path = out_dir / "quarantine" / f"{t}.quarantine.jsonl"
+            _concat([p.with_suffix(".ok") for p in parts], out_path)
+            _concat([p.with_suffix(".bad") for p in parts], q_path)
+            reasons: Counter = Counter()
+            for r in results:
+                if r["table"] == t:
+                    reasons.update(r["reasons"])
+            ok = sum(r["ok"] for r in results if r["table"] == t)
+            bad = sum(r["bad"] for r in results if r["table"] == t)
+            unreadable = {jobs[r["index"]]["path"]: r["unreadable"] for r in results if r["table"] == t and r["unreadable"]}
+            report[t] = {
+                "files": sorted({j["path"] for j in jobs if j["table"] == t}),
+                "chunks": len(idx),
+                "rows_ok": ok,
+                "rows_quarantined": bad,
+                "quarantine_reasons": dict(reasons.most_common()),
+                "files_unreadable": unreadable,
+                "input_bytes": input_bytes[t],
+                "output": str(out_path),
+                "quarantine": str(q_path),
+            }
+    total_mb = sum(input_bytes.values()) / 1e6
+    return {
+        "seconds": round(elapsed, 4),
+        "workers": workers,
+        "mb_per_s": round(total_mb / elapsed, 2) if elapsed > 0 else None,
+        "tables": report,
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Validate, normalize and quarantine log exports in parallel.")
+    ap.add_argument("inputs", nargs="+", help="JSONL / JSONL.gz files or directories")
+    ap.add_argument("--table", default=None, help="Table for all inputs (default: from file names)")
+    ap.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="Where <Table>.jsonl and quarantine/ are written")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes")
+    ap.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_MB, help="Byte-range chunk size for plain files")
+    ap.add_argument("--tmp-dir", default=None, help="Where chunk parts are staged (default: system temp)")
+    ap.add_argument("--max-bad-ratio", type=float, default=None, help="Exit 2 if the quarantined share of any table exceeds this")
+    args = ap.parse_args()
+
+    files = expand_inputs(Path(p) for p in args.inputs)
+    if not files:
+        raise SystemExit("No input files.")
+    if args.table and args.table not in known_tables():
+        raise SystemExit(f"Unknown table {args.table} (expected one of {', '.join(known_tables())})")
+    out_dir = Path(args.out_dir)
+    try:
+        report = ingest(files, out_dir, args.table, max(1, args.workers), max(1, int(args.chunk_mb * 1024 * 1024)),
+                        Path(args.tmp_dir) if args.tmp_dir else None)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "ingest-report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    too_bad = []
+    for t, r in report["tables"].items():
+        total = r["rows_ok"] + r["rows_quarantined"]
+        ratio = r["rows_quarantined"] / total if total else 0.0
+        print(f"{t}: {r['rows_ok']} ok, {r['rows_quarantined']} quarantined ({ratio:.2%}) from {len(r['files'])} file(s), {r['chunks']} chunk(s)")
+        for reason, n in r["quarantine_reasons"].items():
+            print(f"    {n:>8}  {reason}")
+        for f, err in r["files_unreadable"].items():
+            print(f"    unreadable: {f} ({err})")
+        if args.max_bad_ratio is not None and ratio > args.max_bad_ratio:
+            too_bad.append(t)
+    print(f"{report['seconds']}s, {report['mb_per_s']} MB/s on {report['workers']} workers")
+    print(f"Wrote: {out_dir}")
+    if too_bad:
+        print(f"Quarantine ratio above {args.max_bad_ratio} for: {', '.join(too_bad)}", file=sys.stderr)
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
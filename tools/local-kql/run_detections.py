@@ -1,16 +1,36 @@
 # tools/local-kql/run_detections.py
+import argparse
+import hashlib
 import json
+import re
+import sys
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / "enrichment-graph" / "src"))
+
+from investigation_bundle.artifact_cache import (
+    ArtifactCache,
+    IncidentRegistry,
+    code_version,
+    package_code_version,
+    remove_stale,
+    write_if_changed,
+)
+from investigation_bundle.bounded_evidence import RunningStats, TopK
+from investigation_bundle.event_refs import project
+from investigation_bundle.ip_intel import IpIntel, load_default_ip_intel
+from investigation_bundle.log_schema import row_checker
+
 DATA_SIGNIN = REPO_ROOT / "data" / "sample-logs" / "SigninLogs.jsonl"
 DATA_AUDIT  = REPO_ROOT / "data" / "sample-logs" / "AuditLogs.jsonl"
 
 OUT_DIR = REPO_ROOT / "data" / "demo-output"
 ALERTS_PATH = OUT_DIR / "alerts.json"
 INCIDENTS_DIR = OUT_DIR / "incident_contexts"
+INCIDENT_IDS_PATH = OUT_DIR / "incident_ids.json"
 
 def _parse_time(s: str) -> datetime:
     return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
@@ -19,74 +39,152 @@ def load_jsonl(path: Path) -> List[Dict[str, Any]]:
     if not path.exists():
         raise FileNotFoundError(f"Missing file: {path}\nRun generate_sample_logs.py first.")
     rows: List[Dict[str, Any]] = []
-    with path.open("r", encoding="utf-8") as f:
+    check = row_checker(path)
+    skipped = 0
+    with path.open("r", encoding="utf-8", errors="replace") as f:
         for line in f:
             line = line.strip()
             if line:
-                rows.append(json.loads(line))
+                # one bad line shouldn't abort the run; ingest.py quarantines them with reasons
+                try:
+                    row = check(json.loads(line))
+                except ValueError:
+                    row = None
+                if row is None:
+                    skipped += 1
+                    continue
+                rows.append(row)
+    if skipped:
+        print(f"WARNING: skipped {skipped} malformed line(s) in {path}; run tools/local-kql/ingest.py to quarantine them", file=sys.stderr)
     return rows
 
-def _time_range(events: List[Dict[str, Any]]) -> tuple[str, str]:
-    if not events:
-        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        return now, now
-    ts = sorted([e["TimeGenerated"] for e in events])
-    return ts[0], ts[-1]
+def _ok(e: Dict[str, Any]) -> bool:
+    status = e.get("Status")
+    return int(status.get("errorCode", 0) if isinstance(status, dict) else 0) == 0
+
+def _country(e: Dict[str, Any]) -> Optional[str]:
+    # Location may also be a plain string (schema: dynamic/string), which has no country
+    loc = e.get("Location")
+    return (loc.get("countryOrRegion") if isinstance(loc, dict) else None) or None
+
+# Each rule is split into a scan of one partition of rows into a small partial
+# state, a merge of partials (in partition order) and a finalize step that
+# applies the tunables and IP intel. The detN functions run all three over one
+# list; detect_partitioned() caches partials per UTC day (as JSON) so appending
+# a day only scans that day. Partials are built from the bounded_evidence
+# holders: per key they keep O(K) events no matter how many events match.
 
 # ---------------- DET-01 ----------------
-def det01_failures_then_success(signins: List[Dict[str, Any]], fail_threshold: int = 10) -> List[Dict[str, Any]]:
-    # group by IP
-    by_ip: Dict[str, List[Dict[str, Any]]] = {}
+_DET01_FIELDS = ("TimeGenerated", "UserPrincipalName", "AppDisplayName", "Location.countryOrRegion")
+
+class _IpState:
+    """DET-01 partial for one IP: time range of its sign-ins, failures (two earliest kept), earliest success."""
+    __slots__ = ("times", "failures", "first_success")
+
+    def __init__(self) -> None:
+        self.times: RunningStats[str] = RunningStats(key=None)
+        self.failures: TopK[Dict[str, Any]] = TopK(2, largest=False)
+        self.first_success: TopK[Dict[str, Any]] = TopK(1, largest=False)
+
+    def merge(self, other: "_IpState") -> "_IpState":
+        self.times.merge(other.times)
+        self.failures.merge(other.failures)
+        self.first_success.merge(other.first_success)
+        return self
+
+    def to_json(self) -> Dict[str, Any]:
+        failures, success = self.failures.to_json(), self.first_success.to_json()
+        # cached partials keep only the fields the alert reads
+        failures["items"] = [project(e, _DET01_FIELDS) for e in failures["items"]]
+        success["items"] = [project(e, _DET01_FIELDS) for e in success["items"]]
+        return {"times": self.times.to_json(), "failures": failures, "first_success": success}
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> "_IpState":
+        st = cls()
+        st.times = RunningStats.from_json(raw["times"], key=None)
+        st.failures = TopK.from_json(raw["failures"], 2, largest=False)
+        st.first_success = TopK.from_json(raw["first_success"], 1, largest=False)
+        return st
+
+def _det01_scan(signins: Iterable[Dict[str, Any]]) -> Dict[str, _IpState]:
+    by_ip: Dict[str, _IpState] = {}
     for e in signins:
         ip = e.get("IPAddress")
         if ip:
-            by_ip.setdefault(ip, []).append(e)
+            st = by_ip.get(ip)
+            if st is None:
+                st = by_ip[ip] = _IpState()
+            st.times.add(e["TimeGenerated"])
+            if _ok(e):
+                st.first_success.add(e)
+            else:
+                st.failures.add(e)
+    return by_ip
 
+def _det01_merge(acc: Dict[str, _IpState], part: Dict[str, Any]) -> Dict[str, _IpState]:
+    # part: a cached partial (ip -> _IpState.to_json())
+    for ip, raw in part.items():
+        st = _IpState.from_json(raw)
+        a = acc.get(ip)
+        acc[ip] = st if a is None else a.merge(st)
+    return acc
+
+def _det01_alerts(by_ip: Dict[str, _IpState], fail_threshold: int = 10, ip_intel: Optional[IpIntel] = None) -> List[Dict[str, Any]]:
     alerts = []
-    for ip, events in by_ip.items():
-        events.sort(key=lambda x: x["TimeGenerated"])
-        failures = [e for e in events if int((e.get("Status") or {}).get("errorCode", 0)) != 0]
-        successes = [e for e in events if int((e.get("Status") or {}).get("errorCode", 0)) == 0]
-        if len(failures) >= fail_threshold and successes:
-            first, last = _time_range(events)
+    for ip, st in by_ip.items():
+        if st.failures.seen >= fail_threshold and st.first_success:
+            success = st.first_success.items()[0]
             evidence = {
                 "first_failures": [
-                    {"time": failures[0]["TimeGenerated"], "user": failures[0]["UserPrincipalName"], "app": failures[0]["AppDisplayName"]},
-                    {"time": failures[1]["TimeGenerated"], "user": failures[1]["UserPrincipalName"], "app": failures[1]["AppDisplayName"]},
+                    {"time": f["TimeGenerated"], "user": f["UserPrincipalName"], "app": f["AppDisplayName"]}
+                    for f in st.failures.items()
                 ],
                 "success": {
-                    "time": successes[0]["TimeGenerated"],
-                    "user": successes[0]["UserPrincipalName"],
-                    "app": successes[0]["AppDisplayName"]
+                    "time": success["TimeGenerated"],
+                    "user": success["UserPrincipalName"],
+                    "app": success["AppDisplayName"]
                 }
             }
-            accounts = sorted({successes[0].get("UserPrincipalName")})
-            country = ((successes[0].get("Location") or {}).get("countryOrRegion")) or None
+            if ip_intel is not None:
+                evidence["ip_intel"] = ip_intel.lookup(ip)
+            accounts = sorted({success.get("UserPrincipalName")})
+            country = _country(success)
             alerts.append({
                 "detection_id": "DET-01",
                 "title": "Multiple failures followed by success from same IP",
                 "severity": "High",
                 "entities": {"accounts": accounts, "ips": [ip], "country": country},
-                "time_first": first,
-                "time_last": last,
+                "time_first": st.times.min,
+                "time_last": st.times.max,
                 "evidence": evidence
             })
     return alerts
 
+def det01_failures_then_success(signins: List[Dict[str, Any]], fail_threshold: int = 10, ip_intel: Optional[IpIntel] = None) -> List[Dict[str, Any]]:
+    return _det01_alerts(_det01_scan(signins), fail_threshold, ip_intel)
+
 # ---------------- DET-02 ----------------
-def det02_legacy_auth(signins: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    hits = [e for e in signins if (e.get("ClientAppUsed") or "").lower().find("legacy") >= 0 and int((e.get("Status") or {}).get("errorCode", 0)) == 0]
+# Hit partials (DET-02, DET-04..07) are RunningStats over the matching
+# events: count, time range and the newest event (max_item) as the sample.
+def _det02_scan(signins: Iterable[Dict[str, Any]]) -> RunningStats:
+    hits: RunningStats = RunningStats()
+    for e in signins:
+        if (e.get("ClientAppUsed") or "").lower().find("legacy") >= 0 and _ok(e):
+            hits.add(e)
+    return hits
+
+def _det02_alerts(hits: RunningStats) -> List[Dict[str, Any]]:
     if not hits:
         return []
-    hits.sort(key=lambda x: x["TimeGenerated"], reverse=True)
-    top = hits[0]
+    top = hits.max_item
     return [{
         "detection_id": "DET-02",
         "title": "Legacy Authentication sign-in detected",
         "severity": "Medium",
         "entities": {"accounts": [top.get("UserPrincipalName")], "ips": [top.get("IPAddress")]},
-        "time_first": hits[-1]["TimeGenerated"],
-        "time_last": hits[0]["TimeGenerated"],
+        "time_first": hits.min,
+        "time_last": hits.max,
         "evidence": {
             "sample_event": {
                 "time": top.get("TimeGenerated"),
@@ -98,42 +196,82 @@ def det02_legacy_auth(signins: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         }
     }]
 
+def det02_legacy_auth(signins: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _det02_alerts(_det02_scan(signins))
+
 # ---------------- DET-03 ----------------
-def det03_new_country(signins: List[Dict[str, Any]], baseline_days: int = 14, recent_hours: int = 24, min_hits: int = 2) -> List[Dict[str, Any]]:
-    # compute max time as "now"
-    times = [_parse_time(e["TimeGenerated"]) for e in signins]
-    now = max(times) if times else datetime.now(timezone.utc)
+def _det03_scan(signins: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    # Baseline/recent windows hang off the newest sign-in overall, so the
+    # partial keeps that time plus one compact row per successful sign-in
+    # with a user and country: [time, user, country, ip, app].
+    newest = None
+    rows: List[List[Any]] = []
+    for e in signins:
+        t = e["TimeGenerated"]
+        if newest is None or t > newest:
+            newest = t
+        if _ok(e):
+            u = e.get("UserPrincipalName")
+            c = _country(e)
+            if u and c:
+                rows.append([t, u, c, e.get("IPAddress"), e.get("AppDisplayName")])
+    return {
+        "newest": newest,
+        "rows_min": min((r[0] for r in rows), default=None),
+        "rows_max": max((r[0] for r in rows), default=None),
+        "rows": rows,
+    }
+
+def _det03_windows(newest: Optional[str], baseline_days: int, recent_hours: int) -> Tuple[str, str]:
+    # (baseline_start, recent_start) as TimeGenerated strings, so they compare with event times
+    now = _parse_time(newest) if newest else datetime.now(timezone.utc)
     recent_start = now - timedelta(hours=recent_hours)
     baseline_start = recent_start - timedelta(days=baseline_days)
+    return baseline_start.strftime("%Y-%m-%dT%H:%M:%SZ"), recent_start.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _det03_alerts(
+    newest: Optional[str],
+    row_parts: Iterable[List[List[Any]]],
+    baseline_days: int = 14,
+    recent_hours: int = 24,
+    min_hits: int = 2,
+    ip_intel: Optional[IpIntel] = None,
+) -> List[Dict[str, Any]]:
+    baseline_start, recent_start = _det03_windows(newest, baseline_days, recent_hours)
 
-    # baseline countries per user
+    # baseline countries per user; recent countries per user: hit count/time range + distinct IPs/apps
     baseline: Dict[str, set] = {}
-    for e in signins:
-        t = _parse_time(e["TimeGenerated"])
-        if baseline_start <= t < recent_start and int((e.get("Status") or {}).get("errorCode", 0)) == 0:
-            u = e.get("UserPrincipalName")
-            c = ((e.get("Location") or {}).get("countryOrRegion")) or None
-            if u and c:
+    recent: Dict[tuple, list] = {}
+    for rows in row_parts:
+        for t, u, c, ip, app in rows:
+            if t >= recent_start:
+                slot = recent.get((u, c))
+                if slot is None:
+                    slot = recent[(u, c)] = [0, t, t, set(), set()]
+                else:
+                    slot[1], slot[2] = min(slot[1], t), max(slot[2], t)
+                slot[0] += 1
+                if ip:
+                    slot[3].add(ip)
+                if app:
+                    slot[4].add(app)
+            elif t >= baseline_start:
                 baseline.setdefault(u, set()).add(c)
 
-    # recent countries per user
-    recent_counts: Dict[tuple, List[Dict[str, Any]]] = {}
-    for e in signins:
-        t = _parse_time(e["TimeGenerated"])
-        if t >= recent_start and int((e.get("Status") or {}).get("errorCode", 0)) == 0:
-            u = e.get("UserPrincipalName")
-            c = ((e.get("Location") or {}).get("countryOrRegion")) or None
-            if u and c:
-                recent_counts.setdefault((u, c), []).append(e)
-
     alerts = []
-    for (u, c), events in recent_counts.items():
+    for (u, c), (count, first, last, ip_set, app_set) in recent.items():
         known = baseline.get(u, set())
-        if c not in known and len(events) >= min_hits:
-            events.sort(key=lambda x: x["TimeGenerated"])
-            first, last = _time_range(events)
-            ips = sorted({e.get("IPAddress") for e in events if e.get("IPAddress")})
-            apps = sorted({e.get("AppDisplayName") for e in events if e.get("AppDisplayName")})
+        if c not in known and count >= min_hits:
+            ips = sorted(ip_set)
+            apps = sorted(app_set)
+            evidence = {
+                "baseline_countries": sorted(list(known)),
+                "new_country": c,
+                "recent_hits": count,
+                "sample": {"ips": ips, "apps": apps}
+            }
+            if ip_intel is not None:
+                evidence["ip_intel"] = {ip: ip_intel.lookup(ip) for ip in ips}
             alerts.append({
                 "detection_id": "DET-03",
                 "title": "New country sign-in for user (baseline vs recent)",
@@ -141,135 +279,355 @@ def det03_new_country(signins: List[Dict[str, Any]], baseline_days: int = 14, re
                 "entities": {"accounts": [u], "ips": ips, "country": c},
                 "time_first": first,
                 "time_last": last,
-                "evidence": {
-                    "baseline_countries": sorted(list(known)),
-                    "new_country": c,
-                    "recent_hits": len(events),
-                    "sample": {"ips": ips, "apps": apps}
-                }
+                "evidence": evidence
             })
     return alerts
 
-# ---------------- DET-04..07 (AuditLogs) helpers ----------------
-def _audit_hits(audit: List[Dict[str, Any]], op_keywords: List[str]) -> List[Dict[str, Any]]:
-    hits = []
+def det03_new_country(signins: List[Dict[str, Any]], baseline_days: int = 14, recent_hours: int = 24, min_hits: int = 2, ip_intel: Optional[IpIntel] = None) -> List[Dict[str, Any]]:
+    part = _det03_scan(signins)
+    return _det03_alerts(part["newest"], [part["rows"]], baseline_days, recent_hours, min_hits, ip_intel)
+
+# ---------------- DET-04..07 (AuditLogs) ----------------
+AUDIT_KEYWORDS: Dict[str, List[str]] = {
+    "DET-04": ["role"],
+    "DET-05": ["credentials", "secret", "certificate", "key"],
+    "DET-06": ["consent", "OAuth2", "permission grant"],
+    "DET-07": ["security info", "authentication method", "MFA", "authenticator", "fido", "passwordless"],
+}
+
+def _audit_scan(audit: Iterable[Dict[str, Any]], det_ids: Iterable[str] = tuple(AUDIT_KEYWORDS)) -> Dict[str, RunningStats]:
+    # detection_id -> hits of successful audit events whose operation matches
+    # its keywords, for just the rules in det_ids, in one pass
+    keywords = {det_id: [k.lower() for k in AUDIT_KEYWORDS[det_id]] for det_id in det_ids}
+    hits: Dict[str, RunningStats] = {det_id: RunningStats() for det_id in keywords}
     for e in audit:
-        op = (e.get("OperationName") or "")
-        res = (e.get("Result") or "")
-        if res.lower() != "success":
+        if (e.get("Result") or "").lower() != "success":
             continue
-        if any(k.lower() in op.lower() for k in op_keywords):
-            hits.append(e)
-    hits.sort(key=lambda x: x["TimeGenerated"], reverse=True)
+        op = (e.get("OperationName") or "").lower()
+        for det_id, kws in keywords.items():
+            if any(k in op for k in kws):
+                hits[det_id].add(e)
     return hits
 
-def det04_priv_role(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    hits = _audit_hits(audit, ["role"])
-    hits = [h for h in hits if (h.get("OperationName") or "").lower().find("role") >= 0]
+def _initiator(e: Dict[str, Any]) -> Optional[str]:
+    return (((e.get("InitiatedBy") or {}).get("user") or {}).get("userPrincipalName")) or None
+
+def _det04_alerts(hits: RunningStats) -> List[Dict[str, Any]]:
     if not hits:
         return []
-    top = hits[0]
-    accounts = []
-    initiator = (((top.get("InitiatedBy") or {}).get("user") or {}).get("userPrincipalName")) or None
-    if initiator:
-        accounts.append(initiator)
+    top = hits.max_item
+    initiator = _initiator(top)
     return [{
         "detection_id": "DET-04",
         "title": "Privileged role assignment / role membership change",
         "severity": "High",
-        "entities": {"accounts": accounts, "ips": []},
-        "time_first": hits[-1]["TimeGenerated"],
-        "time_last": hits[0]["TimeGenerated"],
+        "entities": {"accounts": [initiator] if initiator else [], "ips": []},
+        "time_first": hits.min,
+        "time_last": hits.max,
         "evidence": {"sample_event": {"time": top["TimeGenerated"], "op": top.get("OperationName"), "correlationId": top.get("CorrelationId")}}
     }]
 
-def det05_app_creds(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    hits = _audit_hits(audit, ["credentials", "secret", "certificate", "key"])
+def _det05_alerts(hits: RunningStats) -> List[Dict[str, Any]]:
     if not hits:
         return []
-    top = hits[0]
+    top = hits.max_item
     return [{
         "detection_id": "DET-05",
         "title": "Application/Service Principal credentials added/updated",
         "severity": "High",
-        "entities": {"accounts": [(((top.get("InitiatedBy") or {}).get("user") or {}).get("userPrincipalName")) or "N/A"], "ips": []},
-        "time_first": hits[-1]["TimeGenerated"],
-        "time_last": hits[0]["TimeGenerated"],
+        "entities": {"accounts": [_initiator(top) or "N/A"], "ips": []},
+        "time_first": hits.min,
+        "time_last": hits.max,
         "evidence": {"sample_event": {"time": top["TimeGenerated"], "op": top.get("OperationName"), "target": (top.get("TargetResources") or [{}])[0].get("displayName")}}
     }]
 
-def det06_consent(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    hits = _audit_hits(audit, ["consent", "OAuth2", "permission grant"])
+def _det06_alerts(hits: RunningStats) -> List[Dict[str, Any]]:
     if not hits:
         return []
-    top = hits[0]
+    top = hits.max_item
     return [{
         "detection_id": "DET-06",
         "title": "OAuth consent granted to application",
         "severity": "Medium",
-        "entities": {"accounts": [(((top.get("InitiatedBy") or {}).get("user") or {}).get("userPrincipalName")) or "N/A"], "ips": []},
-        "time_first": hits[-1]["TimeGenerated"],
-        "time_last": hits[0]["TimeGenerated"],
+        "entities": {"accounts": [_initiator(top) or "N/A"], "ips": []},
+        "time_first": hits.min,
+        "time_last": hits.max,
         "evidence": {"sample_event": {"time": top["TimeGenerated"], "op": top.get("OperationName"), "app": (top.get("TargetResources") or [{}])[0].get("displayName")}}
     }]
 
-def det07_mfa_change(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    hits = _audit_hits(audit, ["security info", "authentication method", "MFA", "authenticator", "fido", "passwordless"])
+def _det07_alerts(hits: RunningStats) -> List[Dict[str, Any]]:
     if not hits:
         return []
-    top = hits[0]
+    top = hits.max_item
     return [{
         "detection_id": "DET-07",
         "title": "MFA/security info changed",
         "severity": "High",
-        "entities": {"accounts": [(((top.get("InitiatedBy") or {}).get("user") or {}).get("userPrincipalName")) or "N/A"], "ips": []},
-        "time_first": hits[-1]["TimeGenerated"],
-        "time_last": hits[0]["TimeGenerated"],
+        "entities": {"accounts": [_initiator(top) or "N/A"], "ips": []},
+        "time_first": hits.min,
+        "time_last": hits.max,
         "evidence": {"sample_event": {"time": top["TimeGenerated"], "op": top.get("OperationName"), "target": (top.get("TargetResources") or [{}])[0].get("displayName")}}
     }]
 
-def write_outputs(alerts: List[Dict[str, Any]]) -> None:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-    INCIDENTS_DIR.mkdir(parents=True, exist_ok=True)
+AUDIT_ALERTS: Dict[str, Callable[[RunningStats], List[Dict[str, Any]]]] = {
+    "DET-04": _det04_alerts,
+    "DET-05": _det05_alerts,
+    "DET-06": _det06_alerts,
+    "DET-07": _det07_alerts,
+}
+
+def det04_priv_role(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _det04_alerts(_audit_scan(audit, ["DET-04"])["DET-04"])
 
-    ALERTS_PATH.write_text(json.dumps(alerts, indent=2), encoding="utf-8")
+def det05_app_creds(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _det05_alerts(_audit_scan(audit, ["DET-05"])["DET-05"])
 
-    # Generate incident_context files that your enrichment tool already accepts
-    for i, a in enumerate(alerts, start=1):
-        ctx = {
-            "incident_id": f"INC-{i:04d}",
-            "title": a.get("title", "Sentinel incident"),
-            "severity": a.get("severity", "Medium"),
-            "time_start": a.get("time_first"),
-            "time_end": a.get("time_last"),
-            "detections": [a.get("detection_id")],
-            "entities": {
-                "accounts": (a.get("entities") or {}).get("accounts", []),
-                "ips": (a.get("entities") or {}).get("ips", []),
-            }
+def det06_consent(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _det06_alerts(_audit_scan(audit, ["DET-06"])["DET-06"])
+
+def det07_mfa_change(audit: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _det07_alerts(_audit_scan(audit, ["DET-07"])["DET-07"])
+
+# detection_id -> fn(signins, audit, ip_intel, **params); run in this order.
+# Keyword params are the tunables of the underlying rule (e.g. fail_threshold).
+DETECTIONS: Dict[str, Callable[..., List[Dict[str, Any]]]] = {
+    "DET-01": lambda s, a, i, **kw: det01_failures_then_success(s, ip_intel=i, **kw),
+    "DET-02": lambda s, a, i, **kw: det02_legacy_auth(s, **kw),
+    "DET-03": lambda s, a, i, **kw: det03_new_country(s, ip_intel=i, **kw),
+    "DET-04": lambda s, a, i, **kw: det04_priv_role(a, **kw),
+    "DET-05": lambda s, a, i, **kw: det05_app_creds(a, **kw),
+    "DET-06": lambda s, a, i, **kw: det06_consent(a, **kw),
+    "DET-07": lambda s, a, i, **kw: det07_mfa_change(a, **kw),
+}
+SIGNIN_DETECTIONS = ("DET-01", "DET-02", "DET-03")
+AUDIT_DETECTIONS = ("DET-04", "DET-05", "DET-06", "DET-07")
+# detection_id -> entity keys an incident is keyed on (see IncidentRegistry):
+# DET-01 groups by source IP, DET-03 by user + new country, the rest by the
+# initiating account.
+INCIDENT_GROUP_BY: Dict[str, Tuple[str, ...]] = {
+    "DET-01": ("ips",),
+    "DET-02": ("accounts",),
+    "DET-03": ("accounts", "country"),
+    "DET-04": ("accounts",),
+    "DET-05": ("accounts",),
+    "DET-06": ("accounts",),
+    "DET-07": ("accounts",),
+}
+
+def run_all_detections(
+    signins: List[Dict[str, Any]],
+    audit: List[Dict[str, Any]],
+    ip_intel: Optional[IpIntel] = None,
+    params: Optional[Dict[str, Dict[str, Any]]] = None,
+    only: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    # params: detection_id -> keyword overrides; only: subset of DETECTIONS to run
+    params = params or {}
+    wanted = [d for d in DETECTIONS if only is None or d in only]
+    # the audit rules share one pass over the audit log
+    audit_hits = _audit_scan(audit, [d for d in wanted if d in AUDIT_ALERTS])
+    alerts: List[Dict[str, Any]] = []
+    for det_id in wanted:
+        if det_id in audit_hits:
+            alerts += AUDIT_ALERTS[det_id](audit_hits[det_id], **params.get(det_id, {}))
+        else:
+            alerts += DETECTIONS[det_id](signins, audit, ip_intel, **params.get(det_id, {}))
+    return alerts
+
+def incident_context(a: Dict[str, Any], incident_id: str) -> Dict[str, Any]:
+    # Shape accepted by the enrichment tool (enrichment-graph/src/main.py)
+    return {
+        "incident_id": incident_id,
+        "title": a.get("title", "Sentinel incident"),
+        "severity": a.get("severity", "Medium"),
+        "time_start": a.get("time_first"),
+        "time_end": a.get("time_last"),
+        "detections": [a.get("detection_id")],
+        "entities": {
+            "accounts": (a.get("entities") or {}).get("accounts", []),
+            "ips": (a.get("entities") or {}).get("ips", []),
         }
-        (INCIDENTS_DIR / f"INC-{i:04d}.json").write_text(json.dumps(ctx, indent=2), encoding="utf-8")
+    }
+
+def write_outputs(alerts: List[Dict[str, Any]], registry: Optional[IncidentRegistry] = None, out_dir: Path = OUT_DIR) -> int:
+    """
+    Write alerts.json and one incident context per alert under out_dir. With a
+    registry, incident IDs are stable across runs and unchanged context files
+    are left untouched; contexts of incidents no longer emitted are removed.
+    Returns the number of incident context files (re)written.
+    """
+    incidents_dir = out_dir / INCIDENTS_DIR.name
+    incidents_dir.mkdir(parents=True, exist_ok=True)
+
+    write_if_changed(out_dir / ALERTS_PATH.name, json.dumps(alerts, indent=2))
+
+    written = 0
+    emitted = set()
+    for i, a in enumerate(alerts, start=1):
+        incident_id = registry.incident_id(a) if registry is not None else f"INC-{i:04d}"
+        ctx = incident_context(a, incident_id)
+        emitted.add(f"{incident_id}.json")
+        if write_if_changed(incidents_dir / f"{incident_id}.json", json.dumps(ctx, indent=2)):
+            written += 1
+    remove_stale(incidents_dir, emitted)
+    if registry is not None:
+        registry.save()
+    return written
+
+# ---------------- per-day partitions (incremental detect) ----------------
+# A partition is the set of lines whose raw TimeGenerated starts with one UTC
+# day ("" when it can't be read without parsing). Partials are cached per
+# (table, day, digest of the day's lines), so after an append only the new or
+# changed days are parsed and scanned; the rest is a merge of cached partials.
+_DAY_RE = re.compile(rb'"TimeGenerated"\s*:\s*"(\d{4}-\d\d-\d\d)')
+
+def _line_day(line: bytes) -> str:
+    m = _DAY_RE.search(line)
+    return m.group(1).decode("ascii") if m else ""
+
+def day_partitions(path: Path) -> Dict[str, str]:
+    """Day -> digest of that day's lines, in first-seen order (the merge order)."""
+    if not path.exists():
+        raise FileNotFoundError(f"Missing file: {path}\nRun generate_sample_logs.py first.")
+    hashes: Dict[str, Any] = {}
+    with path.open("rb") as f:
+        for raw in f:
+            line = raw.strip()
+            if line:
+                day = _line_day(line)
+                h = hashes.get(day)
+                if h is None:
+                    h = hashes[day] = hashlib.blake2b(digest_size=16)
+                h.update(line + b"\n")
+    return {day: h.hexdigest() for day, h in hashes.items()}
+
+def _scan_days(path: Path, table: str, days: Set[str]) -> Dict[str, Tuple[Dict[str, Any], Optional[List[List[Any]]]]]:
+    # parse + validate only the lines of `days`; day -> (partial, DET-03 rows or None)
+    check = row_checker(path)
+    rows: Dict[str, List[Dict[str, Any]]] = {d: [] for d in days}
+    skipped = 0
+    with path.open("rb") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                continue
+            day = _line_day(line)
+            if day not in rows:
+                continue
+            try:
+                row = check(json.loads(line.decode("utf-8", errors="replace")))
+            except ValueError:
+                row = None
+            if row is None:
+                skipped += 1
+                continue
+            rows[day].append(row)
+    if skipped:
+        print(f"WARNING: skipped {skipped} malformed line(s) in {path}; run tools/local-kql/ingest.py to quarantine them", file=sys.stderr)
+    out: Dict[str, Tuple[Dict[str, Any], Optional[List[List[Any]]]]] = {}
+    for day, day_rows in rows.items():
+        if table == "SigninLogs":
+            det03 = _det03_scan(day_rows)
+            det03_rows = det03.pop("rows")
+            det01 = {ip: st.to_json() for ip, st in _det01_scan(day_rows).items()}
+            out[day] = ({"det01": det01, "det02": _det02_scan(day_rows).to_json(), "det03": det03}, det03_rows)
+        else:
+            out[day] = ({"audit": {d: h.to_json() for d, h in _audit_scan(day_rows).items()}}, None)
+    return out
+
+def detect_partitioned(
+    cache: ArtifactCache,
+    ip_intel: Optional[IpIntel] = None,
+    params: Optional[Dict[str, Dict[str, Any]]] = None,
+    signin_path: Path = DATA_SIGNIN,
+    audit_path: Path = DATA_AUDIT,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Same alerts as run_all_detections over the whole files, from per-day
+    partials. Returns (alerts, {"partitions": n, "scanned": partitions parsed this run}).
+    """
+    params = params or {}
+    code = code_version([Path(__file__)]) + package_code_version()
+    stats = {"partitions": 0, "scanned": 0}
+
+    def keys(kind: str, table: str, days: Dict[str, str]) -> Dict[str, str]:
+        return {d: cache.key(kind, table=table, day=d, content=digest, code=code) for d, digest in days.items()}
+
+    def load(path: Path, table: str) -> Tuple[Dict[str, str], Dict[str, Dict[str, Any]], Dict[str, List[List[Any]]]]:
+        days = day_partitions(path)
+        part_keys = keys("detect-partition", table, days)
+        parts = {d: cache.get(k) for d, k in part_keys.items()}
+        fresh_rows: Dict[str, List[List[Any]]] = {}
+        missing = {d for d, v in parts.items() if v is None}
+        if missing:
+            rows_keys = keys("detect-det03-rows", table, days)
+            for d, (part, det03_rows) in _scan_days(path, table, missing).items():
+                cache.put(part_keys[d], part)
+                parts[d] = part
+                if det03_rows is not None:
+                    cache.put(rows_keys[d], det03_rows)
+                    fresh_rows[d] = det03_rows
+        stats["partitions"] += len(days)
+        stats["scanned"] += len(missing)
+        return days, parts, fresh_rows
+
+    signin_days, signin_parts, fresh_rows = load(signin_path, "SigninLogs")
+    audit_days, audit_parts, _ = load(audit_path, "AuditLogs")
+
+    by_ip: Dict[str, _IpState] = {}
+    legacy: RunningStats = RunningStats()
+    for part in signin_parts.values():
+        _det01_merge(by_ip, part["det01"])
+        legacy.merge(RunningStats.from_json(part["det02"]))
+    audit_hits: Dict[str, RunningStats] = {det_id: RunningStats() for det_id in AUDIT_KEYWORDS}
+    for part in audit_parts.values():
+        for det_id, h in part["audit"].items():
+            audit_hits[det_id].merge(RunningStats.from_json(h))
+
+    # DET-03 only needs the rows of days that can reach its baseline window
+    det03_params = {"baseline_days": 14, "recent_hours": 24, "min_hits": 2, **params.get("DET-03", {})}
+    newest = max((p["det03"]["newest"] for p in signin_parts.values() if p["det03"]["newest"]), default=None)
+    baseline_start, _ = _det03_windows(newest, det03_params["baseline_days"], det03_params["recent_hours"])
+    needed = [d for d, p in signin_parts.items() if p["det03"]["rows_max"] and p["det03"]["rows_max"] >= baseline_start]
+    rows_keys = keys("detect-det03-rows", "SigninLogs", signin_days)
+    rows = {d: fresh_rows[d] if d in fresh_rows else cache.get(rows_keys[d]) for d in needed}
+    evicted = {d for d, r in rows.items() if r is None}
+    if evicted:
+        for d, (_, det03_rows) in _scan_days(signin_path, "SigninLogs", evicted).items():
+            cache.put(rows_keys[d], det03_rows)
+            rows[d] = det03_rows
+        stats["scanned"] += len(evicted)
+
+    alerts: List[Dict[str, Any]] = []
+    alerts += _det01_alerts(by_ip, ip_intel=ip_intel, **params.get("DET-01", {}))
+    alerts += _det02_alerts(legacy, **params.get("DET-02", {}))
+    alerts += _det03_alerts(newest, (rows[d] for d in needed), ip_intel=ip_intel, **det03_params)
+    for det_id, finalize in AUDIT_ALERTS.items():
+        alerts += finalize(audit_hits[det_id], **params.get(det_id, {}))
+    return alerts, stats
 
 def main() -> None:
+    ap = argparse.ArgumentParser(description="Run DET-01..DET-07 over the sample logs and emit alerts + incident contexts.")
+    ap.add_argument("--no-cache", action="store_true", help="Re-run detections even if the inputs are unchanged")
+    args = ap.parse_args()
+
     print("Repo root:", REPO_ROOT)
-    signins = load_jsonl(DATA_SIGNIN)
-    audit = load_jsonl(DATA_AUDIT)
+    if not DATA_SIGNIN.exists() or not DATA_AUDIT.exists():
+        raise FileNotFoundError(f"Missing {DATA_SIGNIN} or {DATA_AUDIT}\nRun generate_sample_logs.py first.")
+    ip_intel = load_default_ip_intel()               # None when data/ip-intel/ has no CSVs
 
-    alerts: List[Dict[str, Any]] = []
-    alerts += det01_failures_then_success(signins)   # DET-01
-    alerts += det02_legacy_auth(signins)             # DET-02
-    alerts += det03_new_country(signins)             # DET-03
-    alerts += det04_priv_role(audit)                 # DET-04
-    alerts += det05_app_creds(audit)                 # DET-05
-    alerts += det06_consent(audit)                   # DET-06
-    alerts += det07_mfa_change(audit)                # DET-07
-
-    print("\n=== Alerts ===")
+    if args.no_cache:
+        alerts, note = run_all_detections(load_jsonl(DATA_SIGNIN), load_jsonl(DATA_AUDIT), ip_intel), ""
+    else:
+        alerts, stats = detect_partitioned(ArtifactCache(), ip_intel)
+        note = f" ({stats['scanned']} of {stats['partitions']} day partitions scanned, the rest from artifact cache)"
+
+    print("\n=== Alerts ===" + note)
     print(json.dumps(alerts, indent=2))
 
-    write_outputs(alerts)
+    written = write_outputs(alerts, IncidentRegistry(INCIDENT_IDS_PATH, INCIDENT_GROUP_BY))
     print(f"\nWrote: {ALERTS_PATH}")
-    print(f"Wrote incident contexts: {INCIDENTS_DIR}")
+    print(f"Wrote incident contexts: {INCIDENTS_DIR} ({written} new/changed, {len(alerts) - written} unchanged)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,339 @@
+# tools/local-kql/run_pipeline.py
+"""
+In-process streaming pipeline: detect -> bundle -> summarize -> dispatch.
+
+Instead of four scripts talking through files, each stage is a pool of
+workers (threads, or a process pool with --processes) reading from a bounded
+queue. A full downstream queue blocks the upstream workers (backpressure), so
+memory stays bounded however many incidents are produced. Detections run one
+rule at a time and their alerts flow downstream immediately, so the first
+triage summary is written while later rules are still scanning.
+
+Final outputs per incident (data/demo-output/pipeline/ by default):
+    summaries/INC-xxxx.md, dispatch/INC-xxxx.json
+With --persist-intermediate also:
+    alerts.json, incident_contexts/INC-xxxx.json, bundles/INC-xxxx.json
+Plus pipeline-report.json with per-stage throughput.
+
+    python tools/local-kql/run_pipeline.py --workers detect=1,bundle=4 --processes bundle
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import run_detections as rd
+
+sys.path.insert(0, str(rd.REPO_ROOT / "ai-triage-summarizer" / "src"))
+
+from investigation_bundle.artifact_cache import ArtifactCache, IncidentRegistry, remove_stale, write_if_changed
+from investigation_bundle.bundle_builder import (
+    build_investigation_bundle_cached,
+    build_investigation_bundle_offline,
+    dump_bundle,
+    incident_context_from_json,
+)
+from investigation_bundle.offline_provider import OfflineProvider
+from make_github_dispatch_payload import build_dispatch_payload
+from summarize import score_bundle, summarize
+
+DEFAULT_OUT_DIR = rd.OUT_DIR / "pipeline"
+STAGES = ("detect", "bundle", "summarize", "dispatch")
+DEFAULT_WORKERS = {"detect": 1, "bundle": 2, "summarize": 1, "dispatch": 1}
+
+_DONE = object()
+
+# ---------------- stage functions ----------------
+# Top-level so they can run in a process pool. Heavy state (loaded logs,
+# provider, artifact cache) is created by the stage's init once per process, before any of
+# the stage's workers run: in each pool worker via the pool initializer, or
+# in the main thread for thread stages.
+_detect_data: Optional[tuple] = None
+_provider: Optional[OfflineProvider] = None
+_cache: Optional[ArtifactCache] = None
+
+def init_detect() -> None:
+    global _detect_data
+    if _detect_data is None:
+        _detect_data = (rd.load_jsonl(rd.DATA_SIGNIN), rd.load_jsonl(rd.DATA_AUDIT), rd.load_default_ip_intel())
+
+def init_bundle() -> None:
+    global _provider, _cache
+    if _provider is None:
+        _provider = OfflineProvider()
+    if _cache is None:
+        # one per worker, so the store's size is measured once, not per job
+        _cache = ArtifactCache()
+
+def detect_stage(detection_id: str) -> List[Dict[str, Any]]:
+    signins, audit, ip_intel = _detect_data
+    return rd.DETECTIONS[detection_id](signins, audit, ip_intel)
+
+def bundle_stage(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    ctx = incident_context_from_json(job["context"])
+    if job["cache"]:
+        bundle, _ = build_investigation_bundle_cached(ctx, _cache, slim=job["slim"], provider=_provider)
+    else:
+        bundle = build_investigation_bundle_offline(ctx, slim=job["slim"], provider=_provider)
+    return [{**job, "bundle": bundle}]
+
+def summarize_stage(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{**job, "score": score_bundle(job["bundle"]), "summary": summarize(job["bundle"])}]
+
+def dispatch_stage(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{**job, "dispatch_payload": build_dispatch_payload(job["bundle"])}]
+
+# ---------------- orchestration ----------------
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    mode: str
+    items_in: int = 0
+    items_out: int = 0
+    errors: int = 0
+    busy_s: float = 0.0
+    max_queue: int = 0
+    started_s: Optional[float] = None
+    finished_s: Optional[float] = None
+
+    def report(self) -> Dict[str, Any]:
+        out = asdict(self)
+        wall = (self.finished_s or 0.0) - (self.started_s or 0.0)
+        out["wall_s"] = round(wall, 4)
+        out["busy_s"] = round(self.busy_s, 4)
+        out["items_per_s"] = round(self.items_out / wall, 2) if wall > 0 else None
+        out["utilization"] = round(self.busy_s / (wall * self.workers), 3) if wall > 0 else None
+        return out
+
+class Stage:
+    """
+    Worker pool over a bounded inbox. fn(item) returns an iterable of output
+    items; post (run in this process) may transform each one before it is
+    handed to the next stage or to the sink. init() sets up the state fn
+    needs, once per process that runs fn.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Iterable[Any]],
+        workers: int = 1,
+        processes: bool = False,
+        queue_size: int = 8,
+        post: Optional[Callable[[Any], Any]] = None,
+        init: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.processes = processes
+        self.post = post
+        self.init = init
+        self.inbox: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.downstream: Optional["Stage"] = None
+        self.sink: Optional[Callable[[Any], None]] = None
+        self.stats = StageStats(name, self.workers, "process" if processes else "thread")
+        self._lock = threading.Lock()
+        self._alive = 0
+        self._threads: List[threading.Thread] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._t0 = 0.0
+
+    def prepare(self) -> None:
+        if self.processes:
+            # spawn, not fork: a forked worker would inherit whatever locks
+            # the threads of this process happen to hold at that moment
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=self.init
+            )
+        elif self.init is not None:
+            self.init()
+
+    def start(self, t0: float) -> None:
+        self._t0 = t0
+        self._alive = self.workers
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def _emit(self, item: Any) -> None:
+        with self._lock:
+            self.stats.items_out += 1
+        if self.downstream is not None:
+            q = self.downstream.inbox
+            q.put(item)  # blocks while the next stage is saturated
+            with self.downstream._lock:
+                self.downstream.stats.max_queue = max(self.downstream.stats.max_queue, q.qsize())
+        elif self.sink is not None:
+            self.sink(item)
+
+    def _run(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+            t = time.perf_counter()
+            with self._lock:
+                self.stats.items_in += 1
+                if self.stats.started_s is None:
+                    self.stats.started_s = t - self._t0
+            try:
+                if self._pool is not None:
+                    results = self._pool.submit(self.fn, item).result()
+                else:
+                    results = list(self.fn(item))
+            except Exception as e:  # keep the pipeline draining; report the failure
+                with self._lock:
+                    self.stats.errors += 1
+                print(f"[{self._now():8.3f}s] {self.name}: error: {e!r}", file=sys.stderr)
+                results = []
+            with self._lock:
+                self.stats.busy_s += time.perf_counter() - t
+            for r in results:
+                self._emit(self.post(r) if self.post else r)
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+            if last:
+                self.stats.finished_s = self._now()
+        if last and self.downstream is not None:
+            for _ in range(self.downstream.workers):
+                self.downstream.inbox.put(_DONE)
+
+    def join(self) -> None:
+        for t in self._threads:
+            t.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], sink: Callable[[Any], None]) -> None:
+        self.stages = stages
+        for up, down in zip(stages, stages[1:]):
+            up.downstream = down
+        stages[-1].sink = sink
+
+    def run(self, source: Iterable[Any]) -> float:
+        for s in self.stages:
+            s.prepare()
+        t0 = time.perf_counter()
+        for s in self.stages:
+            s.start(t0)
+        head = self.stages[0]
+        for item in source:
+            head.inbox.put(item)
+        for _ in range(head.workers):
+            head.inbox.put(_DONE)
+        for s in self.stages:
+            s.join()
+        return time.perf_counter() - t0
+
+def _parse_workers(spec: str) -> Dict[str, int]:
+    workers = dict(DEFAULT_WORKERS)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, n = part.partition("=")
+        if name not in STAGES:
+            raise SystemExit(f"Unknown stage in --workers: {name} (expected one of {', '.join(STAGES)})")
+        workers[name] = int(n)
+    return workers
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Run detect -> bundle -> summarize -> dispatch as one streaming pipeline.")
+    ap.add_argument("--workers", default="", help="Per-stage workers, e.g. detect=1,bundle=4,summarize=2,dispatch=1")
+    ap.add_argument("--processes", default="", help="Comma list of stages to run in a process pool instead of threads")
+    ap.add_argument("--queue-size", type=int, default=8, help="Bounded queue size between stages")
+    ap.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="Where summaries / dispatch payloads go")
+    ap.add_argument("--persist-intermediate", action="store_true", help="Also write alerts, incident contexts and bundles")
+    ap.add_argument("--slim", action="store_true", help="Build schema 2.0 (slim) bundles")
+    ap.add_argument("--no-cache", action="store_true", help="Do not use the artifact cache for bundles")
+    args = ap.parse_args()
+
+    workers = _parse_workers(args.workers)
+    in_procs = {p.strip() for p in args.processes.split(",") if p.strip()}
+    unknown = in_procs - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stage in --processes: {', '.join(sorted(unknown))}")
+
+    out_dir = Path(args.out_dir)
+    for sub in ("summaries", "dispatch") + (("incident_contexts", "bundles") if args.persist_intermediate else ()):
+        (out_dir / sub).mkdir(parents=True, exist_ok=True)
+
+    registry = IncidentRegistry(rd.INCIDENT_IDS_PATH, rd.INCIDENT_GROUP_BY)
+    registry_lock = threading.Lock()
+    alerts: List[Dict[str, Any]] = []
+    t0 = time.perf_counter()
+    first_summary: List[float] = []
+
+    def to_job(alert: Dict[str, Any]) -> Dict[str, Any]:
+        # runs in the detect stage threads of this process: the registry is not shared with workers
+        with registry_lock:
+            alerts.append(alert)
+            incident_id = registry.incident_id(alert)
+        ctx = rd.incident_context(alert, incident_id)
+        if args.persist_intermediate:
+            write_if_changed(out_dir / "incident_contexts" / f"{incident_id}.json", json.dumps(ctx, indent=2))
+        return {"incident_id": incident_id, "context": ctx, "slim": args.slim, "cache": not args.no_cache}
+
+    def sink(job: Dict[str, Any]) -> None:
+        inc = job["incident_id"]
+        write_if_changed(out_dir / "summaries" / f"{inc}.md", job["summary"])
+        write_if_changed(out_dir / "dispatch" / f"{inc}.json", json.dumps(job["dispatch_payload"], indent=2))
+        if args.persist_intermediate:
+            (out_dir / "bundles" / f"{inc}.json").write_text(dump_bundle(job["bundle"]), encoding="utf-8")
+        t = time.perf_counter() - t0
+        if not first_summary:
+            first_summary.append(t)
+        score = job["score"]
+        print(f"[{t:8.3f}s] {inc} {job['context']['detections'][0]}: {score['confidence_score']}/100 ({score['confidence_label']})")
+
+    def stage(name: str, fn, post=None, init=None) -> Stage:
+        return Stage(name, fn, workers[name], name in in_procs, args.queue_size, post, init)
+
+    stages = [
+        stage("detect", detect_stage, post=to_job, init=init_detect),
+        stage("bundle", bundle_stage, init=init_bundle),
+        stage("summarize", summarize_stage),
+        stage("dispatch", dispatch_stage),
+    ]
+    elapsed = Pipeline(stages, sink).run(list(rd.DETECTIONS))
+
+    registry.save()
+    if args.persist_intermediate:
+        write_if_changed(out_dir / "alerts.json", json.dumps(alerts, indent=2))
+    # drop outputs of incidents this run no longer emitted
+    emitted = {registry.incident_id(a) for a in alerts}
+    for sub, ext in (("summaries", ".md"), ("dispatch", ".json"), ("incident_contexts", ".json"), ("bundles", ".json")):
+        if (out_dir / sub).exists():
+            remove_stale(out_dir / sub, {i + ext for i in emitted}, "INC-*" + ext)
+
+    report = {
+        "elapsed_s": round(elapsed, 4),
+        "incidents": stages[-1].stats.items_out,
+        "first_summary_s": round(first_summary[0], 4) if first_summary else None,
+        "detect_finished_s": stages[0].stats.finished_s,
+        "stages": [s.stats.report() for s in stages],
+    }
+    (out_dir / "pipeline-report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"\n{'stage':<10} {'mode':<8} {'wrk':>3} {'in':>5} {'out':>5} {'err':>3} {'wall_s':>8} {'items/s':>9} {'util':>5} {'maxq':>4}")
+    for s in report["stages"]:
+        print(f"{s['name']:<10} {s['mode']:<8} {s['workers']:>3} {s['items_in']:>5} {s['items_out']:>5} {s['errors']:>3} "
+              f"{s['wall_s']:>8} {str(s['items_per_s']):>9} {str(s['utilization']):>5} {s['max_queue']:>4}")
+    print(f"Total {report['elapsed_s']}s; first summary at {report['first_summary_s']}s, "
+          f"detection finished at {round(report['detect_finished_s'] or 0, 4)}s")
+    print(f"Wrote: {out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+# tools/local-kql/run_tenants.py
+"""
+Run the detections (and optionally bundle building) for many tenants on one
+shared process pool.
+
+The manifest lists each tenant's input root (SigninLogs.jsonl + AuditLogs.jsonl),
+output root, and optional detection subset / parameter overrides:
+
+    {
+      "defaults": {"max_memory_mb": 1024, "weight": 1, "params": {}},
+      "tenants": [
+        {"tenant_id": "contoso", "input_root": "data/sample-logs",
+         "output_root": "data/demo-output/tenants/contoso",
+         "detections": ["DET-01", "DET-03"],
+         "params": {"DET-01": {"fail_threshold": 5}},
+         "max_memory_mb": 512, "weight": 2}
+      ]
+    }
+
+Relative paths are relative to the repo root. Each tenant is split into
+tasks (sign-in rules, audit rules, then bundles); the scheduler always hands
+a free worker to the tenant with the fewest running tasks and, among those,
+the least weighted worker time, so one large tenant cannot starve the rest.
+Every task runs under its tenant's memory limit (RLIMIT_AS, where the OS
+supports it). A failing tenant is reported and leaves its previous outputs
+untouched; other tenants are unaffected, including when a task kills its
+worker process outright (the pool is rebuilt and only that tenant fails).
+
+    python tools/local-kql/run_tenants.py --manifest data/tenants/manifest.sample.json --workers 8
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import run_detections as rd
+
+from investigation_bundle.artifact_cache import IncidentRegistry
+from investigation_bundle.bundle_builder import build_investigation_bundle_offline, dump_bundle, incident_context_from_json
+from investigation_bundle.ip_intel import IpIntel, load_default_ip_intel
+from investigation_bundle.offline_provider import OfflineProvider
+
+try:
+    import resource
+except ImportError:  # Windows: memory limits are reported as not enforced
+    resource = None
+
+DEFAULT_MANIFEST = rd.REPO_ROOT / "data" / "tenants" / "manifest.sample.json"
+DEFAULT_REPORT = rd.OUT_DIR / "tenants-report.json"
+
+# detection_id -> rule function, used to validate per-tenant parameter overrides
+_RULES = {f"DET-{name[3:5]}": fn for name, fn in vars(rd).items() if name.startswith("det0") and callable(fn)}
+
+@dataclass
+class Tenant:
+    tenant_id: str
+    input_root: Path
+    output_root: Path
+    detections: List[str]
+    params: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    max_memory_mb: Optional[int] = None
+    weight: float = 1.0
+
+    @property
+    def signin_path(self) -> Path:
+        return self.input_root / rd.DATA_SIGNIN.name
+
+    @property
+    def audit_path(self) -> Path:
+        return self.input_root / rd.DATA_AUDIT.name
+
+def _resolve(p: str) -> Path:
+    path = Path(p)
+    return path if path.is_absolute() else rd.REPO_ROOT / path
+
+def load_manifest(path: Path) -> List[Tenant]:
+    raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    defaults = raw.get("defaults") or {}
+    tenants: List[Tenant] = []
+    for t in raw.get("tenants") or []:
+        tid = t["tenant_id"]
+        params = {**(defaults.get("params") or {}), **(t.get("params") or {})}
+        for det_id, overrides in params.items():
+            if det_id not in _RULES:
+                raise ValueError(f"{tid}: unknown detection in params: {det_id}")
+            allowed = set(inspect.signature(_RULES[det_id]).parameters) - {"signins", "audit", "ip_intel"}
+            bad = set(overrides) - allowed
+            if bad:
+                raise ValueError(f"{tid}: {det_id} has no parameter(s) {', '.join(sorted(bad))} (allowed: {', '.join(sorted(allowed)) or 'none'})")
+        detections = t.get("detections") or defaults.get("detections") or list(rd.DETECTIONS)
+        unknown = set(detections) - set(rd.DETECTIONS)
+        if unknown:
+            raise ValueError(f"{tid}: unknown detections: {', '.join(sorted(unknown))}")
+        tenants.append(Tenant(
+            tenant_id=tid,
+            input_root=_resolve(t["input_root"]),
+            output_root=_resolve(t["output_root"]),
+            detections=detections,
+            params=params,
+            max_memory_mb=t.get("max_memory_mb", defaults.get("max_memory_mb")),
+            weight=float(t.get("weight", defaults.get("weight", 1))),
+        ))
+
+    # isolation: no two tenants may share an id or write into the same tree
+    ids = [t.tenant_id for t in tenants]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate tenant_id in manifest")
+    roots = sorted(t.output_root.resolve() for t in tenants)
+    for a, b in zip(roots, roots[1:]):
+        if a == b or a in b.parents:
+            raise ValueError(f"Overlapping output roots: {a} and {b}")
+    return tenants
+
+# ---------------- worker side ----------------
+_ip_intel: Optional[IpIntel] = None
+_ip_intel_loaded = False
+
+def _worker_ip_intel() -> Optional[IpIntel]:
+    global _ip_intel, _ip_intel_loaded
+    if not _ip_intel_loaded:
+        _ip_intel, _ip_intel_loaded = load_default_ip_intel(), True
+    return _ip_intel
+
+def _vm_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def memory_limit(max_mb: Optional[int]) -> Iterator[bool]:
+    """
+    Cap this worker's address space at its current size + max_mb for the
+    duration of one task, then restore it. Yields whether the cap is enforced.
+    """
+    vm = _vm_bytes() if resource is not None and max_mb else None
+    if vm is None:
+        yield False
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    cap = vm + int(max_mb) * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        cap = min(cap, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (cap, hard))
+    try:
+        yield True
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+def _detect(task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = rd.load_jsonl(Path(task["path"]))
+    signins, audit = (rows, []) if task["group"] == "signin" else ([], rows)
+    return rd.run_all_detections(signins, audit, _worker_ip_intel(), task["params"], only=task["detections"])
+
+def _bundles(task: Dict[str, Any]) -> int:
+    provider = OfflineProvider(ip_intel=_worker_ip_intel(), signin_path=Path(task["signin_path"]), audit_path=Path(task["audit_path"]))
+    out_dir = Path(task["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for ctx_raw in task["contexts"]:
+        bundle = build_investigation_bundle_offline(incident_context_from_json(ctx_raw), slim=task["slim"], provider=provider)
+        (out_dir / f"{ctx_raw['incident_id']}.json").write_text(dump_bundle(bundle), encoding="utf-8")
+    return len(task["contexts"])
+
+def run_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    out: Dict[str, Any] = {"tenant_id": task["tenant_id"], "kind": task["kind"], "group": task.get("group")}
+    try:
+        with memory_limit(task["max_memory_mb"]) as enforced:
+            out["memory_limit_enforced"] = enforced
+            if task["kind"] == "detect":
+                out["alerts"] = _detect(task)
+            else:
+                out["bundles"] = _bundles(task)
+    except MemoryError:
+        out["error"] = f"exceeded memory limit of {task['max_memory_mb']} MB"
+    except Exception as e:  # reported per tenant; never takes down the run
+        out["error"] = f"{type(e).__name__}: {e}"
+    out["seconds"] = time.perf_counter() - t0
+    return out
+
+# ---------------- scheduler ----------------
+class FairScheduler:
+    """
+    Per-tenant task queues. next() picks the tenant with the fewest tasks in
+    flight, then the least worker time used per unit of weight, then manifest
+    order, so every tenant makes progress each cycle.
+    """
+
+    def __init__(self, tenants: List[Tenant]) -> None:
+        self.order = {t.tenant_id: i for i, t in enumerate(tenants)}
+        self.weight = {t.tenant_id: max(t.weight, 1e-9) for t in tenants}
+        self.pending: Dict[str, Deque[Dict[str, Any]]] = {t.tenant_id: deque() for t in tenants}
+        self.inflight = {t.tenant_id: 0 for t in tenants}
+        self.used = {t.tenant_id: 0.0 for t in tenants}
+
+    def add(self, task: Dict[str, Any]) -> None:
+        self.pending[task["tenant_id"]].append(task)
+
+    def drop(self, tenant_id: str) -> None:
+        self.pending[tenant_id].clear()
+
+    def next(self) -> Optional[Dict[str, Any]]:
+        ready = [tid for tid, q in self.pending.items() if q]
+        if not ready:
+            return None
+        tid = min(ready, key=lambda t: (self.inflight[t], self.used[t] / self.weight[t], self.order[t]))
+        self.inflight[tid] += 1
+        return self.pending[tid].popleft()
+
+    def done(self, tenant_id: str, seconds: float) -> None:
+        self.inflight[tenant_id] -= 1
+        self.used[tenant_id] += seconds
+
+def _detect_tasks(t: Tenant) -> List[Dict[str, Any]]:
+    tasks = []
+    for group, path, ids in (("signin", t.signin_path, rd.SIGNIN_DETECTIONS), ("audit", t.audit_path, rd.AUDIT_DETECTIONS)):
+        only = [d for d in ids if d in t.detections]
+        if only:
+            tasks.append({
+                "tenant_id": t.tenant_id, "kind": "detect", "group": group, "path": str(path),
+                "detections": only, "params": t.params, "max_memory_mb": t.max_memory_mb,
+            })
+    return tasks
+
+def run_tenants(tenants: List[Tenant], workers: int, bundles: bool = False, slim: bool = False) -> Dict[str, Dict[str, Any]]:
+    load_default_ip_intel()  # compile the shared index once, before workers race to do it
+    sched = FairScheduler(tenants)
+    by_id = {t.tenant_id: t for t in tenants}
+    status: Dict[str, Dict[str, Any]] = {}
+    partial: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    outstanding: Dict[str, int] = {}
+    t0 = time.perf_counter()
+
+    for t in tenants:
+        tasks = _detect_tasks(t)
+        status[t.tenant_id] = {"status": "running", "alerts": 0, "incidents_written": 0, "bundles": 0,
+                               "tasks": 0, "worker_s": 0.0, "memory_limit_enforced": None, "errors": []}
+        partial[t.tenant_id] = {}
+        outstanding[t.tenant_id] = len(tasks)
+        for task in tasks:
+            sched.add(task)
+
+    def finish_detect(tid: str) -> None:
+        t, st = by_id[tid], status[tid]
+        # keep rule order stable regardless of which task finished first
+        alerts = partial[tid].get("signin", []) + partial[tid].get("audit", [])
+        registry = IncidentRegistry(t.output_root / rd.INCIDENT_IDS_PATH.name, rd.INCIDENT_GROUP_BY)
+        st["incidents_written"] = rd.write_outputs(alerts, registry, t.output_root)
+        st["alerts"] = len(alerts)
+        if bundles and alerts:
+            sched.add({
+                "tenant_id": tid, "kind": "bundle", "max_memory_mb": t.max_memory_mb, "slim": slim,
+                "signin_path": str(t.signin_path), "audit_path": str(t.audit_path),
+                "out_dir": str(t.output_root / "bundles"),
+                "contexts": [rd.incident_context(a, registry.incident_id(a)) for a in alerts],
+            })
+            outstanding[tid] += 1
+
+    def record(tid: str, res: Dict[str, Any]) -> None:
+        sched.done(tid, res["seconds"])
+        st = status[tid]
+        st["tasks"] += 1
+        st["worker_s"] += res["seconds"]
+        if st["memory_limit_enforced"] is None:
+            st["memory_limit_enforced"] = res.get("memory_limit_enforced")
+        outstanding[tid] -= 1
+        if "error" in res:
+            st["errors"].append(f"{res['kind']}/{res['group'] or '-'}: {res['error']}")
+            st["status"] = "failed"
+            sched.drop(tid)
+            for task in [s for s in suspects if s["tenant_id"] == tid]:
+                suspects.remove(task)
+                sched.done(tid, 0.0)
+            outstanding[tid] = sum(1 for v in running.values() if v["tenant_id"] == tid)
+        elif res["kind"] == "detect":
+            partial[tid][res["group"]] = res["alerts"]
+            if outstanding[tid] == 0 and st["status"] != "failed":
+                finish_detect(tid)
+        else:
+            st["bundles"] = res["bundles"]
+        if outstanding[tid] == 0 and st["status"] == "running":
+            st["status"] = "ok"
+            st["finished_s"] = round(time.perf_counter() - t0, 4)
+
+    running: Dict[Future, Dict[str, Any]] = {}
+    # Tasks that were in flight when a worker process died (segfault, OOM
+    # kill). The pool cannot say whose task it was, so each one is re-run
+    # alone on a fresh pool: the one that kills its worker again fails its
+    # tenant, the rest carry on.
+    suspects: Deque[Dict[str, Any]] = deque()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            if suspects:
+                if not running:
+                    task = suspects.popleft()
+                    running[pool.submit(run_task, task)] = task
+            else:
+                while len(running) < workers:
+                    task = sched.next()
+                    if task is None:
+                        break
+                    running[pool.submit(run_task, task)] = task
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in done:
+                task = running.pop(fut)
+                try:
+                    res = fut.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if status[task["tenant_id"]]["status"] == "failed":
+                        sched.done(task["tenant_id"], 0.0)
+                        outstanding[task["tenant_id"]] -= 1
+                        continue
+                    if not task.get("suspect"):
+                        suspects.append({**task, "suspect": True})
+                        continue
+                    res = {"tenant_id": task["tenant_id"], "kind": task["kind"], "group": task.get("group"),
+                           "seconds": 0.0, "error": "worker process died"}
+                record(task["tenant_id"], res)
+            if broken:
+                # every other task on the old pool fails the same way; they are
+                # picked up by the next wait() and queued as suspects
+                pool.shutdown(wait=True)
+                pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=True)
+    for st in status.values():
+        st["worker_s"] = round(st["worker_s"], 4)
+    return status
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Run detections for every tenant in a manifest on one shared process pool.")
+    ap.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="Tenant manifest JSON")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Shared worker processes")
+    ap.add_argument("--tenants", default="", help="Comma list of tenant_ids to run (default: all)")
+    ap.add_argument("--bundles", action="store_true", help="Also build an investigation bundle per incident")
+    ap.add_argument("--slim", action="store_true", help="With --bundles: build schema 2.0 (slim) bundles")
+    ap.add_argument("--report", default=str(DEFAULT_REPORT), help="Where to write the per-tenant run report")
+    args = ap.parse_args()
+
+    try:
+        tenants = load_manifest(Path(args.manifest))
+    except (KeyError, ValueError) as e:
+        raise SystemExit(f"Invalid manifest {args.manifest}: {e}")
+    if args.tenants:
+        wanted = {s.strip() for s in args.tenants.split(",") if s.strip()}
+        tenants = [t for t in tenants if t.tenant_id in wanted]
+    if not tenants:
+        raise SystemExit("No tenants to run.")
+
+    t0 = time.perf_counter()
+    status = run_tenants(tenants, max(1, args.workers), bundles=args.bundles, slim=args.slim)
+    elapsed = time.perf_counter() - t0
+
+    print(f"{'tenant':<20} {'status':<7} {'alerts':>6} {'written':>7} {'bundles':>7} {'tasks':>5} {'worker_s':>9} {'memcap':>6}")
+    for tid, st in status.items():
+        print(f"{tid:<20} {st['status']:<7} {st['alerts']:>6} {st['incidents_written']:>7} {st['bundles']:>7} "
+              f"{st['tasks']:>5} {st['worker_s']:>9} {str(st['memory_limit_enforced']):>6}")
+        for err in st["errors"]:
+            print(f"    error: {err}")
+    failed = sum(1 for st in status.values() if st["status"] != "ok")
+    print(f"{len(status)} tenants in {elapsed:.3f}s on {args.workers} workers ({failed} failed)")
+
+    report = Path(args.report)
+    report.parent.mkdir(parents=True, exist_ok=True)
+    report.write_text(json.dumps({"elapsed_s": round(elapsed, 4), "workers": args.workers, "tenants": status}, indent=2), encoding="utf-8")
+    print(f"Wrote: {report}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
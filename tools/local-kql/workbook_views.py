@@ -0,0 +1,481 @@
+# tools/local-kql/workbook_views.py
+"""
+Incrementally maintained views for the Identity Investigations workbook
+overview panels (workbooks/identity-investigations/panels/):
+
+    01-kpis, 02-signins-trend, 03-top-failing-users,
+    04-top-offending-ips, 05-signins-by-country
+
+Every event updates one hour bucket and one day bucket. A bucket holds plain
+counters, a counter per ranking (failing users, failing IPs, countries) and a
+k-minimum-values distinct-count sketch of users per failing IP. Day buckets
+count exactly; hour buckets keep a Misra-Gries summary (exact until it holds
+more than 2*k keys, after which counts are lower bounds off by at most
+`error`). A TimeRange is answered by merging whole-day buckets plus at most 46
+edge-hour buckets, so a refresh reads the same number of buckets whether the
+range holds a thousand events or a billion. Ranges resolve to whole hours.
+Top-N rows are only reported when their count exceeds the summary's error,
+and max_undercount in the output says how far any reported count may be low.
+
+    python tools/local-kql/workbook_views.py update                  # fold new lines of the sample logs into the state
+    python tools/local-kql/workbook_views.py query --last 24h        # panels for the 24h before the newest event
+    python tools/local-kql/workbook_views.py query --from 2026-01-20T00:00:00Z --to 2026-01-23T23:59:59Z
+
+Update reads only bytes appended since the last run; a rewritten log file
+triggers a rebuild from all known sources.
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / "enrichment-graph" / "src"))
+
+from investigation_bundle.log_schema import row_checker
+
+DATA_SIGNIN = REPO_ROOT / "data" / "sample-logs" / "SigninLogs.jsonl"
+DATA_AUDIT = REPO_ROOT / "data" / "sample-logs" / "AuditLogs.jsonl"
+DEFAULT_STATE = REPO_ROOT / ".cache" / "workbook-views" / "state.json"
+DEFAULT_OUT = REPO_ROOT / "data" / "demo-output" / "workbook-panels.json"
+DEFAULT_K = 128
+HEAD_BYTES = 4096
+STATE_VERSION = 2
+
+# ---------------- mergeable summaries ----------------
+class TopCounter:
+    """
+    Misra-Gries heavy hitters. Holds at most 2*k keys; when full it subtracts
+    the (k+1)-th largest count from every key, so each reported count is at
+    most `error` below the true one. Merging two summaries keeps that bound.
+    With k=None it never compacts and counts exactly.
+    """
+
+    def __init__(self, k: Optional[int] = DEFAULT_K) -> None:
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self.error = 0
+
+    def add(self, key: str, n: int = 1) -> None:
+        self.counts[key] = self.counts.get(key, 0) + n
+        if self.k is not None and len(self.counts) > 2 * self.k:
+            self._compact()
+
+    def merge(self, other: "TopCounter") -> None:
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.error += other.error
+        if self.k is not None and len(self.counts) > 2 * self.k:
+            self._compact()
+
+    def _compact(self) -> None:
+        cut = sorted(self.counts.values(), reverse=True)[self.k]
+        self.error += cut
+        self.counts = {key: n - cut for key, n in self.counts.items() if n > cut}
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        # a key dropped by compaction may have had up to `error`: only counts
+        # above that are known to outrank every key no longer tracked
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [kv for kv in ranked if kv[1] > self.error][:n]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"k": self.k, "error": self.error, "counts": self.counts}
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> "TopCounter":
+        t = cls(raw["k"])
+        t.counts, t.error = dict(raw["counts"]), raw["error"]
+        return t
+
+_HASH_SPACE = float(1 << 64)
+
+def _h64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+class DistinctSketch:
+    """k-minimum-values distinct counter: exact below k values, ~1/sqrt(k) relative error above."""
+
+    def __init__(self, k: int = 64) -> None:
+        self.k = k
+        self.hashes: List[int] = []
+
+    def add(self, value: str) -> None:
+        h = _h64(value)
+        hs = self.hashes
+        if len(hs) >= self.k and h >= hs[-1]:
+            return
+        i = bisect.bisect_left(hs, h)
+        if i < len(hs) and hs[i] == h:
+            return
+        hs.insert(i, h)
+        if len(hs) > self.k:
+            hs.pop()
+
+    def merge(self, other: "DistinctSketch") -> None:
+        self.hashes = sorted(set(self.hashes) | set(other.hashes))[: self.k]
+
+    def estimate(self) -> int:
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        return int(round((self.k - 1) * _HASH_SPACE / (self.hashes[-1] + 1)))
+
+    def to_json(self) -> List[int]:
+        return self.hashes
+
+    @classmethod
+    def from_json(cls, raw: List[int], k: int = 64) -> "DistinctSketch":
+        d = cls(k)
+        d.hashes = list(raw)
+        return d
+
+# ---------------- panel predicates (KQL semantics) ----------------
+def _has(*terms: str):
+    # KQL `has`/`has_any`: case-insensitive whole-term match
+    pattern = re.compile("|".join(r"(?<![0-9a-z])" + re.escape(t.lower()) + r"(?![0-9a-z])" for t in terms))
+    return lambda s: bool(s) and pattern.search(s.lower()) is not None
+
+_LEGACY = _has("Legacy Authentication")
+_AUDIT_KPIS = (
+    ("priv_role", _has("role")),
+    ("app_cred", _has("credentials", "password", "secret", "certificate", "key")),
+    ("consent", _has("Consent")),
+    ("mfa", _has("security info", "authentication method", "MFA")),
+)
+KPI_ROWS = (
+    ("Total sign-ins", "signins"),
+    ("Failed sign-ins", "failure"),
+    ("Legacy auth sign-ins", "legacy"),
+    ("Privileged role events", "priv_role"),
+    ("App credential changes", "app_cred"),
+    ("OAuth consent events", "consent"),
+    ("MFA/security info changes", "mfa"),
+)
+
+def _error_code(e: Dict[str, Any]) -> Optional[int]:
+    # toint(Status.errorCode): null when missing or not a number
+    try:
+        return int((e.get("Status") or {}).get("errorCode"))
+    except (TypeError, ValueError):
+        return None
+
+# ---------------- buckets ----------------
+class Bucket:
+    """Counters for one hour or day; k=None (day buckets, query results) keeps them exact."""
+
+    def __init__(self, k: Optional[int] = DEFAULT_K) -> None:
+        self.counts: Counter = Counter()
+        self.failing_users = TopCounter(k)
+        self.failing_ips = TopCounter(k)
+        self.ip_users: Dict[str, DistinctSketch] = {}
+        # most any IP's TargetedUsers may be low by after sketches were pruned
+        self.ip_users_error = 0
+        self.countries = TopCounter(k)
+
+    def add_signin(self, e: Dict[str, Any]) -> None:
+        c = self.counts
+        c["signins"] += 1
+        code = _error_code(e)
+        if code == 0:
+            c["success"] += 1
+        elif code is not None:
+            c["failure"] += 1
+            upn = e.get("UserPrincipalName") or ""
+            ip = e.get("IPAddress") or ""
+            self.failing_users.add(upn)
+            self.failing_ips.add(ip)
+            self.ip_users.setdefault(ip, DistinctSketch()).add(upn)
+        if _LEGACY(e.get("ClientAppUsed")):
+            c["legacy"] += 1
+        loc = e.get("Location")
+        self.countries.add(str(loc.get("countryOrRegion") or "") if isinstance(loc, dict) else "")
+
+    def add_audit(self, e: Dict[str, Any]) -> None:
+        if str(e.get("Result") or "").lower() != "success":
+            return
+        op = e.get("OperationName") or ""
+        for name, match in _AUDIT_KPIS:
+            if match(op):
+                self.counts[name] += 1
+
+    def merge(self, other: "Bucket") -> None:
+        self.counts.update(other.counts)
+        self.failing_users.merge(other.failing_users)
+        self.failing_ips.merge(other.failing_ips)
+        self.countries.merge(other.countries)
+        for ip, sk in other.ip_users.items():
+            self.ip_users.setdefault(ip, DistinctSketch(sk.k)).merge(sk)
+        self.ip_users_error += other.ip_users_error
+        self._prune_ip_users()
+
+    def _prune_ip_users(self) -> None:
+        # sketches only for IPs the (compacted) top counter still tracks; the
+        # largest one dropped bounds how many users any IP loses here
+        if len(self.ip_users) > len(self.failing_ips.counts):
+            dropped = [sk.estimate() for ip, sk in self.ip_users.items() if ip not in self.failing_ips.counts]
+            self.ip_users_error += max(dropped)
+            self.ip_users = {ip: sk for ip, sk in self.ip_users.items() if ip in self.failing_ips.counts}
+
+    def to_json(self) -> Dict[str, Any]:
+        self._prune_ip_users()
+        return {
+            "counts": dict(self.counts),
+            "failing_users": self.failing_users.to_json(),
+            "failing_ips": self.failing_ips.to_json(),
+            "ip_users": {ip: sk.to_json() for ip, sk in self.ip_users.items()},
+            "ip_users_error": self.ip_users_error,
+            "countries": self.countries.to_json(),
+        }
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> "Bucket":
+        b = cls()
+        b.counts = Counter(raw["counts"])
+        b.failing_users = TopCounter.from_json(raw["failing_users"])
+        b.failing_ips = TopCounter.from_json(raw["failing_ips"])
+        b.ip_users = {ip: DistinctSketch.from_json(h) for ip, h in raw["ip_users"].items()}
+        b.ip_users_error = raw["ip_users_error"]
+        b.countries = TopCounter.from_json(raw["countries"])
+        return b
+
+def _hour_key(ts: str) -> str:
+    return ts[:13]  # 2026-01-23T08
+
+def _parse(ts: str) -> datetime:
+    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+class WorkbookViews:
+    """Hour and day buckets for SigninLogs/AuditLogs, plus per-source read offsets."""
+
+    def __init__(self, k: int = DEFAULT_K) -> None:
+        self.k = k  # hour-bucket summary size
+        self.hours: Dict[str, Bucket] = {}
+        self.days: Dict[str, Bucket] = {}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.newest: Optional[str] = None
+
+    def _buckets(self, ts: str) -> Tuple[Bucket, Bucket]:
+        h, d = _hour_key(ts), ts[:10]
+        hb = self.hours.get(h)
+        if hb is None:
+            hb = self.hours[h] = Bucket(self.k)
+        db = self.days.get(d)
+        if db is None:
+            db = self.days[d] = Bucket(None)
+        if self.newest is None or ts > self.newest:
+            self.newest = ts
+        return hb, db
+
+    def add(self, table: str, e: Dict[str, Any]) -> None:
+        hb, db = self._buckets(e["TimeGenerated"])
+        if table == "SigninLogs":
+            hb.add_signin(e)
+            db.add_signin(e)
+        else:
+            hb.add_audit(e)
+            db.add_audit(e)
+
+    # ---- incremental file input ----
+    def update_from_file(self, path: Path) -> int:
+        """Fold lines appended since the last call into the views. Returns events added."""
+        path = Path(path).resolve()
+        table = next((t for t in ("SigninLogs", "AuditLogs") if path.name.startswith(t)), None)
+        if table is None:
+            raise ValueError(f"Can't tell the table of {path}; name it SigninLogs*.jsonl or AuditLogs*.jsonl")
+        src = self.sources.get(str(path), {"offset": 0, "head": "", "head_len": 0})
+        if src["offset"] and (src["offset"] > path.stat().st_size or _head(path, src["head_len"]) != src["head"]):
+            raise _Rewritten(path)
+        check = row_checker(path)
+        added, pos = 0, src["offset"]
+        with path.open("rb") as f:
+            f.seek(pos)
+            for raw in f:
+                line = raw.strip()
+                try:
+                    e = check(json.loads(line)) if line else None
+                except ValueError:
+                    e = None
+                if e is None and line and not raw.endswith(b"\n"):
+                    break  # partial last line; read again next time
+                pos += len(raw)
+                if e is not None:
+                    self.add(table, e)
+                    added += 1
+        head_len = min(HEAD_BYTES, pos)
+        self.sources[str(path)] = {"offset": pos, "head": _head(path, head_len), "head_len": head_len}
+        return added
+
+    # ---- queries ----
+    def _range_buckets(self, start: datetime, end: datetime) -> Iterable[Bucket]:
+        h = start.replace(minute=0, second=0, microsecond=0)
+        last = end.replace(minute=0, second=0, microsecond=0)
+        while h <= last:
+            day_end = h.replace(hour=23)
+            if h.hour == 0 and day_end <= last:
+                b = self.days.get(h.strftime("%Y-%m-%d"))
+                h += timedelta(days=1)
+            else:
+                b = self.hours.get(h.strftime("%Y-%m-%dT%H"))
+                h += timedelta(hours=1)
+            if b is not None:
+                yield b
+
+    def query(self, start: datetime, end: datetime, top_users: int = 25, top_ips: int = 25, top_countries: int = 15) -> Dict[str, Any]:
+        """{"panels": {panel name: rows shaped like the KQL output}, "max_undercount": {...}}"""
+        acc = Bucket(None)
+        for b in self._range_buckets(start, end):
+            acc.merge(b)
+
+        trend = []
+        h = start.replace(minute=0, second=0, microsecond=0)
+        while h <= end:
+            b = self.hours.get(h.strftime("%Y-%m-%dT%H"))
+            if b is not None and (b.counts["success"] or b.counts["failure"]):
+                trend.append({"TimeGenerated": h.strftime("%Y-%m-%dT%H:00:00Z"), "Success": b.counts["success"], "Failure": b.counts["failure"]})
+            h += timedelta(hours=1)
+
+        panels = {
+            "01-kpis": [{"Metric": label, "Value": acc.counts[key]} for label, key in KPI_ROWS],
+            "02-signins-trend": trend,
+            "03-top-failing-users": [
+                {"UserPrincipalName": u, "Failures": n} for u, n in acc.failing_users.top(top_users)
+            ],
+            "04-top-offending-ips": [
+                {"IPAddress": ip, "Failures": n, "TargetedUsers": acc.ip_users[ip].estimate() if ip in acc.ip_users else 0}
+                for ip, n in acc.failing_ips.top(top_ips)
+            ],
+            "05-signins-by-country": [
+                {"Country": c, "Signins": n} for c, n in acc.countries.top(top_countries)
+            ],
+        }
+        # 0 means the top-N rows are exact (TargetedUsers is still a sketch estimate above 64 users)
+        max_undercount = {
+            "03-top-failing-users": acc.failing_users.error,
+            "04-top-offending-ips": acc.failing_ips.error,
+            "04-top-offending-ips.TargetedUsers": acc.ip_users_error,
+            "05-signins-by-country": acc.countries.error,
+        }
+        return {"panels": panels, "max_undercount": max_undercount}
+
+    # ---- persistence ----
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "version": STATE_VERSION,
+            "k": self.k,
+            "newest": self.newest,
+            "sources": self.sources,
+            "hours": {h: b.to_json() for h, b in self.hours.items()},
+            "days": {d: b.to_json() for d, b in self.days.items()},
+        }, separators=(",", ":")), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "WorkbookViews":
+        raw = json.loads(path.read_text(encoding="utf-8"))
+        if raw.get("version") != STATE_VERSION:
+            raise _OldState(path)
+        v = cls(raw["k"])
+        v.newest, v.sources = raw["newest"], raw["sources"]
+        v.hours = {h: Bucket.from_json(b) for h, b in raw["hours"].items()}
+        v.days = {d: Bucket.from_json(b) for d, b in raw["days"].items()}
+        return v
+
+class _Rewritten(Exception):
+    pass
+
+class _OldState(Exception):
+    pass
+
+def _head(path: Path, n: int) -> str:
+    with path.open("rb") as f:
+        return hashlib.blake2b(f.read(n), digest_size=16).hexdigest()
+
+def _load_or_new(state_path: Path, k: int) -> Tuple[WorkbookViews, int]:
+    """(views, events re-read to rebuild an old state)"""
+    if not state_path.exists():
+        return WorkbookViews(k), 0
+    try:
+        return WorkbookViews.load(state_path), 0
+    except _OldState:
+        # written by an older layout: re-read every source it had folded in
+        print(f"{state_path} has an old layout; rebuilding views from scratch", file=sys.stderr)
+        raw = json.loads(state_path.read_text(encoding="utf-8"))
+        views = WorkbookViews(raw.get("k", k))
+        added = sum(views.update_from_file(Path(p)) for p in raw.get("sources") or {} if Path(p).exists())
+        return views, added
+
+def update(state_path: Path, files: List[Path], k: int = DEFAULT_K) -> Tuple[WorkbookViews, int]:
+    views, added = _load_or_new(state_path, k)
+    try:
+        added += sum(views.update_from_file(p) for p in files)
+    except _Rewritten as e:
+        # counters can't un-count a rewritten file: rebuild from every known source
+        print(f"{e.args[0]} was rewritten; rebuilding views from scratch", file=sys.stderr)
+        known = [Path(p) for p in views.sources]
+        views = WorkbookViews(views.k)
+        added = sum(views.update_from_file(p) for p in dict.fromkeys([*known, *(Path(f).resolve() for f in files)]) if p.exists())
+    views.save(state_path)
+    return views, added
+
+def _parse_duration(s: str) -> timedelta:
+    m = re.fullmatch(r"(\d+)([hd])", s.strip())
+    if not m:
+        raise SystemExit(f"Bad duration {s!r} (use e.g. 24h or 7d)")
+    n = int(m.group(1))
+    return timedelta(hours=n) if m.group(2) == "h" else timedelta(days=n)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Incrementally maintained workbook overview panels (01-05).")
+    ap.add_argument("--state", default=str(DEFAULT_STATE), help="View state file")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    up = sub.add_parser("update", help="Fold new log lines into the views")
+    up.add_argument("files", nargs="*", default=[str(DATA_SIGNIN), str(DATA_AUDIT)], help="SigninLogs*/AuditLogs* JSONL files")
+    up.add_argument("--k", type=int, default=DEFAULT_K, help="Hour-bucket top-N summary size for a new state")
+
+    q = sub.add_parser("query", help="Answer a TimeRange and export the panels as JSON")
+    q.add_argument("--from", dest="date_from", default=None, help="Range start (default: --last before --to)")
+    q.add_argument("--to", dest="date_to", default=None, help="Range end (default: newest event)")
+    q.add_argument("--last", default="24h", help="Range length when --from is omitted (e.g. 24h, 7d)")
+    q.add_argument("--out", default=str(DEFAULT_OUT), help="Where to write the panels JSON")
+    args = ap.parse_args()
+
+    state_path = Path(args.state)
+    if args.cmd == "update":
+        views, added = update(state_path, [Path(f) for f in args.files], args.k)
+        print(f"Added {added} events; {len(views.hours)} hour / {len(views.days)} day buckets; newest {views.newest}")
+        print(f"Wrote: {state_path}")
+        return
+
+    if not state_path.exists():
+        raise SystemExit(f"No view state at {state_path}; run `workbook_views.py update` first.")
+    try:
+        views = WorkbookViews.load(state_path)
+    except _OldState:
+        raise SystemExit(f"View state at {state_path} has an old layout; run `workbook_views.py update` to rebuild it.")
+    end = _parse(args.date_to) if args.date_to else (_parse(views.newest) if views.newest else datetime.now(timezone.utc))
+    start = _parse(args.date_from) if args.date_from else end - _parse_duration(args.last)
+    answer = views.query(start, end)
+    panels = answer["panels"]
+    result = {
+        "time_range": {"from": start.strftime("%Y-%m-%dT%H:%M:%SZ"), "to": end.strftime("%Y-%m-%dT%H:%M:%SZ"), "resolution": "1h"},
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        **answer,
+    }
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    for row in panels["01-kpis"]:
+        print(f"{row['Metric']:<28} {row['Value']}")
+    print(f"Wrote: {out}")
+
+if __name__ == "__main__":
+    main()